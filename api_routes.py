@@ -2,10 +2,16 @@
 Enhanced API endpoints with MongoDB integration
 Extends the existing prediction API with database operations
 """
-from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel, Field
+import asyncio
+import json
+import os
+
+from bson import ObjectId
 
 from database.services import (
     UserService,
@@ -15,8 +21,23 @@ from database.services import (
     PetService,
     VaccinationService,
     FeedbackService,
-    CommunityFeedbackService
+    CommunityFeedbackService,
+    gather_sections
+)
+from database.exports import (
+    ExportService,
+    ExportJobService,
+    MEDIA_TYPES,
+    export_filename,
+    normalize_export_format
 )
+from database.account import AccountJobService
+from database.archive import ScanArchiveService
+from database.events import event_hub
+from database.ingest import search_event_buffer
+from response_cache import conditional_json_response, payload_cache, public_cache, public_json_response
+from json_responses import FastJSONResponse
+from similarity import DEFAULT_NPROBE, find_similar_scans
 from database.models import (
     User,
     ScanHistory,
@@ -36,6 +57,9 @@ from database.models import (
 # Create API router
 router = APIRouter(tags=["database"])
 
+# A deleted account's cached payloads would otherwise linger until LRU eviction
+AccountJobService.add_deletion_listener(payload_cache.evict_user)
+
 
 # ==================== Request/Response Models ====================
 class UserCreateRequest(BaseModel):
@@ -62,6 +86,33 @@ class SearchCreateRequest(BaseModel):
     device_type: DeviceType = DeviceType.UNKNOWN
 
 
+EVENT_BATCH_MAX_SEARCHES = 100
+EVENT_BATCH_MAX_INTERACTIONS = 200
+
+
+class SearchEvent(BaseModel):
+    breed_searched: str = Field(..., min_length=1, max_length=100)
+    search_query: str = Field(..., max_length=200)
+    device_type: DeviceType = DeviceType.UNKNOWN
+    searched_at: Optional[datetime] = Field(None, description="When the breed was viewed (UTC); defaults to now")
+
+
+class SearchInteractionEvent(BaseModel):
+    search_id: Optional[str] = Field(None, description="An existing search")
+    search_index: Optional[int] = Field(None, ge=0, description="Position of a search in the same batch")
+    time_spent: Optional[int] = Field(None, ge=0)
+    sections_viewed: Optional[List[str]] = Field(None, max_length=50)
+    is_bookmarked: Optional[bool] = None
+    rating: Optional[int] = Field(None, ge=1, le=5)
+
+
+class EventBatchRequest(BaseModel):
+    searches: List[SearchEvent] = Field(default_factory=list, max_length=EVENT_BATCH_MAX_SEARCHES)
+    interactions: List[SearchInteractionEvent] = Field(
+        default_factory=list, max_length=EVENT_BATCH_MAX_INTERACTIONS
+    )
+
+
 class UserFeedbackRequest(BaseModel):
     user_id: str
     predicted_breed: str
@@ -87,6 +138,87 @@ async def get_current_user_id(
     return x_user_id
 
 
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated fields= query parameter"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def parse_range_header(range_header: Optional[str], file_size: int):
+    """
+    Parse a single "bytes=start-end" range
+    Returns (start, end) inclusive, None for a full response, or raises 416
+    """
+    if not range_header:
+        return None
+    if not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else file_size - 1
+        else:
+            # Suffix range: last N bytes
+            length = int(end_text)
+            start = max(file_size - length, 0)
+            end = file_size - 1
+    except ValueError:
+        return None
+    
+    end = min(end, file_size - 1)
+    if start > end or start >= file_size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+
+def ranged_file_response(
+    file_path: str,
+    filename: str,
+    media_type: str,
+    range_header: Optional[str] = None,
+    chunk_size: int = 64 * 1024
+) -> StreamingResponse:
+    """Serve a file with HTTP range support so large downloads can resume"""
+    import aiofiles
+    
+    file_size = os.path.getsize(file_path)
+    byte_range = parse_range_header(range_header, file_size)
+    start, end = byte_range if byte_range else (0, file_size - 1)
+    
+    async def file_iterator():
+        async with aiofiles.open(file_path, "rb") as f:
+            await f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(max(end - start + 1, 0)),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    
+    return StreamingResponse(
+        file_iterator(),
+        status_code=206 if byte_range else 200,
+        media_type=media_type,
+        headers=headers
+    )
+
+
 # ==================== User Endpoints ====================
 @router.post("/users", response_model=dict)
 async def create_user(user_data: UserCreateRequest):
@@ -130,7 +262,7 @@ async def get_current_user(user_id: str = Depends(get_current_user_id)):
         user = await UserService.get_user_by_clerk_id(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        return user
+        return FastJSONResponse(user)
     except HTTPException:
         raise
     except Exception as e:
@@ -190,11 +322,14 @@ async def remove_favorite_breed(
 @router.post("/scans", response_model=dict)
 async def create_scan(
     scan_data: ScanCreateRequest,
-    user_id: str = Depends(get_current_user_id)
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128)
 ):
     """
     Save scan result to database
-    Called automatically after prediction
+    Called automatically after prediction. Retrying with the same
+    Idempotency-Key (or image_hash) returns the original scan_id without
+    storing or counting the scan again
     """
     try:
         scan = ScanHistory(
@@ -208,14 +343,13 @@ async def create_scan(
             device_type=scan_data.device_type
         )
         
-        created_scan = await ScanHistoryService.create_scan(scan)
-        
-        # Increment user's scan count
-        await UserService.increment_scan_count(user_id)
+        # Stores the scan and increments the user's scan count together
+        created_scan, created = await ScanHistoryService.record_scan(scan, idempotency_key)
         
         return {
-            "message": "Scan saved successfully",
-            "scan_id": created_scan["_id"]
+            "message": "Scan saved successfully" if created else "Scan already saved",
+            "scan_id": created_scan["_id"],
+            "duplicate": not created
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -225,38 +359,71 @@ async def create_scan(
 async def get_user_scans(
     limit: int = 50,
     skip: int = 0,
+    view: str = Query("detail", description="Projection view: list, analytics, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user_id: str = Depends(get_current_user_id)
 ):
     """Get user's scan history with pagination"""
     try:
-        scans = await ScanHistoryService.get_user_scans(user_id, limit, skip)
-        return {
+        scans = await ScanHistoryService.get_user_scans(
+            user_id, limit, skip, view=view, fields=parse_fields(fields)
+        )
+        return FastJSONResponse({
             "scans": scans,
             "count": len(scans),
             "limit": limit,
             "skip": skip
-        }
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/scans/statistics", response_model=dict)
-async def get_scan_statistics(user_id: str = Depends(get_current_user_id)):
-    """Get user's scan statistics"""
+@router.get("/scans/{scan_id}/similar", response_model=dict)
+async def get_similar_scans(
+    scan_id: str,
+    k: int = Query(10, ge=1, le=50),
+    nprobe: int = Query(DEFAULT_NPROBE, ge=1, le=1024, description="Index lists to search; higher is slower but more exact"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Find scanned dogs that look like the dog in this scan"""
     try:
-        stats = await ScanHistoryService.get_scan_statistics(user_id)
-        breed_freq = await ScanHistoryService.get_breed_frequency(user_id)
-        
-        return {
-            "total_scans": stats.get("total_scans", 0),
-            "average_confidence": round(stats.get("avg_confidence", 0), 2),
-            "crossbreed_count": stats.get("crossbreed_count", 0),
-            "top_breeds": breed_freq
-        }
+        similar = await find_similar_scans(scan_id, user_id, k, nprobe)
+        if similar is None:
+            raise HTTPException(status_code=404, detail="Scan not found or has no stored embedding")
+        return FastJSONResponse({"scan_id": scan_id, "similar": similar, "count": len(similar)})
+    except HTTPException:
+        raise
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/scans/statistics", response_model=dict)
+async def get_scan_statistics(
+    request: Request,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get user's scan statistics"""
+    async def build():
+        try:
+            stats = await ScanHistoryService.get_scan_statistics(user_id)
+            breed_freq = await ScanHistoryService.get_breed_frequency(user_id)
+        
+            return {
+                "total_scans": stats.get("total_scans", 0),
+                "average_confidence": round(stats.get("avg_confidence", 0), 2),
+                "crossbreed_count": stats.get("crossbreed_count", 0),
+                "top_breeds": breed_freq
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await conditional_json_response(request, user_id, build)
+
+
 @router.put("/scans/{scan_id}/feedback", response_model=dict)
 async def update_scan_feedback(
     scan_id: str,
@@ -271,6 +438,10 @@ async def update_scan_feedback(
             feedback_data.confirmed_breed
         )
         if not success:
+            if await ScanArchiveService.contains_scan(user_id, scan_id):
+                # Archived segments are immutable; patching them would mean
+                # rewriting the whole user-month
+                raise HTTPException(status_code=409, detail="Scan is archived and can no longer be updated")
             raise HTTPException(status_code=404, detail="Scan not found")
         return {"message": "Feedback updated successfully"}
     except HTTPException:
@@ -296,29 +467,103 @@ async def create_search(
         
         created_search = await SearchHistoryService.create_search(search)
         
-        return {
+        return FastJSONResponse({
             "message": "Search saved successfully",
             "search_id": created_search["_id"]
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _event_timestamp(searched_at: Optional[datetime], now: datetime) -> datetime:
+    """Naive UTC, and never in the future"""
+    if searched_at is None:
+        return now
+    if searched_at.tzinfo is not None:
+        searched_at = searched_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(searched_at, now)
+
+
+@router.post("/events/batch", response_model=dict, status_code=202)
+async def ingest_event_batch(
+    batch: EventBatchRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Record a browsing session's searches and interaction updates in one request
+    Events are buffered and written in bulk within about a second, so they
+    may not show up in /search-history immediately. Returns the ids of the
+    new searches in request order; interactions can target them with
+    search_index
+    """
+    now = datetime.utcnow()
+    interactions = []
+    for position, event in enumerate(batch.interactions):
+        if event.search_index is not None:
+            if event.search_index >= len(batch.searches):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"interactions[{position}]: search_index out of range"
+                )
+        elif event.search_id is None or not ObjectId.is_valid(event.search_id):
+            raise HTTPException(
+                status_code=400,
+                detail=f"interactions[{position}]: a valid search_id or search_index is required"
+            )
+        fields = SearchHistoryService.interaction_update(
+            event.time_spent, event.sections_viewed, event.is_bookmarked, event.rating
+        )
+        if fields:
+            interactions.append((event, fields))
+    
+    if not search_event_buffer.has_room(len(batch.searches) + len(interactions)):
+        raise HTTPException(status_code=503, detail="Event buffer is full; retry shortly")
+    
+    search_ids = [
+        search_event_buffer.add_search(SearchHistory(
+            user_id=user_id,
+            breed_searched=event.breed_searched,
+            search_query=event.search_query,
+            device_type=event.device_type,
+            search_timestamp=_event_timestamp(event.searched_at, now)
+        ).model_dump())
+        for event in batch.searches
+    ]
+    for event, fields in interactions:
+        target = search_ids[event.search_index] if event.search_index is not None else ObjectId(event.search_id)
+        search_event_buffer.add_interaction(target, user_id, fields)
+    search_event_buffer.maybe_flush()
+    
+    return FastJSONResponse(
+        {
+            "accepted": {"searches": len(search_ids), "interactions": len(interactions)},
+            "search_ids": [str(search_id) for search_id in search_ids]
+        },
+        status_code=202
+    )
+
+
 @router.get("/search-history", response_model=dict)
 async def get_user_searches(
     limit: int = 20,
     skip: int = 0,
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user_id: str = Depends(get_current_user_id)
 ):
     """Get user's search history"""
     try:
-        searches = await SearchHistoryService.get_user_searches(user_id, limit, skip)
+        searches = await SearchHistoryService.get_user_searches(
+            user_id, limit, skip, view=view, fields=parse_fields(fields)
+        )
         return {
             "searches": searches,
             "count": len(searches),
             "limit": limit,
             "skip": skip
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -331,17 +576,26 @@ async def get_recent_searches(
     """Get recent unique breed searches"""
     try:
         recent = await SearchHistoryService.get_recent_searches(user_id, limit)
-        return {"recent_searches": recent}
+        return FastJSONResponse({"recent_searches": recent})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/search-history/popular", response_model=dict)
-async def get_popular_breeds(limit: int = 10):
-    """Get most searched breeds globally"""
+async def get_popular_breeds(
+    request: Request,
+    limit: int = Query(10, ge=1, le=100),
+    window: str = Query("all", description="Leaderboard window: all, 24h, 7d")
+):
+    """Get most searched breeds globally (shared stale-while-revalidate cache)"""
+    async def build():
+        popular = await SearchHistoryService.get_popular_breeds(limit, window)
+        return {"popular_breeds": popular, "window": window}
+    
     try:
-        popular = await SearchHistoryService.get_popular_breeds(limit)
-        return {"popular_breeds": popular}
+        return await public_json_response(request, build, {"limit": limit, "window": window})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -356,7 +610,7 @@ async def get_user_preferences(user_id: str = Depends(get_current_user_id)):
             # Create default preferences if not exists
             default_prefs = UserPreferences(user_id=user_id)
             prefs = await UserPreferencesService.create_preferences(default_prefs)
-        return prefs
+        return FastJSONResponse(prefs)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -380,280 +634,331 @@ async def update_user_preferences(
 # ==================== Analytics Endpoints ====================
 @router.get("/analytics/dashboard", response_model=dict)
 async def get_analytics_dashboard(
+    request: Request,
     user_id: str = Depends(get_current_user_id),
     days: int = Query(default=30, description="Number of days to analyze")
 ):
     """
     Get comprehensive analytics dashboard data
     """
-    try:
-        from datetime import datetime, timedelta
+    async def build():
+        try:
+            from datetime import datetime, timedelta
         
-        # Calculate date range
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
+            # Calculate date range
+            end_date = datetime.utcnow()
+            start_date = end_date - timedelta(days=days)
         
-        # Get scan statistics
-        scan_stats = await ScanHistoryService.get_scan_statistics(user_id)
-        scan_history = await ScanHistoryService.get_user_scans_with_dates(
-            user_id, 
-            limit=1000,
-            start_date=start_date,
-            end_date=end_date
-        )
-        
-        # Get breed frequency
-        breed_frequency = await ScanHistoryService.get_breed_frequency(user_id, limit=20)
+            # Run the independent reads concurrently; slow sections degrade to empty
+            sections, degraded = await gather_sections(
+                {
+                    "scan_stats": ScanHistoryService.get_scan_statistics(user_id),
+                    "scan_history": ScanHistoryService.get_user_scans_with_dates(
+                        user_id,
+                        limit=1000,
+                        start_date=start_date,
+                        end_date=end_date,
+                        view="analytics"
+                    ),
+                    "streak_days": calculate_scan_streak(user_id),
+                    "this_month": get_monthly_scan_count(user_id, 0),  # Current month
+                    "last_month": get_monthly_scan_count(user_id, 1),  # Previous month
+                },
+                defaults={
+                    "scan_stats": {},
+                    "scan_history": [],
+                    "streak_days": 0,
+                    "this_month": 0,
+                    "last_month": 0,
+                }
+            )
+            scan_stats = sections["scan_stats"]
+            scan_history = sections["scan_history"]
+            streak_days = sections["streak_days"]
+            this_month_scans = sections["this_month"]
+            last_month_scans = sections["last_month"]
         
-        # Calculate daily scan data
-        daily_scans = {}
-        breed_distribution = {}
-        confidence_levels = []
-        hourly_usage = [0] * 24
-        daily_accuracy = {}
+            # Calculate daily scan data
+            daily_scans = {}
+            breed_distribution = {}
+            confidence_levels = []
+            hourly_usage = [0] * 24
+            daily_accuracy = {}
         
-        for scan in scan_history:
-            # Daily aggregation
-            scan_date = scan['timestamp'].date()
-            daily_scans[scan_date] = daily_scans.get(scan_date, 0) + 1
+            for scan in scan_history:
+                # Daily aggregation
+                scan_date = scan['timestamp'].date()
+                daily_scans[scan_date] = daily_scans.get(scan_date, 0) + 1
             
-            # Breed distribution
-            breed = scan['predicted_breed']
-            breed_distribution[breed] = breed_distribution.get(breed, 0) + 1
+                # Breed distribution
+                breed = scan['predicted_breed']
+                breed_distribution[breed] = breed_distribution.get(breed, 0) + 1
             
-            # Confidence levels
-            confidence_levels.append(scan['confidence_score'])
+                # Confidence levels
+                confidence_levels.append(scan['confidence_score'])
             
-            # Hourly usage
-            hour = scan['timestamp'].hour
-            hourly_usage[hour] += 1
+                # Hourly usage
+                hour = scan['timestamp'].hour
+                hourly_usage[hour] += 1
             
-            # Daily accuracy calculation
-            if scan_date not in daily_accuracy:
-                daily_accuracy[scan_date] = {'total': 0, 'accurate': 0}
-            daily_accuracy[scan_date]['total'] += 1
-            # Use confidence score as proxy for accuracy (>0.8 considered accurate)
-            if scan['confidence_score'] > 0.8:
-                daily_accuracy[scan_date]['accurate'] += 1
-        
-        # Calculate accuracy (if feedback available)
-        accuracy_rate = scan_stats.get('accuracy_rate', 0.0)
+                # Daily accuracy calculation
+                if scan_date not in daily_accuracy:
+                    daily_accuracy[scan_date] = {'total': 0, 'accurate': 0}
+                daily_accuracy[scan_date]['total'] += 1
+                # Use confidence score as proxy for accuracy (>0.8 considered accurate)
+                if scan['confidence_score'] > 0.8:
+                    daily_accuracy[scan_date]['accurate'] += 1
         
-        # Calculate streak
-        streak_days = await calculate_scan_streak(user_id)
+            # Calculate accuracy (if feedback available)
+            accuracy_rate = scan_stats.get('accuracy_rate', 0.0)
         
-        # Monthly comparison
-        this_month_scans = await get_monthly_scan_count(user_id, 0)  # Current month
-        last_month_scans = await get_monthly_scan_count(user_id, 1)  # Previous month
-        
-        return {
-            "overview": {
-                "total_scans": scan_stats.get('total_scans', 0),
-                "unique_breeds": len(breed_distribution),
-                "accuracy_rate": accuracy_rate,
-                "streak_days": streak_days,
-                "this_month": this_month_scans,
-                "last_month": last_month_scans,
-                "growth_rate": calculate_growth_rate(this_month_scans, last_month_scans)
-            },
-            "charts": {
-                "daily_scans": [
-                    {"date": date.isoformat(), "scans": count}
-                    for date, count in sorted(daily_scans.items())
-                ],
-                "breed_distribution": [
-                    {"breed": breed, "count": count, "percentage": round(count / len(scan_history) * 100, 1)}
-                    for breed, count in sorted(breed_distribution.items(), key=lambda x: x[1], reverse=True)[:10]
-                ],
-                "confidence_histogram": calculate_confidence_histogram(confidence_levels),
-                "hourly_usage": [
-                    {"hour": hour, "scans": count}
-                    for hour, count in enumerate(hourly_usage)
-                ],
-                "accuracy_trends": [
-                    {
-                        "date": date.isoformat(), 
-                        "accuracy": round((data['accurate'] / data['total']) * 100, 1) if data['total'] > 0 else 0
-                    }
-                    for date, data in sorted(daily_accuracy.items())
-                ]
-            },
-            "insights": {
-                "most_active_hour": hourly_usage.index(max(hourly_usage)) if hourly_usage else 12,
-                "favorite_breed": max(breed_distribution.items(), key=lambda x: x[1])[0] if breed_distribution else "None",
-                "average_confidence": sum(confidence_levels) / len(confidence_levels) if confidence_levels else 0,
-                "scan_frequency": len(scan_history) / days if days > 0 else 0
+            return {
+                "overview": {
+                    "total_scans": scan_stats.get('total_scans', 0),
+                    "unique_breeds": len(breed_distribution),
+                    "accuracy_rate": accuracy_rate,
+                    "streak_days": streak_days,
+                    "this_month": this_month_scans,
+                    "last_month": last_month_scans,
+                    "growth_rate": calculate_growth_rate(this_month_scans, last_month_scans)
+                },
+                "charts": {
+                    "daily_scans": [
+                        {"date": date.isoformat(), "scans": count}
+                        for date, count in sorted(daily_scans.items())
+                    ],
+                    "breed_distribution": [
+                        {"breed": breed, "count": count, "percentage": round(count / len(scan_history) * 100, 1)}
+                        for breed, count in sorted(breed_distribution.items(), key=lambda x: x[1], reverse=True)[:10]
+                    ],
+                    "confidence_histogram": calculate_confidence_histogram(confidence_levels),
+                    "hourly_usage": [
+                        {"hour": hour, "scans": count}
+                        for hour, count in enumerate(hourly_usage)
+                    ],
+                    "accuracy_trends": [
+                        {
+                            "date": date.isoformat(), 
+                            "accuracy": round((data['accurate'] / data['total']) * 100, 1) if data['total'] > 0 else 0
+                        }
+                        for date, data in sorted(daily_accuracy.items())
+                    ]
+                },
+                "insights": {
+                    "most_active_hour": hourly_usage.index(max(hourly_usage)) if hourly_usage else 12,
+                    "favorite_breed": max(breed_distribution.items(), key=lambda x: x[1])[0] if breed_distribution else "None",
+                    "average_confidence": sum(confidence_levels) / len(confidence_levels) if confidence_levels else 0,
+                    "scan_frequency": len(scan_history) / days if days > 0 else 0
+                },
+                "degraded_sections": degraded
             }
-        }
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await conditional_json_response(request, user_id, build)
 
 
 @router.get("/analytics/breeds", response_model=dict)
 async def get_breed_analytics(
+    request: Request,
     user_id: str = Depends(get_current_user_id),
     breed_name: Optional[str] = Query(default=None, description="Specific breed to analyze")
 ):
     """
     Get detailed breed analytics
     """
-    try:
-        if breed_name:
-            # Get analytics for specific breed
-            breed_scans = await ScanHistoryService.get_scans_by_breed(user_id, breed_name)
+    async def build():
+        try:
+            if breed_name:
+                # Get analytics for specific breed
+                breed_scans = await ScanHistoryService.get_scans_by_breed(
+                    user_id, breed_name, view="analytics"
+                )
             
-            confidence_scores = [scan['confidence_score'] for scan in breed_scans]
+                confidence_scores = [scan['confidence_score'] for scan in breed_scans]
             
-            return {
-                "breed": breed_name,
-                "total_scans": len(breed_scans),
-                "average_confidence": sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0,
-                "highest_confidence": max(confidence_scores) if confidence_scores else 0,
-                "lowest_confidence": min(confidence_scores) if confidence_scores else 0,
-                "scan_timeline": [
-                    {
-                        "date": scan['timestamp'].isoformat(),
-                        "confidence": scan['confidence_score'],
-                        "is_crossbreed": scan.get('is_crossbreed', False)
-                    }
-                    for scan in breed_scans
-                ],
-                "crossbreed_percentage": sum(1 for scan in breed_scans if scan.get('is_crossbreed', False)) / len(breed_scans) * 100 if breed_scans else 0
-            }
-        else:
-            # Get overview of all breeds
-            breed_frequency = await ScanHistoryService.get_breed_frequency(user_id, limit=50)
+                return {
+                    "breed": breed_name,
+                    "total_scans": len(breed_scans),
+                    "average_confidence": sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0,
+                    "highest_confidence": max(confidence_scores) if confidence_scores else 0,
+                    "lowest_confidence": min(confidence_scores) if confidence_scores else 0,
+                    "scan_timeline": [
+                        {
+                            "date": scan['timestamp'].isoformat(),
+                            "confidence": scan['confidence_score'],
+                            "is_crossbreed": scan.get('is_crossbreed', False)
+                        }
+                        for scan in breed_scans
+                    ],
+                    "crossbreed_percentage": sum(1 for scan in breed_scans if scan.get('is_crossbreed', False)) / len(breed_scans) * 100 if breed_scans else 0
+                }
+            else:
+                # Get overview of all breeds
+                breed_frequency = await ScanHistoryService.get_breed_frequency(user_id, limit=50)
             
-            breed_analytics = []
-            for breed_data in breed_frequency:
-                breed = breed_data['breed']
-                breed_scans = await ScanHistoryService.get_scans_by_breed(user_id, breed)
-                confidence_scores = [scan['confidence_score'] for scan in breed_scans]
+                breed_analytics = []
+                for breed_data in breed_frequency:
+                    breed = breed_data['breed']
+                    breed_scans = await ScanHistoryService.get_scans_by_breed(
+                        user_id, breed, view="analytics"
+                    )
+                    confidence_scores = [scan['confidence_score'] for scan in breed_scans]
                 
-                breed_analytics.append({
-                    "breed": breed,
-                    "count": breed_data['count'],
-                    "average_confidence": sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0,
-                    "latest_scan": max(scan['timestamp'] for scan in breed_scans).isoformat() if breed_scans else None
-                })
+                    breed_analytics.append({
+                        "breed": breed,
+                        "count": breed_data['count'],
+                        "average_confidence": sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0,
+                        "latest_scan": max(scan['timestamp'] for scan in breed_scans).isoformat() if breed_scans else None
+                    })
             
-            return {
-                "breed_analytics": breed_analytics,
-                "total_unique_breeds": len(breed_analytics),
-                "most_identified": breed_analytics[0]['breed'] if breed_analytics else "None"
-            }
+                return {
+                    "breed_analytics": breed_analytics,
+                    "total_unique_breeds": len(breed_analytics),
+                    "most_identified": breed_analytics[0]['breed'] if breed_analytics else "None"
+                }
             
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await conditional_json_response(request, user_id, build)
 
 
 @router.get("/analytics/trends", response_model=dict)
 async def get_analytics_trends(
+    request: Request,
     user_id: str = Depends(get_current_user_id),
     period: str = Query(default="weekly", description="Trend period: daily, weekly, monthly")
 ):
     """
     Get trend analysis data
     """
-    try:
-        from datetime import datetime, timedelta
+    async def build():
+        try:
+            from datetime import datetime, timedelta
         
-        # Get scan history for trend analysis
-        scan_history = await ScanHistoryService.get_user_scans_with_dates(user_id, limit=1000)
+            # Get scan history for trend analysis
+            scan_history = await ScanHistoryService.get_user_scans_with_dates(
+                user_id, limit=1000, view="analytics"
+            )
         
-        if period == "daily":
-            # Last 30 days daily trends
-            trends = await calculate_daily_trends(scan_history, 30)
-        elif period == "weekly":
-            # Last 12 weeks weekly trends
-            trends = await calculate_weekly_trends(scan_history, 12)
-        else:  # monthly
-            # Last 12 months monthly trends
-            trends = await calculate_monthly_trends(scan_history, 12)
+            if period == "daily":
+                # Last 30 days daily trends
+                trends = await calculate_daily_trends(scan_history, 30)
+            elif period == "weekly":
+                # Last 12 weeks weekly trends
+                trends = await calculate_weekly_trends(scan_history, 12)
+            else:  # monthly
+                # Last 12 months monthly trends
+                trends = await calculate_monthly_trends(scan_history, 12)
         
-        return {
-            "period": period,
-            "trends": trends,
-            "growth_metrics": {
-                "current_period": trends[-1]['scans'] if trends else 0,
-                "previous_period": trends[-2]['scans'] if len(trends) > 1 else 0,
-                "trend_direction": calculate_trend_direction(trends),
-                "peak_period": max(trends, key=lambda x: x['scans']) if trends else None
+            return {
+                "period": period,
+                "trends": trends,
+                "growth_metrics": {
+                    "current_period": trends[-1]['scans'] if trends else 0,
+                    "previous_period": trends[-2]['scans'] if len(trends) > 1 else 0,
+                    "trend_direction": calculate_trend_direction(trends),
+                    "peak_period": max(trends, key=lambda x: x['scans']) if trends else None
+                }
             }
-        }
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await conditional_json_response(request, user_id, build)
+
+
+@router.get("/analytics/export/stream")
+async def stream_analytics_export(
+    user_id: str = Depends(get_current_user_id),
+    format: str = Query(default="csv", description="Export format: csv, ndjson"),
+    data_type: str = Query(default="all", description="Data type: all, scans, breeds, trends"),
+    gzip: bool = Query(default=False, description="Gzip-compress the response body")
+):
+    """
+    Stream analytics data directly from the database
+    Memory use stays constant regardless of how many scans the user has
+    """
+    try:
+        format = normalize_export_format(format)
+        # Validate data_type before the response starts streaming
+        ExportService._sections(data_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="{export_filename(user_id, format, gzip)}"'
+    }
+    return StreamingResponse(
+        ExportService.stream_export(user_id, format, data_type, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers=headers
+    )
 
 
 @router.post("/analytics/export", response_model=dict)
 async def export_analytics_data(
     user_id: str = Depends(get_current_user_id),
-    format: str = Query(default="csv", description="Export format: csv, json"),
-    data_type: str = Query(default="all", description="Data type: all, scans, breeds, trends")
+    format: str = Query(default="csv", description="Export format: csv, ndjson"),
+    data_type: str = Query(default="all", description="Data type: all, scans, breeds, trends"),
+    gzip: bool = Query(default=False, description="Gzip-compress the export file")
 ):
     """
-    Export analytics data in various formats
+    Start a background export job for large exports
+    Poll the status URL, then fetch the file from the download URL
     """
     try:
-        from io import StringIO
-        import csv
-        import json
-        
-        export_data = {}
-        
-        if data_type in ["all", "scans"]:
-            scan_history = await ScanHistoryService.get_user_scans_with_dates(user_id, limit=1000)
-            export_data["scans"] = [
-                {
-                    "timestamp": scan['timestamp'].isoformat(),
-                    "breed": scan['predicted_breed'],
-                    "confidence": scan['confidence_score'],
-                    "is_crossbreed": scan.get('is_crossbreed', False)
-                }
-                for scan in scan_history
-            ]
-        
-        if data_type in ["all", "breeds"]:
-            breed_frequency = await ScanHistoryService.get_breed_frequency(user_id, limit=100)
-            export_data["breeds"] = breed_frequency
-        
-        if data_type in ["all", "trends"]:
-            trends = await calculate_weekly_trends(
-                await ScanHistoryService.get_user_scans_with_dates(user_id, limit=1000), 
-                12
-            )
-            export_data["trends"] = trends
-        
-        if format == "csv":
-            # Convert to CSV format
-            csv_data = {}
-            for key, data in export_data.items():
-                output = StringIO()
-                if data:
-                    writer = csv.DictWriter(output, fieldnames=data[0].keys())
-                    writer.writeheader()
-                    writer.writerows(data)
-                csv_data[key] = output.getvalue()
-                output.close()
-            
-            return {
-                "format": "csv",
-                "data": csv_data,
-                "download_url": f"/api/analytics/download/{user_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-            }
-        else:
-            return {
-                "format": "json",
-                "data": export_data,
-                "download_url": f"/api/analytics/download/{user_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
-            }
-            
+        job = await ExportJobService.create_job(user_id, format, data_type, gzip)
+        return {
+            "job_id": job["_id"],
+            "status": job["status"],
+            "format": job["format"],
+            "status_url": f"/api/analytics/export/jobs/{job['_id']}",
+            "download_url": f"/api/analytics/download/{job['_id']}"
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/analytics/export/jobs/{job_id}", response_model=dict)
+async def get_export_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get the progress of a background export job"""
+    job = await ExportJobService.get_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    
+    job.pop("file_path", None)
+    job.pop("worker", None)
+    job["download_url"] = f"/api/analytics/download/{job_id}" if job["status"] == "completed" else None
+    return job
+
+
+@router.get("/analytics/download/{job_id}")
+async def download_export(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id),
+    range_header: Optional[str] = Header(None, alias="Range")
+):
+    """Download a completed export file, honouring HTTP Range requests"""
+    job = await ExportJobService.get_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    if not job.get("file_path") or not os.path.exists(job["file_path"]):
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    
+    media_type = "application/gzip" if job["compress"] else MEDIA_TYPES[job["format"]]
+    return ranged_file_response(job["file_path"], job["filename"], media_type, range_header)
+
+
 # Helper functions for analytics calculations
 async def calculate_scan_streak(user_id: str) -> int:
     """Calculate consecutive days with scans"""
@@ -661,7 +966,9 @@ async def calculate_scan_streak(user_id: str) -> int:
         from datetime import datetime, timedelta
         
         # Get recent scans grouped by date
-        recent_scans = await ScanHistoryService.get_user_scans_with_dates(user_id, limit=100)
+        recent_scans = await ScanHistoryService.get_user_scans_with_dates(
+            user_id, limit=100, fields=["timestamp"]
+        )
         
         if not recent_scans:
             return 0
@@ -706,7 +1013,8 @@ async def get_monthly_scan_count(user_id: str, months_ago: int) -> int:
         monthly_scans = await ScanHistoryService.get_user_scans_with_dates(
             user_id,
             start_date=first_day,
-            end_date=last_day
+            end_date=last_day,
+            fields=["timestamp"]
         )
         
         return len(monthly_scans)
@@ -857,46 +1165,115 @@ def calculate_trend_direction(trends: list) -> str:
 
 # ==================== Dashboard Data Endpoint ====================
 @router.get("/dashboard", response_model=dict)
-async def get_dashboard_data(user_id: str = Depends(get_current_user_id)):
+async def get_dashboard_data(
+    request: Request,
+    user_id: str = Depends(get_current_user_id)
+):
     """
     Get comprehensive dashboard data for user
     Combines scan stats, recent activity, favorites
     """
-    try:
-        # Get user profile
-        user = await UserService.get_user_by_clerk_id(user_id)
-        
-        # Get scan statistics
-        scan_stats = await ScanHistoryService.get_scan_statistics(user_id)
-        breed_freq = await ScanHistoryService.get_breed_frequency(user_id, limit=5)
-        
-        # Get recent scans
-        recent_scans = await ScanHistoryService.get_user_scans(user_id, limit=10)
-        
-        # Get recent searches
-        recent_searches = await SearchHistoryService.get_recent_searches(user_id, limit=5)
+    async def build():
+        try:
+            # Profile, scan stats, breed frequency, recent scans and searches are
+            # independent, so fetch them concurrently
+            sections, degraded = await gather_sections(
+                {
+                    "user": UserService.get_user_by_clerk_id(user_id),
+                    "scan_stats": ScanHistoryService.get_scan_statistics(user_id),
+                    "breed_freq": ScanHistoryService.get_breed_frequency(user_id, limit=5),
+                    "recent_scans": ScanHistoryService.get_user_scans(user_id, limit=5, view="list"),
+                    "recent_searches": SearchHistoryService.get_recent_searches(user_id, limit=5),
+                },
+                defaults={
+                    "user": None,
+                    "scan_stats": {},
+                    "breed_freq": [],
+                    "recent_scans": [],
+                    "recent_searches": [],
+                }
+            )
+            user = sections["user"]
+            scan_stats = sections["scan_stats"]
+            breed_freq = sections["breed_freq"]
+            recent_scans = sections["recent_scans"]
+            recent_searches = sections["recent_searches"]
         
-        return {
-            "user": {
-                "username": user.get("username") if user else "Unknown",
-                "email": user.get("email") if user else "",
-                "total_scans": user.get("total_scans", 0) if user else 0,
-                "favorite_breeds": user.get("favorite_breeds", []) if user else [],
-                "subscription_status": user.get("subscription_status", "free") if user else "free"
-            },
-            "scan_statistics": {
-                "total_scans": scan_stats.get("total_scans", 0),
-                "average_confidence": round(scan_stats.get("avg_confidence", 0), 2),
-                "crossbreed_count": scan_stats.get("crossbreed_count", 0),
-                "top_breeds": breed_freq
-            },
-            "recent_activity": {
-                "recent_scans": recent_scans[:5],  # Last 5 scans
-                "recent_searches": recent_searches
+            return {
+                "user": {
+                    "username": user.get("username") if user else "Unknown",
+                    "email": user.get("email") if user else "",
+                    "total_scans": user.get("total_scans", 0) if user else 0,
+                    "favorite_breeds": user.get("favorite_breeds", []) if user else [],
+                    "subscription_status": user.get("subscription_status", "free") if user else "free"
+                },
+                "scan_statistics": {
+                    "total_scans": scan_stats.get("total_scans", 0),
+                    "average_confidence": round(scan_stats.get("avg_confidence", 0), 2),
+                    "crossbreed_count": scan_stats.get("crossbreed_count", 0),
+                    "top_breeds": breed_freq
+                },
+                "recent_activity": {
+                    "recent_scans": recent_scans,  # Last 5 scans
+                    "recent_searches": recent_searches
+                },
+                "degraded_sections": degraded
             }
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return await conditional_json_response(request, user_id, build)
+
+
+# ==================== Live Update Stream ====================
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def format_sse(event: dict) -> str:
+    """Encode a hub event as a Server-Sent Events frame"""
+    payload = json.dumps(
+        {"data": event["data"], "timestamp": event["timestamp"]},
+        default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o)
+    )
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+@router.get("/stream")
+async def stream_updates(
+    request: Request,
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
+    user_id: Optional[str] = Query(None, description="User ID for EventSource clients that cannot set headers")
+):
+    """
+    Server-Sent Events channel that pushes dashboard deltas
+    (new scans, counter changes, feedback status updates) instead of polling
+    """
+    user_id = x_user_id or user_id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User ID required")
+    
+    async def event_stream():
+        queue = event_hub.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comment frame keeps proxies from closing idle connections
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_hub.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # ==================== User Feedback Endpoint ====================
@@ -972,23 +1349,45 @@ async def create_pet(
 
 
 @router.get("/pets", response_model=List[dict])
-async def get_user_pets(user_id: str = Depends(get_current_user_id)):
+async def get_user_pets(
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    user_id: str = Depends(get_current_user_id)
+):
     """Get all pets for the current user"""
     try:
-        pets = await PetService.get_user_pets(user_id)
-        return pets
+        pets = await PetService.get_user_pets(user_id, view=view, fields=parse_fields(fields))
+        return FastJSONResponse(pets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/pets/overview", response_model=dict)
+async def get_pets_overview(
+    upcoming_limit: int = Query(3, ge=0, le=20),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Active pets with next due vaccinations, overdue counts and last administered dates"""
+    try:
+        pets = await PetService.get_pets_overview(user_id, upcoming_limit)
+        return FastJSONResponse({
+            "pets": pets,
+            "overdue_count": sum(pet["vaccination_summary"]["overdue_count"] for pet in pets),
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/pets/{pet_id}", response_model=dict)
-async def get_pet(pet_id: str):
+async def get_pet(pet_id: str, user_id: str = Depends(get_current_user_id)):
     """Get specific pet by ID"""
     try:
-        pet = await PetService.get_pet_by_id(pet_id)
+        pet = await PetService.get_pet_by_id(pet_id, user_id)
         if not pet:
             raise HTTPException(status_code=404, detail="Pet not found")
-        return pet
+        return FastJSONResponse(pet)
     except HTTPException:
         raise
     except Exception as e:
@@ -1090,12 +1489,18 @@ async def create_vaccination(
 @router.get("/vaccinations", response_model=List[dict])
 async def get_vaccinations(
     pet_id: Optional[str] = Query(None),
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user_id: str = Depends(get_current_user_id)
 ):
     """Get vaccination records for user's pets"""
     try:
-        vaccinations = await VaccinationService.get_pet_vaccinations(user_id, pet_id)
-        return vaccinations
+        vaccinations = await VaccinationService.get_pet_vaccinations(
+            user_id, pet_id, view=view, fields=parse_fields(fields)
+        )
+        return FastJSONResponse(vaccinations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1103,22 +1508,36 @@ async def get_vaccinations(
 @router.get("/vaccinations/upcoming", response_model=List[dict])
 async def get_upcoming_vaccinations(
     days_ahead: int = Query(30, ge=1, le=365),
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user_id: str = Depends(get_current_user_id)
 ):
     """Get upcoming vaccinations within specified days"""
     try:
-        vaccinations = await VaccinationService.get_upcoming_vaccinations(user_id, days_ahead)
-        return vaccinations
+        vaccinations = await VaccinationService.get_upcoming_vaccinations(
+            user_id, days_ahead, view=view, fields=parse_fields(fields)
+        )
+        return FastJSONResponse(vaccinations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/vaccinations/overdue", response_model=List[dict])
-async def get_overdue_vaccinations(user_id: str = Depends(get_current_user_id)):
+async def get_overdue_vaccinations(
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    user_id: str = Depends(get_current_user_id)
+):
     """Get overdue vaccinations"""
     try:
-        vaccinations = await VaccinationService.get_overdue_vaccinations(user_id)
-        return vaccinations
+        vaccinations = await VaccinationService.get_overdue_vaccinations(
+            user_id, view=view, fields=parse_fields(fields)
+        )
+        return FastJSONResponse(vaccinations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1150,7 +1569,7 @@ async def get_vaccination_statistics(user_id: str = Depends(get_current_user_id)
     """Get vaccination statistics for user"""
     try:
         stats = await VaccinationService.get_vaccination_statistics(user_id)
-        return stats
+        return FastJSONResponse(stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1195,12 +1614,18 @@ async def create_feedback(
 async def get_user_feedback(
     limit: int = Query(20, ge=1, le=100),
     skip: int = Query(0, ge=0),
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     user_id: str = Depends(get_current_user_id)
 ):
     """Get user's feedback history"""
     try:
-        feedback_list = await FeedbackService.get_user_feedback(user_id, limit, skip)
-        return feedback_list
+        feedback_list = await FeedbackService.get_user_feedback(
+            user_id, limit, skip, view=view, fields=parse_fields(fields)
+        )
+        return FastJSONResponse(feedback_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1210,7 +1635,7 @@ async def get_feedback_statistics():
     """Get overall feedback statistics (admin only)"""
     try:
         stats = await FeedbackService.get_feedback_statistics()
-        return stats
+        return FastJSONResponse(stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1248,23 +1673,46 @@ async def create_community_feedback(
 
 @router.get("/community-feedback/testimonials", response_model=List[dict])
 async def get_testimonials(
+    request: Request,
     limit: int = Query(10, ge=1, le=50),
-    featured_only: bool = Query(False)
+    featured_only: bool = Query(False),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
 ):
-    """Get approved testimonials for public display"""
+    """Get approved testimonials for public display (shared stale-while-revalidate cache)"""
+    field_list = parse_fields(fields)
+    
+    async def build():
+        return await CommunityFeedbackService.get_approved_testimonials(
+            limit, featured_only, view="list", fields=field_list
+        )
+    
+    params = {
+        "limit": limit,
+        "featured_only": featured_only,
+        "fields": ",".join(sorted(set(field_list))) if field_list else None,
+    }
     try:
-        testimonials = await CommunityFeedbackService.get_approved_testimonials(limit, featured_only)
-        return testimonials
+        return await public_json_response(request, build, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/community-feedback/user", response_model=List[dict])
-async def get_user_community_feedback(user_id: str = Depends(get_current_user_id)):
+async def get_user_community_feedback(
+    view: str = Query("detail", description="Projection view: list, detail"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    user_id: str = Depends(get_current_user_id)
+):
     """Get user's community feedback submissions"""
     try:
-        feedback_list = await CommunityFeedbackService.get_user_community_feedback(user_id)
-        return feedback_list
+        feedback_list = await CommunityFeedbackService.get_user_community_feedback(
+            user_id, view=view, fields=parse_fields(fields)
+        )
+        return FastJSONResponse(feedback_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1285,3 +1733,94 @@ async def vote_on_feedback(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== Account Data Endpoints ====================
+def _account_job_response(job: dict) -> dict:
+    job_id = job["_id"]
+    job["status_url"] = f"/api/account/jobs/{job_id}"
+    job["download_url"] = (
+        f"/api/account/export/{job_id}/download"
+        if job["kind"] == "export" and job["status"] == "completed" else None
+    )
+    return job
+
+
+@router.post("/account/export", response_model=dict, status_code=202)
+async def export_account_data(user_id: str = Depends(get_current_user_id)):
+    """
+    Start a background export of everything stored for the user
+    Produces one gzip-compressed NDJSON archive; poll the status URL for progress
+    """
+    try:
+        job = await AccountJobService.create_job(user_id, "export")
+        return FastJSONResponse(_account_job_response(job), status_code=202)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/account", response_model=dict, status_code=202)
+async def delete_account_data(
+    confirm: bool = Query(False, description="Must be true; deletion cannot be undone"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Start a background deletion of the user's account and all of its data
+    Scans (including archived ones), searches, pets, vaccinations, feedback,
+    preferences and exports are removed in throttled batches
+    """
+    if not confirm:
+        raise HTTPException(status_code=400, detail="Pass confirm=true to delete all account data")
+    try:
+        job = await AccountJobService.create_job(user_id, "delete")
+        return FastJSONResponse(_account_job_response(job), status_code=202)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/account/jobs/{job_id}", response_model=dict)
+async def get_account_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get the progress of an account export or deletion job"""
+    job = await AccountJobService.get_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Account job not found")
+    return FastJSONResponse(_account_job_response(job))
+
+
+@router.post("/account/jobs/{job_id}/retry", response_model=dict)
+async def retry_account_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Continue a failed account job from its last checkpoint"""
+    job = await AccountJobService.retry_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Account job not found")
+    return FastJSONResponse(_account_job_response(job))
+
+
+@router.get("/account/export/{job_id}/download")
+async def download_account_export(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id),
+    range_header: Optional[str] = Header(None, alias="Range")
+):
+    """Download a completed account export, honouring HTTP Range requests"""
+    job = await AccountJobService.get_job(job_id, user_id, include_path=True)
+    if not job or job["kind"] != "export":
+        raise HTTPException(status_code=404, detail="Account export not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Account export is {job['status']}")
+    if not job.get("file_path") or not os.path.exists(job["file_path"]):
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    return ranged_file_response(job["file_path"], job["filename"], "application/gzip", range_header)
+
+
+# ==================== Cache Metrics ====================
+@router.get("/cache/metrics", response_model=dict)
+async def get_cache_metrics():
+    """Hit ratio and counters of the shared public response cache"""
+    return FastJSONResponse({"public_responses": public_cache.metrics()})
@@ -0,0 +1,147 @@
+"""
+Benchmark: sequential vs concurrent /dashboard reads
+Runs the dashboard service calls against a latency-injected stand-in database
+
+Usage (from the project root):
+    python -m benchmarks.dashboard_fanout --latency-ms 15 --iterations 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+import database.services as services
+from database.services import (
+    ScanHistoryService,
+    SearchHistoryService,
+    UserService,
+    InMemoryCacheBackend,
+    configure_cache,
+    gather_sections,
+)
+
+
+class FakeCursor:
+    """Minimal async cursor supporting the chaining used by the service layer"""
+
+    def __init__(self, docs, latency):
+        self.docs = docs
+        self.latency = latency
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, *args, **kwargs):
+        return self
+
+    def limit(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self.latency)
+        return [dict(doc) for doc in self.docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await asyncio.sleep(self.latency)
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeCollection:
+    def __init__(self, docs, latency):
+        self.docs = docs
+        self.latency = latency
+
+    async def find_one(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return dict(self.docs[0]) if self.docs else None
+
+    def find(self, *args, **kwargs):
+        return FakeCursor(self.docs, self.latency)
+
+    def aggregate(self, *args, **kwargs):
+        return FakeCursor(self.docs, self.latency)
+
+
+class FakeDatabase:
+    """Every collection answers after a fixed simulated round-trip latency"""
+
+    def __init__(self, latency):
+        now = datetime.utcnow()
+        scan = {
+            "_id": "scan",
+            "user_id": "bench_user",
+            "predicted_breed": "Golden_retriever",
+            "confidence_score": 0.91,
+            "is_crossbreed": False,
+            "timestamp": now,
+        }
+        self.collections = {
+            "users": FakeCollection([{"_id": "u", "clerk_user_id": "bench_user", "total_scans": 10}], latency),
+            "scan_history": FakeCollection([scan] * 5, latency),
+            "recent_searches": FakeCollection([{"_id": "bench_user", "breeds": ["Pug", "Beagle"]}], latency),
+            "search_history": FakeCollection([], latency),
+        }
+
+    def __getattr__(self, name):
+        return self.collections[name]
+
+
+async def sequential_dashboard(user_id):
+    return {
+        "user": await UserService.get_user_by_clerk_id(user_id),
+        "scan_stats": await ScanHistoryService.get_scan_statistics(user_id),
+        "breed_freq": await ScanHistoryService.get_breed_frequency(user_id, limit=5),
+        "recent_scans": await ScanHistoryService.get_user_scans(user_id, limit=5),
+        "recent_searches": await SearchHistoryService.get_recent_searches(user_id, limit=5),
+    }
+
+
+async def concurrent_dashboard(user_id, timeout):
+    results, _ = await gather_sections(
+        {
+            "user": UserService.get_user_by_clerk_id(user_id),
+            "scan_stats": ScanHistoryService.get_scan_statistics(user_id),
+            "breed_freq": ScanHistoryService.get_breed_frequency(user_id, limit=5),
+            "recent_scans": ScanHistoryService.get_user_scans(user_id, limit=5),
+            "recent_searches": SearchHistoryService.get_recent_searches(user_id, limit=5),
+        },
+        timeout=timeout
+    )
+    return results
+
+
+async def measure(label, factory, iterations):
+    timings = []
+    for _ in range(iterations):
+        # Disable caching so every iteration pays the simulated round trips
+        configure_cache(InMemoryCacheBackend(max_entries=0))
+        started = time.perf_counter()
+        await factory()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<12} mean={statistics.mean(timings):7.2f} ms  p95={p95:7.2f} ms")
+
+
+async def main(latency_ms, iterations, timeout):
+    services.get_database = lambda: FakeDatabase(latency_ms / 1000)
+    print(f"Simulated round-trip latency: {latency_ms} ms, {iterations} iterations")
+    await measure("sequential", lambda: sequential_dashboard("bench_user"), iterations)
+    await measure("concurrent", lambda: concurrent_dashboard("bench_user", timeout), iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=15.0)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.latency_ms, args.iterations, args.timeout))
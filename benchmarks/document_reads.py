@@ -0,0 +1,87 @@
+"""
+Benchmark: list reads with per-document id conversion vs fetch_documents
+Seeds a scratch collection with scan-shaped documents in the configured
+MongoDB (MONGODB_URI / DATABASE_NAME) and drops it afterwards
+
+Usage (from the project root):
+    python -m benchmarks.document_reads --docs 10000 --iterations 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from database.connection import get_database, close_database_connection
+from database.services import READ_BATCH_SIZE, fetch_documents
+
+COLLECTION = "bench_document_reads"
+
+
+async def seed(collection, count):
+    await collection.drop()
+    now = datetime.utcnow()
+    docs = [
+        {
+            "user_id": "bench_user",
+            "predicted_breed": "Golden_retriever",
+            "confidence_score": 0.9,
+            "is_crossbreed": False,
+            "top_predictions": [
+                {"breed_name": "Golden_retriever", "confidence": 0.9},
+                {"breed_name": "Labrador_retriever", "confidence": 0.05},
+            ],
+            "timestamp": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+    for start in range(0, count, 1000):
+        await collection.insert_many(docs[start:start + 1000])
+    await collection.create_index([("user_id", 1), ("timestamp", -1)])
+
+
+async def python_loop(collection):
+    """The previous service pattern: async for with _id stringified per document"""
+    cursor = collection.find({"user_id": "bench_user"}).sort("timestamp", -1)
+    docs = []
+    async for doc in cursor:
+        doc["_id"] = str(doc["_id"])
+        docs.append(doc)
+    return docs
+
+
+async def server_side(collection):
+    return await fetch_documents(collection, {"user_id": "bench_user"}, sort={"timestamp": -1})
+
+
+async def measure(label, func, collection, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        docs = await func(collection)
+        timings.append((time.perf_counter() - started) * 1000)
+    assert isinstance(docs[0]["_id"], str)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<12} mean={statistics.mean(timings):8.2f} ms  p95={p95:8.2f} ms  docs={len(docs)}")
+
+
+async def main(count, iterations):
+    db = get_database()
+    collection = db[COLLECTION]
+    try:
+        await seed(collection, count)
+        print(f"{count} documents, {iterations} iterations, batch size {READ_BATCH_SIZE}")
+        await measure("async for", python_loop, collection, iterations)
+        await measure("to_list", server_side, collection, iterations)
+    finally:
+        await collection.drop()
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.docs, args.iterations))
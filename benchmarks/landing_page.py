@@ -0,0 +1,66 @@
+"""
+Benchmark: landing-page requests per second against a running server
+Hammers the public endpoints the landing page loads (testimonials and
+popular breeds) with concurrent clients, then prints RPS, latency
+percentiles and the server's /api/cache/metrics
+
+For a baseline without the stale-while-revalidate cache, start the server
+with PUBLIC_CACHE_MAX_AGE=0 PUBLIC_CACHE_STALE_SECONDS=0 and run it again
+
+Usage (from the project root, with the API running):
+    python -m benchmarks.landing_page --url http://localhost:8000 --concurrency 50 --seconds 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+LANDING_PAGE_PATHS = [
+    "/api/community-feedback/testimonials?limit=6&featured_only=true",
+    "/api/search-history/popular?limit=10&window=7d",
+]
+
+
+async def client_loop(client, deadline, timings, errors):
+    while time.perf_counter() < deadline:
+        for path in LANDING_PAGE_PATHS:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+            timings.append((time.perf_counter() - started) * 1000)
+
+
+async def main(url, concurrency, seconds):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        timings, errors = [], []
+        started = time.perf_counter()
+        deadline = started + seconds
+        await asyncio.gather(*(client_loop(client, deadline, timings, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        print(f"{len(timings):,} requests in {elapsed:.1f} s with {concurrency} clients: "
+              f"{len(timings) / elapsed:,.0f} req/s ({len(errors)} errors)")
+        print(f"latency median {statistics.median(timings):.2f} ms  "
+              f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms  "
+              f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms")
+
+        metrics = (await client.get("/api/cache/metrics")).json()["public_responses"]
+        print(f"cache hit ratio {metrics['hit_ratio']:.3f}  hits={metrics['hits']} "
+              f"stale={metrics['stale_hits']} misses={metrics['misses']} refreshes={metrics['refreshes']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.concurrency, args.seconds))
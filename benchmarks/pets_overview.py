@@ -0,0 +1,106 @@
+"""
+Benchmark: /api/pets/overview vs the vaccination tracker's five calls
+Loads synthetic pets and vaccinations into a scratch database on the
+configured MongoDB (MONGODB_URI), then times PetService.get_pets_overview
+against get_user_pets + get_pet_vaccinations + upcoming + overdue +
+statistics, issued one after another and concurrently. The scratch
+database is dropped afterwards
+
+Usage (from the project root):
+    python -m benchmarks.pets_overview --users 2000 --pets 3 --vaccinations 8 --iterations 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+
+async def load(db, users, pets_per_user, vaccinations_per_pet):
+    from database.indexes import INDEX_SPECS, _create_index
+
+    rng = random.Random(3)
+    now = datetime.utcnow()
+    for u in range(users):
+        user_id = f"user_{u}"
+        pets = [{
+            "user_id": user_id, "name": f"Pet {p}", "breed": "Beagle", "is_active": True,
+            "created_at": now - timedelta(days=p), "updated_at": now,
+        } for p in range(pets_per_user)]
+        result = await db.pets.insert_many(pets)
+        vaccinations = []
+        for pet_id in result.inserted_ids:
+            for _ in range(vaccinations_per_pet):
+                due_date = now + timedelta(days=rng.uniform(-120, 365))
+                completed = rng.random() < 0.5
+                vaccinations.append({
+                    "user_id": user_id, "pet_id": str(pet_id), "vaccine_name": rng.choice(["Rabies", "DHPP"]),
+                    "vaccine_type": "core", "due_date": due_date,
+                    "administered_date": due_date - timedelta(days=1) if completed else None,
+                    "status": "completed" if completed else "upcoming",
+                    "reminder_sent": False, "reminder_date": due_date - timedelta(days=7),
+                })
+        await db.vaccinations.insert_many(vaccinations)
+    for collection in ("pets", "vaccinations"):
+        for spec in INDEX_SPECS[collection]:
+            await _create_index(db, collection, spec)
+
+
+async def measure(label, call, users, iterations):
+    rng = random.Random(9)
+    timings = []
+    for _ in range(iterations):
+        user_id = f"user_{rng.randrange(users)}"
+        started = time.perf_counter()
+        await call(user_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"{label:<22} median {statistics.median(timings):7.2f} ms  "
+          f"p95 {timings[int(len(timings) * 0.95) - 1]:7.2f} ms")
+
+
+async def main(args):
+    # Point the services at a scratch database before the first connection
+    os.environ["DATABASE_NAME"] = args.database
+    from database.connection import get_database, close_database_connection
+    from database.services import PetService, VaccinationService
+
+    async def five_calls_sequential(user_id):
+        await PetService.get_user_pets(user_id, view="list")
+        await VaccinationService.get_pet_vaccinations(user_id, view="list")
+        await VaccinationService.get_upcoming_vaccinations(user_id, view="list")
+        await VaccinationService.get_overdue_vaccinations(user_id, view="list")
+        await VaccinationService.get_vaccination_statistics(user_id)
+
+    async def five_calls_concurrent(user_id):
+        await asyncio.gather(
+            PetService.get_user_pets(user_id, view="list"),
+            VaccinationService.get_pet_vaccinations(user_id, view="list"),
+            VaccinationService.get_upcoming_vaccinations(user_id, view="list"),
+            VaccinationService.get_overdue_vaccinations(user_id, view="list"),
+            VaccinationService.get_vaccination_statistics(user_id),
+        )
+
+    db = get_database()
+    try:
+        await load(db, args.users, args.pets, args.vaccinations)
+        print(f"{args.users} users x {args.pets} pets x {args.vaccinations} vaccinations")
+        await measure("five calls, sequential", five_calls_sequential, args.users, args.iterations)
+        await measure("five calls, concurrent", five_calls_concurrent, args.users, args.iterations)
+        await measure("overview aggregation", PetService.get_pets_overview, args.users, args.iterations)
+    finally:
+        await db.client.drop_database(args.database)
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--pets", type=int, default=3)
+    parser.add_argument("--vaccinations", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--database", default="pawdentify_bench_pets")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,95 @@
+"""
+Benchmark: scan_history reads per projection view
+Seeds a scratch collection with full scan documents in the configured
+MongoDB (MONGODB_URI / DATABASE_NAME), then reports latency, BSON bytes
+returned by the server and JSON response bytes for each view
+
+Usage (from the project root):
+    python -m benchmarks.projections --docs 1000 --iterations 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+
+from database.connection import get_database, close_database_connection
+from database.services import fetch_documents, resolve_projection
+from json_responses import dumps
+
+COLLECTION = "bench_projections"
+BREEDS = ["Golden_retriever", "Labrador_retriever", "Beagle", "Pug", "Border_collie"]
+
+
+async def seed(collection, count):
+    await collection.drop()
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        confidences = sorted((random.random() for _ in BREEDS), reverse=True)
+        docs.append({
+            "user_id": "bench_user",
+            "image_url": f"https://images.example.com/scans/{i}.jpg",
+            "image_hash": f"{random.getrandbits(128):032x}",
+            "predicted_breed": BREEDS[0],
+            "confidence_score": confidences[0],
+            "is_crossbreed": False,
+            "secondary_breed": None,
+            "top_predictions": [
+                {"breed_name": breed, "confidence": confidence}
+                for breed, confidence in zip(BREEDS, confidences)
+            ],
+            "timestamp": now - timedelta(minutes=i),
+            "device_type": "mobile",
+            "location": {"lat": 40.0 + random.random(), "lng": -74.0 + random.random(), "city": "New York"},
+            "user_feedback": None,
+            "user_notes": None,
+            "user_confirmed_breed": None,
+        })
+    await collection.insert_many(docs)
+    await collection.create_index([("user_id", 1), ("timestamp", -1)])
+
+
+async def measure(collection, view, count, iterations):
+    projection = resolve_projection("scan_history", view)
+    timings = []
+    docs = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        docs = await fetch_documents(
+            collection, {"user_id": "bench_user"}, sort={"timestamp": -1},
+            limit=count, projection=projection
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    bson_bytes = sum(len(bson.encode(doc)) for doc in docs)
+    json_bytes = len(dumps({"scans": docs}))
+    print(
+        f"{view:<10} mean={statistics.mean(timings):7.2f} ms  p95={p95:7.2f} ms  "
+        f"bson={bson_bytes:>9} B  json={json_bytes:>9} B"
+    )
+
+
+async def main(count, iterations):
+    db = get_database()
+    collection = db[COLLECTION]
+    try:
+        await seed(collection, count)
+        print(f"{count} documents, {iterations} iterations")
+        for view in ("detail", "list", "analytics"):
+            await measure(collection, view, count, iterations)
+    finally:
+        await collection.drop()
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.docs, args.iterations))
@@ -0,0 +1,63 @@
+"""
+Benchmark: re-scoring stored embeddings with the NumPy head
+Times blob decoding, the dense head and the vectorized crossbreed rules over
+synthetic float16 embeddings, batch by batch as rescoring.py processes them
+
+Usage (from the project root):
+    python -m benchmarks.rescoring --scans 1000000 --batch-size 5000 --dim 1280
+"""
+import argparse
+import time
+
+import numpy as np
+
+from crossbreed import CrossbreedThresholds, crossbreed_flags
+from database.embeddings import decode_embeddings, encode_embedding
+from model_head import DenseHead
+
+
+def main(scans, batch_size, dim, classes):
+    rng = np.random.default_rng(0)
+    head = DenseHead(rng.normal(0, 0.05, (dim, classes)), rng.normal(0, 0.01, classes))
+    thresholds = CrossbreedThresholds(confidence_threshold=0.65)
+
+    # One batch of stored blobs, reused so generation cost stays out of the timings
+    blobs = [encode_embedding(rng.normal(0, 1, dim)) for _ in range(batch_size)]
+
+    timings = {"decode": 0.0, "head": 0.0, "rules": 0.0}
+    flagged = 0
+    processed = 0
+    while processed < scans:
+        count = min(batch_size, scans - processed)
+
+        started = time.perf_counter()
+        embeddings = decode_embeddings(blobs[:count], dim)
+        timings["decode"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        probabilities = head(embeddings)
+        timings["head"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        flags, _, _ = crossbreed_flags(probabilities, thresholds)
+        timings["rules"] += time.perf_counter() - started
+
+        flagged += int(flags.sum())
+        processed += count
+
+    total = sum(timings.values())
+    print(f"{scans:,} scans, {dim}-d embeddings, {classes} classes, batches of {batch_size}")
+    for stage, seconds in timings.items():
+        print(f"{stage:<7} {seconds:8.2f} s")
+    print(f"total   {total:8.2f} s  ({scans / total:,.0f} scans/s, {flagged:,} flagged)")
+    print(f"storage {scans * dim * 2 / 1024 / 1024:,.0f} MB of float16 embeddings")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1280)
+    parser.add_argument("--classes", type=int, default=120)
+    args = parser.parse_args()
+    main(args.scans, args.batch_size, args.dim, args.classes)
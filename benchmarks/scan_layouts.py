@@ -0,0 +1,121 @@
+"""
+Benchmark: scan history layouts (collection, timeseries, bucketed)
+Inserts the same synthetic scans into each layout of a scratch database on
+the configured MongoDB (MONGODB_URI), then reports insert throughput,
+collStats sizes and the latency of the analytics reads ScanHistoryService
+issues. The scratch database is dropped afterwards
+
+Usage (from the project root):
+    python -m benchmarks.scan_layouts --scans 200000 --users 500 --concurrency 64
+        [--layouts collection timeseries bucketed]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+BREEDS = ["Pug", "Beagle", "Golden_retriever", "Labrador_retriever", "Siberian_husky", "Border_collie"]
+
+
+def synthetic_scan(rng, users, days):
+    breed = rng.choice(BREEDS)
+    return {
+        "user_id": f"user_{rng.randrange(users)}",
+        "image_url": None,
+        "image_hash": None,
+        "predicted_breed": breed,
+        "confidence_score": rng.uniform(0.3, 0.99),
+        "is_crossbreed": rng.random() < 0.1,
+        "secondary_breed": None,
+        "timestamp": datetime.utcnow() - timedelta(seconds=rng.uniform(0, days * 86400)),
+        "device_type": "mobile",
+        "location": None,
+        "user_feedback": None,
+        "user_notes": None,
+        "user_confirmed_breed": None,
+    }
+
+
+async def timed(coroutine_factory, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await coroutine_factory()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def run_layout(db, layout, scans, users, days, concurrency, repeats):
+    from database import scan_layout
+    from database.indexes import INDEX_SPECS, SCAN_LAYOUT_INDEX_SPECS, _create_index
+    from database.services import ScanHistoryService
+
+    scan_layout.configure_scan_storage(layout)
+    name = scan_layout.SCAN_COLLECTIONS[layout]
+    await db[name].drop()
+    await scan_layout.ensure_scan_collection(db, layout)
+    for spec in INDEX_SPECS.get(name) or SCAN_LAYOUT_INDEX_SPECS[name]:
+        await _create_index(db, name, spec)
+
+    rng = random.Random(11)
+    docs = [synthetic_scan(rng, users, days) for _ in range(scans)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def insert(doc):
+        async with semaphore:
+            await scan_layout.insert_scan(doc, db)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(insert(doc) for doc in docs))
+    elapsed = time.perf_counter() - started
+
+    stats = await db.command("collStats", name)
+    print(f"\n== {layout} ({name}) ==")
+    print(f"insert  {scans / elapsed:10,.0f} scans/s  ({elapsed:.1f} s, concurrency {concurrency})")
+    print(
+        f"size    data={stats.get('size', 0) / 1024 / 1024:8.1f} MB  "
+        f"storage={stats.get('storageSize', 0) / 1024 / 1024:8.1f} MB  "
+        f"indexes={stats.get('totalIndexSize', 0) / 1024 / 1024:8.1f} MB"
+    )
+
+    user_id = docs[0]["user_id"]
+    month_ago = datetime.utcnow() - timedelta(days=30)
+    reads = {
+        "get_user_scans(50)": lambda: ScanHistoryService.get_user_scans(user_id, limit=50, view="list"),
+        "get_scan_statistics": lambda: ScanHistoryService.get_scan_statistics(user_id),
+        "get_breed_frequency": lambda: ScanHistoryService.get_breed_frequency(user_id),
+        "scans_with_dates(30d)": lambda: ScanHistoryService.get_user_scans_with_dates(
+            user_id, limit=1000, start_date=month_ago, view="analytics"),
+    }
+    for label, read in reads.items():
+        print(f"{label:<22} median {await timed(read, repeats):8.2f} ms")
+
+
+async def main(args):
+    # Point the services at a scratch database before the first connection
+    os.environ["DATABASE_NAME"] = args.database
+    from database.connection import get_database, close_database_connection
+
+    db = get_database()
+    try:
+        for layout in args.layouts:
+            await run_layout(db, layout, args.scans, args.users, args.days, args.concurrency, args.repeats)
+    finally:
+        await db.client.drop_database(args.database)
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--layouts", nargs="+", default=["collection", "timeseries", "bucketed"])
+    parser.add_argument("--database", default="pawdentify_bench_layouts")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,101 @@
+"""
+Benchmark: scan document size with top_predictions vs packed probabilities
+Reports average BSON document size per encoding and extrapolates data size
+to the requested scan count. With --live, the documents are also inserted
+into scratch collections in the configured MongoDB (MONGODB_URI /
+DATABASE_NAME) and collStats storage and index sizes are reported
+
+Usage (from the project root):
+    python -m benchmarks.scan_storage --scans 1000000 --sample 10000 [--live]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+
+from database.probabilities import class_names, encode_probabilities, top_predictions
+
+ENCODINGS = ("legacy", "f16", "u8")
+
+
+def build_documents(encoding, sample, seed=7):
+    """Scan documents as create_scan would store them for one encoding"""
+    rng = np.random.default_rng(seed)
+    names = class_names()
+    now = datetime.utcnow()
+    docs = []
+    for i in range(sample):
+        logits = rng.normal(0, 3, len(names))
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        top = int(np.argmax(probabilities))
+        doc = {
+            "user_id": f"user_{i % 5000}",
+            "image_url": None,
+            "image_hash": None,
+            "predicted_breed": names[top],
+            "confidence_score": float(probabilities[top]),
+            "is_crossbreed": False,
+            "secondary_breed": None,
+            "timestamp": now - timedelta(seconds=i),
+            "device_type": "mobile",
+            "location": None,
+            "user_feedback": None,
+            "user_notes": None,
+            "user_confirmed_breed": None,
+        }
+        if encoding == "legacy":
+            doc["top_predictions"] = top_predictions(probabilities.astype(np.float32))
+        else:
+            doc["probabilities"] = bson.Binary(encode_probabilities(probabilities, encoding))
+            doc["probability_encoding"] = encoding
+        docs.append(doc)
+    return docs
+
+
+def report_offline(scans, sample):
+    print(f"Average BSON size over {sample} documents, extrapolated to {scans:,} scans")
+    baseline = None
+    for encoding in ENCODINGS:
+        docs = build_documents(encoding, sample)
+        average = sum(len(bson.encode(doc)) for doc in docs) / len(docs)
+        baseline = baseline or average
+        total_mb = average * scans / 1024 / 1024
+        print(f"{encoding:<7} {average:7.1f} B/doc  {total_mb:9.1f} MB  ({average / baseline:6.1%} of legacy)")
+
+
+async def report_live(scans, sample):
+    from database.connection import get_database, close_database_connection
+
+    db = get_database()
+    scale = scans / sample
+    print(f"\ncollStats for {sample} documents per encoding, scaled x{scale:g}")
+    try:
+        for encoding in ENCODINGS:
+            collection = db[f"bench_scan_storage_{encoding}"]
+            await collection.drop()
+            docs = build_documents(encoding, sample)
+            for start in range(0, len(docs), 1000):
+                await collection.insert_many(docs[start:start + 1000])
+            await collection.create_index([("user_id", 1), ("timestamp", -1)])
+            stats = await db.command("collStats", collection.name)
+            print(
+                f"{encoding:<7} data={stats['size'] * scale / 1024 / 1024:9.1f} MB  "
+                f"storage={stats['storageSize'] * scale / 1024 / 1024:9.1f} MB  "
+                f"indexes={stats['totalIndexSize'] * scale / 1024 / 1024:9.1f} MB"
+            )
+            await collection.drop()
+    finally:
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=10_000)
+    parser.add_argument("--live", action="store_true", help="Also measure collStats in MongoDB")
+    args = parser.parse_args()
+    report_offline(args.scans, args.sample)
+    if args.live:
+        asyncio.run(report_live(args.scans, args.sample))
@@ -0,0 +1,122 @@
+"""
+Benchmark: recording a scan in one unit vs the old two-call path
+Creates synthetic users in a scratch database on the configured MongoDB
+(MONGODB_URI), then times create_scan + increment_scan_count against
+ScanHistoryService.record_scan with and without an idempotency key, at
+the given concurrency. Each run then checks that total_scans matches the
+stored scans; a final run repeats every keyed request to show retries are
+neither stored nor counted twice. The scratch database is dropped afterwards
+
+Usage (from the project root):
+    python -m benchmarks.scan_writes --scans 20000 --users 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+
+
+def synthetic_scan(rng, users):
+    from database.models import BreedPrediction, ScanHistory
+
+    breed = rng.choice(["Pug", "Beagle", "Golden_retriever", "Border_collie"])
+    confidence = rng.uniform(0.3, 0.99)
+    return ScanHistory(
+        user_id=f"user_{rng.randrange(users)}",
+        predicted_breed=breed,
+        confidence_score=confidence,
+        top_predictions=[BreedPrediction(breed_name=breed, confidence=confidence)],
+    )
+
+
+async def reset(db, users):
+    from database.indexes import INDEX_SPECS, _create_index
+    from database.scan_layout import scan_collection
+
+    await scan_collection(db).delete_many({})
+    await db.scan_receipts.delete_many({})
+    await db.users.delete_many({})
+    await db.users.insert_many([
+        {"clerk_user_id": f"user_{u}", "email": f"user_{u}@example.com", "total_scans": 0}
+        for u in range(users)
+    ])
+    for collection in ("users", "scan_receipts"):
+        for spec in INDEX_SPECS[collection]:
+            await _create_index(db, collection, spec)
+
+
+async def run(label, write, scans, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(scan):
+        async with semaphore:
+            await write(scan)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(scan) for scan in scans))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<26} {len(scans) / elapsed:8,.0f} scans/s  ({elapsed:.1f} s)")
+
+
+async def check_counts(db):
+    from database.scan_layout import scan_collection, scan_pipeline
+
+    stored = await scan_collection(db).aggregate(scan_pipeline([{"$count": "total"}])).to_list(1)
+    counted = await db.users.aggregate([{"$group": {"_id": None, "total": {"$sum": "$total_scans"}}}]).to_list(1)
+    stored = stored[0]["total"] if stored else 0
+    counted = counted[0]["total"] if counted else 0
+    print(f"{'':<26} stored {stored:,}, counted {counted:,}{'' if stored == counted else '  MISMATCH'}")
+
+
+async def main(args):
+    # Point the services at a scratch database before the first connection
+    os.environ["DATABASE_NAME"] = args.database
+    from database.connection import get_database, close_database_connection, supports_transactions
+    from database.services import ScanHistoryService, UserService, _use_scan_transactions
+
+    async def two_calls(scan):
+        await ScanHistoryService.create_scan(scan)
+        await UserService.increment_scan_count(scan.user_id)
+
+    async def record(scan):
+        await ScanHistoryService.record_scan(scan)
+
+    keys = {}
+
+    async def record_keyed(scan):
+        key = keys.setdefault(id(scan), uuid.uuid4().hex)
+        await ScanHistoryService.record_scan(scan, key)
+
+    db = get_database()
+    try:
+        print(f"transactions supported: {await supports_transactions()}, "
+              f"record_scan uses them: {await _use_scan_transactions()}")
+        rng = random.Random(11)
+        scans = [synthetic_scan(rng, args.users) for _ in range(args.scans)]
+
+        for label, write in (
+            ("create + increment", two_calls),
+            ("record_scan", record),
+            ("record_scan, keyed", record_keyed),
+        ):
+            await reset(db, args.users)
+            await run(label, write, scans, args.concurrency)
+            await check_counts(db)
+
+        await run("record_scan, keyed retry", record_keyed, scans, args.concurrency)
+        await check_counts(db)
+    finally:
+        await db.client.drop_database(args.database)
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--database", default="pawdentify_bench_scan_writes")
+    args = parser.parse_args()
+    asyncio.run(main(args))
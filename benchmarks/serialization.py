@@ -0,0 +1,96 @@
+"""
+Benchmark: /api/scans response serialization
+Compares the default FastAPI path (stringify _id, jsonable_encoder, json.dumps)
+with the fast path in json_responses on a synthetic scan payload
+
+Usage (from the project root):
+    python -m benchmarks.serialization --scans 1000 --iterations 200
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from json_responses import FastJSONResponse, orjson
+
+BREEDS = [
+    "Golden_retriever", "Labrador_retriever", "German_shepherd", "Beagle",
+    "Pug", "Siberian_husky", "Border_collie", "Pomeranian",
+]
+
+
+def build_scans(count):
+    """Scan documents shaped as Motor returns them from scan_history"""
+    now = datetime.utcnow()
+    scans = []
+    for i in range(count):
+        breeds = random.sample(BREEDS, 5)
+        confidences = sorted((random.random() for _ in breeds), reverse=True)
+        scans.append({
+            "_id": ObjectId(),
+            "user_id": "bench_user",
+            "image_url": None,
+            "image_hash": f"{random.getrandbits(128):032x}",
+            "predicted_breed": breeds[0],
+            "confidence_score": confidences[0],
+            "is_crossbreed": confidences[0] < 0.6,
+            "secondary_breed": breeds[1] if confidences[0] < 0.6 else None,
+            "top_predictions": [
+                {"breed_name": breed, "confidence": confidence}
+                for breed, confidence in zip(breeds, confidences)
+            ],
+            "timestamp": now - timedelta(minutes=i),
+            "device_type": "mobile",
+            "location": None,
+            "user_feedback": None,
+            "user_notes": None,
+            "user_confirmed_breed": None,
+        })
+    return scans
+
+
+def current_path(scans):
+    for scan in scans:
+        scan["_id"] = str(scan["_id"])
+    payload = {"scans": scans, "count": len(scans), "limit": len(scans), "skip": 0}
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_path(scans):
+    payload = {"scans": scans, "count": len(scans), "limit": len(scans), "skip": 0}
+    return FastJSONResponse(payload).body
+
+
+def measure(label, func, scans, iterations):
+    timings = []
+    size = 0
+    for _ in range(iterations):
+        # Each iteration gets fresh documents, as a new query would
+        batch = [dict(scan) for scan in scans]
+        started = time.perf_counter()
+        size = len(func(batch))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<8} mean={statistics.mean(timings):7.2f} ms  p95={p95:7.2f} ms  body={size} bytes")
+
+
+def main(count, iterations):
+    scans = build_scans(count)
+    encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+    print(f"{count} scans, {iterations} iterations, fast encoder: {encoder}")
+    measure("current", current_path, scans, iterations)
+    measure("fast", fast_path, scans, iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    main(args.scans, args.iterations)
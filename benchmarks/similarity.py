@@ -0,0 +1,77 @@
+"""
+Benchmark: IVF similar-dog search vs brute force
+Builds an index over synthetic clustered embeddings in a temporary directory,
+then reports recall@k against exact search and per-query latency for several
+nprobe settings
+
+Usage (from the project root):
+    python -m benchmarks.similarity --vectors 100000 1000000 --dim 1280 --nlist 1024
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from similarity import IVFIndex, brute_force_search, train_centroids
+
+
+def synthetic_embeddings(rng, count, dim, clusters=120, spread=0.35):
+    """Embeddings grouped around one center per breed, like real backbone features"""
+    centers = rng.normal(0, 1, (clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    return centers[labels] + rng.normal(0, spread, (count, dim)).astype(np.float32)
+
+
+def build(directory, rng, count, dim, nlist, train_size, chunk_size=50_000):
+    started = time.perf_counter()
+    index = IVFIndex.create(directory, train_centroids(synthetic_embeddings(rng, train_size, dim), nlist))
+    trained = time.perf_counter() - started
+
+    for start in range(0, count, chunk_size):
+        vectors = synthetic_embeddings(rng, min(chunk_size, count - start), dim)
+        ids = [int(row).to_bytes(12, "big") for row in range(start, start + len(vectors))]
+        index.add(ids, vectors)
+    print(f"built {len(index):,} vectors: train {trained:.1f} s, add {time.perf_counter() - started - trained:.1f} s")
+    return index
+
+
+def run(count, dim, nlist, train_size, queries, k, nprobes):
+    rng = np.random.default_rng(0)
+    print(f"\n== {count:,} vectors, {dim}-d, nlist={nlist} ==")
+    with tempfile.TemporaryDirectory() as directory:
+        index = build(directory, rng, count, dim, nlist, train_size)
+        query_vectors = synthetic_embeddings(rng, queries, dim)
+
+        exact, timings = [], []
+        for query in query_vectors:
+            started = time.perf_counter()
+            rows, _ = brute_force_search(index._vectors, query, k)
+            timings.append((time.perf_counter() - started) * 1000)
+            exact.append({index._ids[row].tobytes() for row in rows})
+        print(f"{'brute':<12} recall@{k}=1.000  mean={statistics.mean(timings):8.2f} ms")
+
+        for nprobe in nprobes:
+            hits, timings = 0, []
+            for query, truth in zip(query_vectors, exact):
+                started = time.perf_counter()
+                found = index.search(query, k, nprobe)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits += len(truth & {item for item, _ in found})
+            recall = hits / (len(exact) * k)
+            print(f"nprobe={nprobe:<5} recall@{k}={recall:.3f}  mean={statistics.mean(timings):8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=1280)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--train-size", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+    for count in args.vectors:
+        run(count, args.dim, args.nlist, args.train_size, args.queries, args.k, args.nprobe)
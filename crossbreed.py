@@ -0,0 +1,67 @@
+"""
+Crossbreed detection rules
+Shared by /predict and the embedding re-scoring job, so a threshold change
+can be replayed over past scans with the same logic
+"""
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+class CrossbreedThresholds(BaseModel):
+    confidence_threshold: float = Field(default=0.70, ge=0.0, le=1.0, description="Primary confidence below this flags a mix")
+    secondary_threshold: float = Field(default=0.15, ge=0.0, le=1.0, description="Secondary breed must have at least this confidence")
+    confidence_gap: float = Field(default=0.30, ge=0.0, le=1.0, description="Gap between the top 2 predictions must be below this")
+
+
+DEFAULT_THRESHOLDS = CrossbreedThresholds()
+
+
+def analyze_crossbreed(
+    top_predictions: List[Dict[str, Any]],
+    thresholds: CrossbreedThresholds = DEFAULT_THRESHOLDS
+) -> Optional[Dict[str, Any]]:
+    """Crossbreed analysis for sorted {breed, confidence} predictions, or None for a single breed"""
+    if len(top_predictions) < 2:
+        return None
+
+    primary_conf = top_predictions[0]["confidence"]
+    secondary_conf = top_predictions[1]["confidence"]
+    confidence_gap_actual = primary_conf - secondary_conf
+
+    # Determine crossbreed based on multiple criteria
+    if not (primary_conf < thresholds.confidence_threshold or
+            (secondary_conf > thresholds.secondary_threshold and confidence_gap_actual < thresholds.confidence_gap)):
+        return None
+
+    return {
+        "primary_breed": top_predictions[0]["breed"],
+        "primary_confidence": primary_conf,
+        "secondary_breed": top_predictions[1]["breed"],
+        "secondary_confidence": secondary_conf,
+        "confidence_gap": confidence_gap_actual,
+        "crossbreed_likelihood": min(1.0, (secondary_conf / primary_conf) + 0.3),
+        "suggested_mix": f"{top_predictions[0]['breed']} x {top_predictions[1]['breed']} Mix"
+    }
+
+
+def crossbreed_flags(
+    probabilities: np.ndarray,
+    thresholds: CrossbreedThresholds = DEFAULT_THRESHOLDS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized analyze_crossbreed over an (n, classes) probability matrix
+    Returns (is_crossbreed, primary class index, secondary class index)
+    """
+    top_two = np.argpartition(probabilities, -2, axis=1)[:, -2:]
+    rows = np.arange(len(probabilities))[:, None]
+    order = np.argsort(probabilities[rows, top_two], axis=1)[:, ::-1]
+    top_two = top_two[rows, order]
+
+    primary = probabilities[rows[:, 0], top_two[:, 0]]
+    secondary = probabilities[rows[:, 0], top_two[:, 1]]
+    flags = (primary < thresholds.confidence_threshold) | (
+        (secondary > thresholds.secondary_threshold) & (primary - secondary < thresholds.confidence_gap)
+    )
+    return flags, top_two[:, 0], top_two[:, 1]
@@ -0,0 +1,524 @@
+"""
+Account data subsystem
+Exports everything stored for a user as one gzip-compressed NDJSON archive
+and deletes all of it again, each as a background job with progress on an
+account_jobs document.
+
+Jobs checkpoint after every batch and hold a lease while they run; a job
+whose worker died is picked up by resume_jobs() once the lease lapses and
+carries on from its checkpoint. The export file is a series of gzip
+members, one per batch, so a resumed export truncates back to the last
+checkpoint and appends. Deletes run as batched delete_many calls with
+majority write concern and a pause between batches, so a large account
+doesn't monopolise the cluster or outrun replication.
+
+The popular-breed leaderboard only holds anonymous counters and is left
+alone. Vectors in the on-disk similarity index stay until the next
+rebuild, but their scans are gone, so they no longer match.
+"""
+import asyncio
+import os
+import re
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, AsyncIterator, Callable, List, Tuple
+
+from bson import ObjectId, json_util
+from pymongo import ReturnDocument
+from pymongo.write_concern import WriteConcern
+
+from . import scan_layout, services
+from .archive import ScanArchiveService
+from .connection import get_database
+from .exports import EXPORT_DIR
+from .leases import worker_id
+from .probabilities import expand_scan
+from .scan_layout import find_scans, scan_collection, scan_pipeline
+from .services import FeedbackService
+
+
+ACCOUNT_BATCH_SIZE = int(os.getenv("ACCOUNT_BATCH_SIZE", "500"))
+# Pause between delete batches; raise it to go easier on a busy cluster
+ACCOUNT_DELETE_PAUSE_SECONDS = float(os.getenv("ACCOUNT_DELETE_PAUSE_SECONDS", "0.05"))
+ACCOUNT_JOB_LEASE_SECONDS = float(os.getenv("ACCOUNT_JOB_LEASE_SECONDS", "300"))
+# Finished job documents expire after this long (export files stay in EXPORT_DIR)
+ACCOUNT_JOB_RETENTION_DAYS = int(os.getenv("ACCOUNT_JOB_RETENTION_DAYS", "7"))
+
+ACCOUNT_JOB_KINDS = ("export", "delete")
+ACTIVE_STATUSES = ("pending", "running")
+
+# Field holding the owner's Clerk ID; every other collection uses user_id
+USER_FIELDS = {"users": "clerk_user_id", "recent_searches": "_id"}
+
+# Steps name a collection, except "scans" (the active scan layout),
+# "archived_scans" (cold segments and rollups), "scan_receipts" (keyed by
+# an _id prefix) and "export_files" (analytics and account export files)
+EXPORT_STEPS = [
+    "users", "user_preferences", "scans", "archived_scans", "search_history", "recent_searches",
+    "pets", "vaccinations", "feedback", "community_feedback",
+]
+# Derived and operational data first, the users document last. The
+# user_data_versions counter is bumped rather than deleted: starting it over
+# at 0 would reissue ETags that clients already hold
+DELETE_STEPS = [
+    "export_files", "scan_embeddings", "scan_receipts", "scans", "archived_scans", "search_history",
+    "recent_searches", "vaccinations", "pets", "feedback", "community_feedback", "user_preferences",
+    "users",
+]
+
+_WORKER = worker_id()
+_MAJORITY = WriteConcern("majority")
+
+
+class _LeaseLost(Exception):
+    """Another worker took the job over; stop without touching it"""
+
+
+def account_export_filename(clerk_user_id: str, stamp: Optional[datetime] = None) -> str:
+    stamp = stamp or datetime.utcnow()
+    return f"pawdentify-account-{clerk_user_id}_{stamp.strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+
+
+def _user_filter(step: str, clerk_user_id: str) -> Dict[str, Any]:
+    if step == "scan_receipts":
+        # Receipt _ids are "<user_id>|<key>"; an anchored prefix uses the _id index
+        return {"_id": {"$regex": f"^{re.escape(clerk_user_id)}\\|"}}
+    return {USER_FIELDS.get(step, "user_id"): clerk_user_id}
+
+
+def _encode_batch(lines: List[Dict[str, Any]]) -> bytes:
+    """One complete gzip member; concatenated members read back as one stream"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    data = "".join(
+        json_util.dumps(line, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n" for line in lines
+    ).encode("utf-8")
+    return compressor.compress(data) + compressor.flush()
+
+
+class AccountJobService:
+    """Background export and deletion of all of a user's data"""
+
+    # Keep references so running jobs are not garbage collected
+    _tasks: Dict[str, asyncio.Task] = {}
+    # Called with the user's id once a delete job has finished
+    _deletion_listeners: List[Callable[[str], None]] = []
+
+    @staticmethod
+    def add_deletion_listener(listener: Callable[[str], None]) -> None:
+        """Register a callback for in-process state (e.g. response caches) to drop a deleted user"""
+        AccountJobService._deletion_listeners.append(listener)
+
+    # ==================== Jobs ====================
+    @staticmethod
+    async def create_job(clerk_user_id: str, kind: str) -> Dict[str, Any]:
+        """
+        Register an export or delete job and start it in the background
+        A job of the same kind that is still running is returned instead
+        """
+        if kind not in ACCOUNT_JOB_KINDS:
+            raise ValueError(f"Unsupported account job kind: {kind}")
+        db = get_database()
+        existing = await db.account_jobs.find_one(
+            {"user_id": clerk_user_id, "kind": kind, "status": {"$in": list(ACTIVE_STATUSES)}}
+        )
+        if existing:
+            lease = existing.get("lease_expires_at")
+            if lease is None or lease < datetime.utcnow():
+                # Its worker is gone; pick it up here instead of waiting for a restart
+                AccountJobService._start(existing["_id"])
+            return AccountJobService._public(existing)
+
+        steps = EXPORT_STEPS if kind == "export" else DELETE_STEPS
+        now = datetime.utcnow()
+        job = {
+            "user_id": clerk_user_id,
+            "kind": kind,
+            "status": "pending",
+            "steps": steps,
+            "step": 0,
+            "checkpoint": None,
+            "counts": {},
+            "done": 0,
+            "total": await AccountJobService._estimate(clerk_user_id, steps),
+            "bytes_written": 0,
+            "filename": account_export_filename(clerk_user_id, now) if kind == "export" else None,
+            "file_path": None,
+            "worker": None,
+            "lease_expires_at": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "completed_at": None,
+        }
+        result = await db.account_jobs.insert_one(job)
+        AccountJobService._start(result.inserted_id)
+        return AccountJobService._public(job)
+
+    @staticmethod
+    def _start(job_id: ObjectId) -> None:
+        key = str(job_id)
+        if key in AccountJobService._tasks:
+            return
+        task = asyncio.create_task(AccountJobService.run_job(job_id))
+        AccountJobService._tasks[key] = task
+        task.add_done_callback(lambda _: AccountJobService._tasks.pop(key, None))
+
+    @staticmethod
+    async def resume_jobs() -> int:
+        """Restart unfinished jobs whose worker is gone; returns how many were picked up"""
+        db = get_database()
+        query = {
+            "status": {"$in": list(ACTIVE_STATUSES)},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": datetime.utcnow()}}],
+        }
+        resumed = 0
+        async for job in db.account_jobs.find(query, {"_id": 1}):
+            AccountJobService._start(job["_id"])
+            resumed += 1
+        return resumed
+
+    @staticmethod
+    async def retry_job(job_id: str, clerk_user_id: str) -> Optional[Dict[str, Any]]:
+        """Continue a failed job from its last checkpoint"""
+        db = get_database()
+        try:
+            object_id = ObjectId(job_id)
+        except Exception:
+            return None
+        job = await db.account_jobs.find_one_and_update(
+            {"_id": object_id, "user_id": clerk_user_id, "status": "failed"},
+            {"$set": {"status": "pending", "error": None, "completed_at": None, "expire_at": None,
+                      "lease_expires_at": None}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return await AccountJobService.get_job(job_id, clerk_user_id)
+        AccountJobService._start(object_id)
+        return AccountJobService._public(job)
+
+    @staticmethod
+    async def get_job(job_id: str, clerk_user_id: str, include_path: bool = False) -> Optional[Dict[str, Any]]:
+        """Get an account job owned by the user"""
+        db = get_database()
+        try:
+            job = await db.account_jobs.find_one({"_id": ObjectId(job_id), "user_id": clerk_user_id})
+        except Exception:
+            return None
+        if not job:
+            return None
+        return AccountJobService._public(job, include_path)
+
+    @staticmethod
+    def _public(job: Dict[str, Any], include_path: bool = False) -> Dict[str, Any]:
+        steps = job["steps"]
+        public = {
+            "_id": str(job["_id"]) if "_id" in job else None,
+            "kind": job["kind"],
+            "status": job["status"],
+            "current_step": steps[job["step"]] if job["step"] < len(steps) else None,
+            "steps_completed": job["step"],
+            "steps_total": len(steps),
+            "counts": job.get("counts", {}),
+            "done": job.get("done", 0),
+            "total": job.get("total", 0),
+            "progress": AccountJobService._progress(job),
+            "bytes_written": job.get("bytes_written", 0),
+            "filename": job.get("filename"),
+            "error": job.get("error"),
+            "created_at": job.get("created_at"),
+            "updated_at": job.get("updated_at"),
+            "completed_at": job.get("completed_at"),
+        }
+        if include_path:
+            public["file_path"] = job.get("file_path")
+        return public
+
+    @staticmethod
+    def _progress(job: Dict[str, Any]) -> float:
+        if job["status"] == "completed":
+            return 1.0
+        # The total is estimated at creation, so cap the ratio until the job ends
+        return round(min(job.get("done", 0) / max(job.get("total", 0), 1), 0.99), 4)
+
+    @staticmethod
+    async def _estimate(clerk_user_id: str, steps: List[str]) -> int:
+        """Rough number of documents the job will handle, for the progress ratio"""
+        db = get_database()
+        total = 0
+        for step in steps:
+            if step == "scans":
+                counted = await scan_collection().aggregate(
+                    scan_pipeline([{"$match": {"user_id": clerk_user_id}}, {"$count": "total"}])
+                ).to_list(1)
+                total += counted[0]["total"] if counted else 0
+            elif step == "archived_scans":
+                total += (await ScanArchiveService.get_statistics(clerk_user_id))["total_scans"]
+            elif step == "export_files":
+                total += await db.export_jobs.count_documents({"user_id": clerk_user_id})
+            else:
+                total += await db[step].count_documents(_user_filter(step, clerk_user_id))
+        return total
+
+    # ==================== Running ====================
+    @staticmethod
+    async def _claim(job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        db = get_database()
+        now = datetime.utcnow()
+        return await db.account_jobs.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$in": list(ACTIVE_STATUSES)},
+                "$or": [{"worker": _WORKER}, {"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            {"$set": {
+                "status": "running",
+                "worker": _WORKER,
+                "lease_expires_at": now + timedelta(seconds=ACCOUNT_JOB_LEASE_SECONDS),
+                "updated_at": now,
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    async def _checkpoint(
+        job: Dict[str, Any],
+        fields: Dict[str, Any],
+        step: Optional[str] = None,
+        processed: int = 0
+    ) -> None:
+        """Record progress and renew the lease; raises _LeaseLost if another worker took over"""
+        db = get_database()
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"$set": dict(
+            fields,
+            lease_expires_at=now + timedelta(seconds=ACCOUNT_JOB_LEASE_SECONDS),
+            updated_at=now
+        )}
+        if processed:
+            update["$inc"] = {"done": processed, f"counts.{step}": processed}
+        result = await db.account_jobs.update_one({"_id": job["_id"], "worker": _WORKER}, update)
+        if result.matched_count == 0:
+            raise _LeaseLost()
+
+    @staticmethod
+    async def run_job(job_id: ObjectId) -> None:
+        """Run (or resume) a job while holding its lease"""
+        db = get_database()
+        job = await AccountJobService._claim(job_id)
+        if job is None:
+            return
+        try:
+            if job["kind"] == "export":
+                await AccountJobService._run_export(job)
+            else:
+                await AccountJobService._run_delete(job)
+        except _LeaseLost:
+            print(f"⚠️ Account job {job_id} was taken over by another worker")
+        except Exception as e:
+            # The checkpoint is kept, so retry_job continues from here
+            await db.account_jobs.update_one(
+                {"_id": job_id, "worker": _WORKER},
+                {"$set": {"status": "failed", "error": str(e), "lease_expires_at": None,
+                          "updated_at": datetime.utcnow()}}
+            )
+            print(f"❌ Account job {job_id} failed: {str(e)}")
+
+    @staticmethod
+    async def _finish(job: Dict[str, Any], fields: Optional[Dict[str, Any]] = None) -> None:
+        now = datetime.utcnow()
+        await AccountJobService._checkpoint(job, dict(
+            fields or {},
+            status="completed",
+            step=len(job["steps"]),
+            checkpoint=None,
+            completed_at=now,
+            expire_at=now + timedelta(days=ACCOUNT_JOB_RETENTION_DAYS)
+        ))
+
+    # ==================== Export ====================
+    @staticmethod
+    async def _export_batches(
+        clerk_user_id: str,
+        step: str,
+        checkpoint: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """Yield (documents, checkpoint after them) for one step, resuming from checkpoint"""
+        if step == "archived_scans":
+            # Segments have no cursor to resume; skip whole segments by count instead
+            skip = checkpoint["skip"] if checkpoint else 0
+            batch: List[Dict[str, Any]] = []
+            async for scan in ScanArchiveService.iter_scans(clerk_user_id, skip=skip):
+                batch.append(expand_scan(scan))
+                if len(batch) >= ACCOUNT_BATCH_SIZE:
+                    skip += len(batch)
+                    yield batch, {"skip": skip}
+                    batch = []
+            if batch:
+                yield batch, {"skip": skip + len(batch)}
+            return
+
+        query = _user_filter(step, clerk_user_id)
+        if checkpoint:
+            if "_id" in query:
+                # Keyed by the user's id: the single document is already out
+                return
+            query["_id"] = {"$gt": checkpoint["after"]}
+        if step == "scans":
+            cursor = find_scans(query, sort={"_id": 1}, batch_size=ACCOUNT_BATCH_SIZE)
+        else:
+            cursor = get_database()[step].find(query).sort("_id", 1).batch_size(ACCOUNT_BATCH_SIZE)
+
+        batch = []
+        async for document in cursor:
+            batch.append(expand_scan(document) if step == "scans" else document)
+            if len(batch) >= ACCOUNT_BATCH_SIZE:
+                yield batch, {"after": batch[-1]["_id"]}
+                batch = []
+        if batch:
+            yield batch, {"after": batch[-1]["_id"]}
+
+    @staticmethod
+    async def _run_export(job: Dict[str, Any]) -> None:
+        import aiofiles
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        file_path = job.get("file_path") or os.path.join(EXPORT_DIR, f"account-{job['_id']}.ndjson.gz")
+        offset = job.get("bytes_written", 0) if job.get("file_path") else 0
+        steps = job["steps"]
+
+        async with aiofiles.open(file_path, "r+b" if offset else "wb") as f:
+            # Anything past the last checkpoint is a partial batch from the previous run
+            await f.truncate(offset)
+            await f.seek(offset)
+            if offset == 0:
+                header = _encode_batch([{
+                    "type": "manifest",
+                    "user_id": job["user_id"],
+                    "collections": steps,
+                    "exported_at": datetime.utcnow(),
+                }])
+                await f.write(header)
+                offset += len(header)
+                await AccountJobService._checkpoint(job, {"file_path": file_path, "bytes_written": offset})
+
+            for index in range(job["step"], len(steps)):
+                step = steps[index]
+                checkpoint = job.get("checkpoint") if index == job["step"] else None
+                async for documents, next_checkpoint in AccountJobService._export_batches(
+                    job["user_id"], step, checkpoint
+                ):
+                    data = _encode_batch([{"collection": step, "document": document} for document in documents])
+                    await f.write(data)
+                    await f.flush()
+                    offset += len(data)
+                    await AccountJobService._checkpoint(
+                        job,
+                        {"step": index, "checkpoint": next_checkpoint, "bytes_written": offset},
+                        step,
+                        len(documents)
+                    )
+                await AccountJobService._checkpoint(job, {"step": index + 1, "checkpoint": None})
+
+        await AccountJobService._finish(job, {"bytes_written": offset})
+        print(f"✅ Account export {job['_id']} completed ({offset} bytes)")
+
+    # ==================== Deletion ====================
+    @staticmethod
+    async def _delete_in_batches(
+        collection,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Delete matching documents batch by batch, yielding each deleted batch"""
+        throttled = collection.with_options(write_concern=_MAJORITY)
+        while True:
+            documents = await collection.find(query, projection or {"_id": 1}) \
+                .limit(ACCOUNT_BATCH_SIZE).to_list(ACCOUNT_BATCH_SIZE)
+            if not documents:
+                return
+            await throttled.delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+            yield documents
+            await asyncio.sleep(ACCOUNT_DELETE_PAUSE_SECONDS)
+
+    @staticmethod
+    async def _delete_export_files(job: Dict[str, Any]) -> AsyncIterator[int]:
+        db = get_database()
+        user_id = job["user_id"]
+
+        def remove(path: Optional[str]) -> None:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+        async for jobs in AccountJobService._delete_in_batches(
+            db.export_jobs, {"user_id": user_id}, {"file_path": 1}
+        ):
+            for export in jobs:
+                await asyncio.to_thread(remove, export.get("file_path"))
+            yield len(jobs)
+        # Earlier account exports go as well; this job's own document stays for status polling
+        async for jobs in AccountJobService._delete_in_batches(
+            db.account_jobs, {"user_id": user_id, "kind": "export"}, {"file_path": 1}
+        ):
+            for export in jobs:
+                await asyncio.to_thread(remove, export.get("file_path"))
+            yield 0
+
+    @staticmethod
+    async def _delete_scans(clerk_user_id: str) -> AsyncIterator[int]:
+        collection = scan_collection()
+        if scan_layout.SCAN_STORAGE_MODE == "timeseries":
+            # Time-series deletes can only filter on the metaField before 7.0,
+            # so this one can't be split into _id batches
+            result = await collection.with_options(write_concern=_MAJORITY).delete_many({"user_id": clerk_user_id})
+            yield result.deleted_count
+            return
+        bucketed = scan_layout.SCAN_STORAGE_MODE == "bucketed"
+        async for documents in AccountJobService._delete_in_batches(
+            collection, {"user_id": clerk_user_id}, {"count": 1} if bucketed else None
+        ):
+            yield sum(document.get("count", 0) for document in documents) if bucketed else len(documents)
+
+    @staticmethod
+    async def _delete_step(job: Dict[str, Any], step: str) -> AsyncIterator[int]:
+        """Delete one step's data, yielding the number of records removed per batch"""
+        db = get_database()
+        user_id = job["user_id"]
+        if step == "export_files":
+            async for removed in AccountJobService._delete_export_files(job):
+                yield removed
+        elif step == "scans":
+            async for removed in AccountJobService._delete_scans(user_id):
+                yield removed
+        elif step == "archived_scans":
+            removed = (await ScanArchiveService.get_statistics(user_id))["total_scans"]
+            await ScanArchiveService.delete_user_archive(user_id)
+            yield removed
+        elif step == "feedback":
+            async for records in AccountJobService._delete_in_batches(
+                db.feedback, _user_filter(step, user_id), {"status": 1, "rating": 1}
+            ):
+                await FeedbackService.discount_statistics(records)
+                yield len(records)
+        else:
+            async for documents in AccountJobService._delete_in_batches(db[step], _user_filter(step, user_id)):
+                yield len(documents)
+
+    @staticmethod
+    async def _run_delete(job: Dict[str, Any]) -> None:
+        steps = job["steps"]
+        # Deleting is idempotent, so a resumed step simply starts over
+        for index in range(job["step"], len(steps)):
+            step = steps[index]
+            async for removed in AccountJobService._delete_step(job, step):
+                await AccountJobService._checkpoint(job, {"step": index}, step, removed)
+            await AccountJobService._checkpoint(job, {"step": index + 1})
+
+        # configure_cache() may have swapped the cache, so look it up at call time
+        await services.cache.invalidate(
+            services._user_cache_key(job["user_id"]), services._preferences_cache_key(job["user_id"])
+        )
+        await services.DataVersionService.bump(job["user_id"])
+        await AccountJobService._finish(job)
+        for listener in AccountJobService._deletion_listeners:
+            listener(job["user_id"])
+        print(f"✅ Account data of {job['user_id']} deleted (job {job['_id']})")
@@ -0,0 +1,486 @@
+"""
+Hot/cold tiering of scan history
+Scans from months older than SCAN_ARCHIVE_AFTER_DAYS move out of the hot scan
+layout into compressed columnar segment files, one per user-month, on local
+disk or S3. A scan_rollups document per user-month keeps the counts the
+statistics need and doubles as the segment catalogue, so history reads only
+open the segments they have to. This keeps the hot working set and its
+indexes small enough to stay in RAM
+
+Run periodically (e.g. nightly from cron) from the project root:
+    python -m database.archive [--older-than-days 400] [--dry-run]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterable
+from urllib.parse import quote
+
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # SCAN_ARCHIVE_* settings are read when this module and its imports load
+    load_dotenv()
+
+from .connection import get_database
+from .probabilities import PROBABILITY_ENCODING, encode_probabilities, vector_from_top_predictions
+from .scan_layout import delete_scans, find_scans, month_start, scan_collection, scan_pipeline
+
+
+SCAN_ARCHIVE_AFTER_DAYS = int(os.getenv("SCAN_ARCHIVE_AFTER_DAYS", "400"))
+SCAN_ARCHIVE_DIR = os.getenv("SCAN_ARCHIVE_DIR", os.path.join(os.getcwd(), "scan_archive"))
+
+# Columns stored as dictionary-encoded strings; None is code -1
+STRING_COLUMNS = (
+    "predicted_breed", "secondary_breed", "device_type", "image_url", "image_hash",
+    "user_feedback", "user_notes", "user_confirmed_breed", "probability_encoding", "location",
+)
+JSON_COLUMNS = {"location"}
+
+
+# ==================== Segment Format ====================
+def _string_column(values: List[Any], as_json: bool) -> Dict[str, np.ndarray]:
+    dictionary: Dict[str, int] = {}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for row, value in enumerate(values):
+        if value is None:
+            continue
+        text = json.dumps(value, default=str) if as_json else str(getattr(value, "value", value))
+        codes[row] = dictionary.setdefault(text, len(dictionary))
+    return {"codes": codes, "values": np.array(list(dictionary), dtype=np.str_)}
+
+
+def encode_segment(scans: List[Dict[str, Any]]) -> bytes:
+    """
+    Pack scans into a compressed columnar segment (an .npz archive)
+    Legacy top_predictions are folded into the probability blob first
+    """
+    scans = sorted(scans, key=lambda scan: scan["timestamp"])
+    columns: Dict[str, np.ndarray] = {
+        "_id": np.array([list(scan["_id"].binary) for scan in scans], dtype=np.uint8).reshape(-1, 12),
+        "timestamp": np.array([scan["timestamp"] for scan in scans], dtype="datetime64[ms]"),
+        "confidence_score": np.array([scan.get("confidence_score") or 0.0 for scan in scans], dtype=np.float32),
+        "is_crossbreed": np.array([bool(scan.get("is_crossbreed")) for scan in scans], dtype=bool),
+    }
+
+    blobs = []
+    encodings = []
+    for scan in scans:
+        blob, encoding = scan.get("probabilities"), scan.get("probability_encoding")
+        if blob is None and scan.get("top_predictions"):
+            blob = encode_probabilities(vector_from_top_predictions(scan["top_predictions"]))
+            encoding = PROBABILITY_ENCODING
+        blobs.append(bytes(blob) if blob is not None else b"")
+        encodings.append(encoding if blob is not None else None)
+    columns["probabilities.data"] = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+    columns["probabilities.offsets"] = np.cumsum([0] + [len(blob) for blob in blobs], dtype=np.int64)
+
+    for name in STRING_COLUMNS:
+        values = encodings if name == "probability_encoding" else [scan.get(name) for scan in scans]
+        for part, array in _string_column(values, name in JSON_COLUMNS).items():
+            columns[f"{name}.{part}"] = array
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **columns)
+    return buffer.getvalue()
+
+
+def decode_segment(data: bytes, fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Unpack a segment into scan dicts (string _id), oldest first
+    Only the requested fields are decompressed; None reads every column
+    """
+    archive = np.load(io.BytesIO(data), allow_pickle=False)
+    wanted = set(fields) if fields is not None else None
+
+    def selected(name: str) -> bool:
+        return wanted is None or name in wanted
+
+    ids = archive["_id"]
+    rows: List[Dict[str, Any]] = [{"_id": str(ObjectId(row.tobytes()))} for row in ids]
+
+    if selected("timestamp"):
+        for row, value in zip(rows, archive["timestamp"].tolist()):
+            row["timestamp"] = value
+    for name in ("confidence_score", "is_crossbreed"):
+        if selected(name):
+            for row, value in zip(rows, archive[name].tolist()):
+                row[name] = value
+
+    if selected("probabilities"):
+        blob_data = archive["probabilities.data"].tobytes()
+        offsets = archive["probabilities.offsets"]
+        for i, row in enumerate(rows):
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            row["probabilities"] = blob_data[start:end] if end > start else None
+
+    for name in STRING_COLUMNS:
+        if not selected(name) and not (name == "probability_encoding" and selected("probabilities")):
+            continue
+        values = archive[f"{name}.values"].tolist()
+        for row, code in zip(rows, archive[f"{name}.codes"].tolist()):
+            value = values[code] if code >= 0 else None
+            row[name] = json.loads(value) if name in JSON_COLUMNS and value is not None else value
+    return rows
+
+
+def segment_key(clerk_user_id: str, month: datetime) -> str:
+    return f"{quote(clerk_user_id, safe='')}/{month:%Y-%m}.npz"
+
+
+def user_prefix(clerk_user_id: str) -> str:
+    return f"{quote(clerk_user_id, safe='')}/"
+
+
+# ==================== Segment Stores ====================
+class LocalSegmentStore:
+    """Segments as files under a local directory"""
+
+    def __init__(self, root: str = SCAN_ARCHIVE_DIR):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + ".part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def _delete_prefix(self, prefix: str) -> int:
+        directory = self._path(prefix.rstrip("/"))
+        if not os.path.isdir(directory):
+            return 0
+        names = os.listdir(directory)
+        for name in names:
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        return len(names)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        return await asyncio.to_thread(self._delete_prefix, prefix)
+
+
+class S3SegmentStore:
+    """Segments as objects in an S3-compatible bucket (needs boto3)"""
+
+    def __init__(self, client, bucket: str, prefix: str = "scan-archive/"):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @classmethod
+    def from_env(cls) -> "S3SegmentStore":
+        import boto3
+        client = boto3.client("s3", endpoint_url=os.getenv("SCAN_ARCHIVE_S3_ENDPOINT") or None)
+        return cls(client, os.environ["SCAN_ARCHIVE_BUCKET"], os.getenv("SCAN_ARCHIVE_PREFIX", "scan-archive/"))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def _delete_prefix(self, prefix: str) -> int:
+        deleted = 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys})
+                deleted += len(keys)
+        return deleted
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        return await asyncio.to_thread(self._delete_prefix, prefix)
+
+
+def _default_segment_store():
+    """Pick the store from the SCAN_ARCHIVE_BACKEND environment variable"""
+    if os.getenv("SCAN_ARCHIVE_BACKEND", "local").lower() == "s3":
+        return S3SegmentStore.from_env()
+    return LocalSegmentStore(SCAN_ARCHIVE_DIR)
+
+
+_segment_store = None
+
+
+def get_segment_store():
+    global _segment_store
+    if _segment_store is None:
+        _segment_store = _default_segment_store()
+    return _segment_store
+
+
+def configure_segment_store(store) -> None:
+    """Swap the segment store, e.g. for a temporary directory in benchmarks"""
+    global _segment_store
+    _segment_store = store
+
+
+# ==================== Rollups ====================
+def compute_rollup(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Counters for one user-month of archived scans"""
+    breeds: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        breed = breeds.setdefault(row.get("predicted_breed"), {"count": 0, "confidence_sum": 0.0})
+        breed["count"] += 1
+        breed["confidence_sum"] += row.get("confidence_score") or 0.0
+    return {
+        "total_scans": len(rows),
+        "crossbreed_count": sum(1 for row in rows if row.get("is_crossbreed")),
+        "confidence_sum": sum(row.get("confidence_score") or 0.0 for row in rows),
+        "breeds": [dict(breed=name, **counters) for name, counters in breeds.items()],
+    }
+
+
+class ScanArchiveService:
+    """Cold scan history: archival, rollups and reads"""
+
+    @staticmethod
+    async def archive_user_month(clerk_user_id: str, month: datetime, scans: List[Dict[str, Any]]) -> int:
+        """
+        Move one user-month of hot scans into its segment
+        The segment and rollup are written before the hot scans are deleted,
+        and merged by _id, so an interrupted run can simply be repeated
+        """
+        db = get_database()
+        store = get_segment_store()
+        key = segment_key(clerk_user_id, month)
+
+        merged = {scan["_id"]: scan for scan in scans}
+        existing = await store.get(key)
+        if existing is not None:
+            for row in decode_segment(existing):
+                object_id = ObjectId(row["_id"])
+                if object_id not in merged:
+                    row["_id"] = object_id
+                    merged[object_id] = row
+
+        rows = list(merged.values())
+        await store.put(key, await asyncio.to_thread(encode_segment, rows))
+        await db.scan_rollups.update_one(
+            {"_id": f"{clerk_user_id}:{month:%Y-%m}"},
+            {"$set": dict(
+                compute_rollup(rows),
+                user_id=clerk_user_id,
+                month=month,
+                segment=key,
+                archived_at=datetime.utcnow()
+            )},
+            upsert=True
+        )
+        await delete_scans([scan["_id"] for scan in scans], clerk_user_id)
+        # The scans now come from the archive, so cached responses must revalidate
+        from .services import _bump_data_version
+        await _bump_data_version(clerk_user_id)
+        return len(scans)
+
+    @staticmethod
+    async def archive_scans(older_than_days: int = SCAN_ARCHIVE_AFTER_DAYS, dry_run: bool = False) -> Dict[str, int]:
+        """Archive every whole month that ended before the cutoff; returns counters"""
+        cutoff = month_start(datetime.utcnow() - timedelta(days=older_than_days))
+        users = scan_collection().aggregate(scan_pipeline([
+            {"$match": {"timestamp": {"$lt": cutoff}}},
+            {"$group": {"_id": "$user_id"}},
+        ]))
+
+        totals = {"users": 0, "segments": 0, "scans": 0}
+        async for user in users:
+            clerk_user_id = user["_id"]
+            totals["users"] += 1
+            month, batch = None, []
+            cursor = find_scans({"user_id": clerk_user_id, "timestamp": {"$lt": cutoff}}, sort={"timestamp": 1})
+            async for scan in cursor:
+                scan_month = month_start(scan["timestamp"])
+                if batch and scan_month != month:
+                    totals["segments"] += 1
+                    totals["scans"] += len(batch) if dry_run else \
+                        await ScanArchiveService.archive_user_month(clerk_user_id, month, batch)
+                    batch = []
+                month = scan_month
+                batch.append(scan)
+            if batch:
+                totals["segments"] += 1
+                totals["scans"] += len(batch) if dry_run else \
+                    await ScanArchiveService.archive_user_month(clerk_user_id, month, batch)
+        return totals
+
+    @staticmethod
+    async def get_rollups(
+        clerk_user_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Archived user-months overlapping the date range, newest first"""
+        db = get_database()
+        query: Dict[str, Any] = {"user_id": clerk_user_id}
+        if start_date or end_date:
+            query["month"] = {}
+            if start_date:
+                query["month"]["$gte"] = month_start(start_date)
+            if end_date:
+                query["month"]["$lte"] = end_date
+        return await db.scan_rollups.find(query).sort("month", -1).to_list(None)
+
+    @staticmethod
+    async def get_statistics(clerk_user_id: str) -> Dict[str, Any]:
+        """Summed rollup counters: total_scans, crossbreed_count, confidence_sum"""
+        db = get_database()
+        result = await db.scan_rollups.aggregate([
+            {"$match": {"user_id": clerk_user_id}},
+            {"$group": {
+                "_id": None,
+                "total_scans": {"$sum": "$total_scans"},
+                "crossbreed_count": {"$sum": "$crossbreed_count"},
+                "confidence_sum": {"$sum": "$confidence_sum"},
+            }},
+        ]).to_list(1)
+        return result[0] if result else {"total_scans": 0, "crossbreed_count": 0, "confidence_sum": 0.0}
+
+    @staticmethod
+    async def get_breed_counts(clerk_user_id: str) -> Dict[str, Dict[str, Any]]:
+        """breed -> {count, confidence_sum} over archived scans"""
+        db = get_database()
+        rows = await db.scan_rollups.aggregate([
+            {"$match": {"user_id": clerk_user_id}},
+            {"$unwind": "$breeds"},
+            {"$group": {
+                "_id": "$breeds.breed",
+                "count": {"$sum": "$breeds.count"},
+                "confidence_sum": {"$sum": "$breeds.confidence_sum"},
+            }},
+        ]).to_list(None)
+        return {row["_id"]: {"count": row["count"], "confidence_sum": row["confidence_sum"]} for row in rows}
+
+    @staticmethod
+    async def iter_scans(
+        clerk_user_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        breed: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        skip: int = 0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield archived scans newest first, one segment at a time
+        Whole segments inside the skip are passed over using their rollup
+        counts, without being fetched
+        """
+        store = get_segment_store()
+        columns = None
+        if fields is not None:
+            columns = set(fields) | {"timestamp", "predicted_breed"}
+
+        for rollup in await ScanArchiveService.get_rollups(clerk_user_id, start_date, end_date):
+            if breed is not None:
+                count = next((item["count"] for item in rollup.get("breeds", []) if item["breed"] == breed), 0)
+            else:
+                count = rollup["total_scans"]
+            if count == 0:
+                continue
+            next_month = month_start(rollup["month"] + timedelta(days=32))
+            fully_inside = (start_date is None or start_date <= rollup["month"]) and \
+                (end_date is None or end_date >= next_month)
+            if fully_inside and skip >= count:
+                skip -= count
+                continue
+
+            data = await store.get(rollup["segment"])
+            if data is None:
+                print(f"⚠️ Missing archive segment {rollup['segment']}")
+                continue
+            rows = await asyncio.to_thread(decode_segment, data, columns)
+            for row in reversed(rows):
+                if breed is not None and row.get("predicted_breed") != breed:
+                    continue
+                if start_date and row["timestamp"] < start_date:
+                    continue
+                if end_date and row["timestamp"] > end_date:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                if fields is not None:
+                    row = {name: value for name, value in row.items() if name == "_id" or name in fields}
+                yield row
+
+    @staticmethod
+    async def contains_scan(clerk_user_id: str, scan_id: str) -> bool:
+        """
+        Whether the scan has moved into one of the user's segments
+        Only the segment for the month the _id was generated in (or the one
+        before, for scans stamped just ahead of a month boundary) is opened
+        """
+        if not ObjectId.is_valid(scan_id):
+            return False
+        generated = ObjectId(scan_id).generation_time.replace(tzinfo=None)
+        months = {month_start(generated), month_start(generated - timedelta(minutes=1))}
+        db = get_database()
+        store = get_segment_store()
+        async for rollup in db.scan_rollups.find({"user_id": clerk_user_id, "month": {"$in": list(months)}}):
+            data = await store.get(rollup["segment"])
+            if data is None:
+                continue
+            rows = await asyncio.to_thread(decode_segment, data, ["_id"])
+            if any(row["_id"] == scan_id for row in rows):
+                return True
+        return False
+
+    @staticmethod
+    async def delete_user_archive(clerk_user_id: str) -> int:
+        """Remove every segment and rollup of a user; returns segments deleted"""
+        db = get_database()
+        deleted = await get_segment_store().delete_prefix(user_prefix(clerk_user_id))
+        await db.scan_rollups.delete_many({"user_id": clerk_user_id})
+        return deleted
+
+
+# ==================== CLI ====================
+async def _run(older_than_days: int, dry_run: bool) -> None:
+    from .connection import close_database_connection
+    try:
+        totals = await ScanArchiveService.archive_scans(older_than_days, dry_run)
+    finally:
+        await close_database_connection()
+    verb = "Would archive" if dry_run else "Archived"
+    print(f"✅ {verb} {totals['scans']} scans into {totals['segments']} segments for {totals['users']} users")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move old scans into cold archive segments")
+    parser.add_argument("--older-than-days", type=int, default=SCAN_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(_run(args.older_than_days, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
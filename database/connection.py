@@ -10,6 +10,7 @@ from typing import Optional
 # Global database client
 _client: Optional[AsyncIOMotorClient] = None
 _database = None
+_transactions_supported: Optional[bool] = None
 
 
 def get_database():
@@ -60,6 +61,20 @@ async def close_database_connection():
         print("🔌 MongoDB connection closed")
 
 
+async def supports_transactions() -> bool:
+    """
+    Whether the deployment can run multi-document transactions
+    True for replica sets and sharded clusters, False for a standalone
+    server; asked once per process
+    """
+    global _transactions_supported
+    
+    if _transactions_supported is None:
+        hello = await get_database().command("hello")
+        _transactions_supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+
 async def ping_database():
     """
     Test database connectivity
@@ -77,27 +92,16 @@ async def ping_database():
 async def create_indexes():
     """
     Create database indexes for optimized queries
+    The index definitions live in database/indexes.py
     """
-    db = get_database()
-    
-    # Users collection indexes
-    await db.users.create_index("clerk_user_id", unique=True)
-    await db.users.create_index("email")
-    await db.users.create_index("created_at")
-    
-    # Scan history indexes
-    await db.scan_history.create_index("user_id")
-    await db.scan_history.create_index("timestamp")
-    await db.scan_history.create_index([("user_id", 1), ("timestamp", -1)])
-    await db.scan_history.create_index("predicted_breed")
-    
-    # Search history indexes
-    await db.search_history.create_index("user_id")
-    await db.search_history.create_index("search_timestamp")
-    await db.search_history.create_index([("user_id", 1), ("search_timestamp", -1)])
-    await db.search_history.create_index("breed_searched")
-    
-    # User preferences indexes
-    await db.user_preferences.create_index("user_id", unique=True)
+    from .indexes import sync_indexes
     
-    print("✅ Database indexes created successfully")
+    report = await sync_indexes()
+    created = sum(len(drift["missing"]) for drift in report.values())
+    drifted = [
+        collection for collection, drift in report.items()
+        if drift["extra"] or drift["mismatched"]
+    ]
+    if drifted:
+        print(f"⚠️  Index drift in: {', '.join(drifted)} (run: python -m database.indexes check)")
+    print(f"✅ Database indexes created successfully ({created} new)")
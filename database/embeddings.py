@@ -0,0 +1,100 @@
+"""
+Per-scan backbone embeddings
+Stored once at inference time as float16 blobs in scan_embeddings, keyed by
+the scan's _id, so past scans can be re-scored by running only the head
+"""
+import os
+from datetime import datetime
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from .connection import get_database
+
+
+EMBEDDING_DTYPE = np.dtype("<f2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "5000"))
+MODEL_VERSION = os.getenv("MODEL_VERSION", "1.1")
+
+
+def encode_embedding(embedding: np.ndarray) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).reshape(-1).astype(EMBEDDING_DTYPE).tobytes()
+
+
+def decode_embeddings(blobs: List[bytes], dim: int) -> np.ndarray:
+    """Stack stored blobs into an (n, dim) float32 matrix in one copy"""
+    return np.frombuffer(b"".join(blobs), dtype=EMBEDDING_DTYPE).reshape(len(blobs), dim).astype(np.float32)
+
+
+class EmbeddingService:
+    """scan_embeddings database operations"""
+
+    @staticmethod
+    async def store_embedding(
+        scan_id: str,
+        clerk_user_id: str,
+        embedding: np.ndarray,
+        model_version: str = MODEL_VERSION
+    ) -> None:
+        db = get_database()
+        vector = np.asarray(embedding).reshape(-1)
+        await db.scan_embeddings.replace_one(
+            {"_id": ObjectId(scan_id)},
+            {
+                "user_id": clerk_user_id,
+                "embedding": encode_embedding(vector),
+                "dim": int(vector.shape[0]),
+                "model_version": model_version,
+                "created_at": datetime.utcnow(),
+                # Picked up by the similarity index writer, then unset
+                "pending_index": True,
+            },
+            upsert=True
+        )
+
+    @staticmethod
+    async def get_embedding(scan_id: str) -> Optional[np.ndarray]:
+        db = get_database()
+        doc = await db.scan_embeddings.find_one({"_id": ObjectId(scan_id)}, {"embedding": 1, "dim": 1})
+        if not doc:
+            return None
+        return decode_embeddings([doc["embedding"]], doc["dim"])[0]
+
+    @staticmethod
+    async def mark_indexed(scan_ids: Optional[List[ObjectId]] = None) -> None:
+        """Clear the pending flag on the given embeddings, or on all of them"""
+        db = get_database()
+        query: Dict[str, Any] = {"pending_index": True}
+        if scan_ids is not None:
+            query["_id"] = {"$in": scan_ids}
+        await db.scan_embeddings.update_many(query, {"$unset": {"pending_index": ""}})
+
+    @staticmethod
+    async def iter_batches(
+        query: Optional[Dict[str, Any]] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> AsyncIterator[Tuple[List[ObjectId], List[str], np.ndarray]]:
+        """Yield (scan ids, user ids, embedding matrix) in _id order"""
+        db = get_database()
+        cursor = db.scan_embeddings.find(
+            query or {},
+            {"user_id": 1, "embedding": 1, "dim": 1}
+        ).sort("_id", 1).batch_size(batch_size)
+
+        ids, users, blobs, dim = [], [], [], None
+        async for doc in cursor:
+            if dim is not None and doc["dim"] != dim:
+                # Dimension changed with the model version; flush what we have
+                yield ids, users, decode_embeddings(blobs, dim)
+                ids, users, blobs = [], [], []
+            dim = doc["dim"]
+            ids.append(doc["_id"])
+            users.append(doc["user_id"])
+            blobs.append(doc["embedding"])
+            if len(ids) >= batch_size:
+                yield ids, users, decode_embeddings(blobs, dim)
+                ids, users, blobs = [], [], []
+
+        if ids:
+            yield ids, users, decode_embeddings(blobs, dim)
@@ -0,0 +1,65 @@
+"""
+In-process pub/sub hub for pushing per-user data changes
+Service-layer writers publish deltas; /api/stream fans them out to connections
+"""
+import asyncio
+import itertools
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+
+
+class EventHub:
+    """
+    Fan-out of user events to subscribed connections
+    Each connection owns a small bounded queue, so an idle connection costs
+    one queue and a slow consumer drops its oldest events instead of
+    blocking writers
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, clerk_user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(clerk_user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, clerk_user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(clerk_user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[clerk_user_id]
+
+    def publish(self, clerk_user_id: Optional[str], event_type: str, data: Dict[str, Any]) -> int:
+        """Deliver an event to every connection of a user; returns the number reached"""
+        queues = self._subscribers.get(clerk_user_id) if clerk_user_id else None
+        if not queues:
+            return 0
+
+        event = {
+            "id": next(self._ids),
+            "type": event_type,
+            "data": data,
+            "timestamp": datetime.utcnow(),
+        }
+        for queue in queues:
+            if queue.full():
+                # Drop the oldest event; the client can resync via the REST endpoints
+                queue.get_nowait()
+            queue.put_nowait(event)
+        return len(queues)
+
+
+event_hub = EventHub()
@@ -0,0 +1,427 @@
+"""
+Analytics export subsystem
+Streams CSV/NDJSON straight from MongoDB cursors and runs large exports as background jobs
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import socket
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+
+from .archive import ScanArchiveService
+from .connection import get_database
+from .scan_layout import find_scans, scan_collection, scan_pipeline
+
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.getcwd(), "exports"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Job progress is written at most this often; keep it well below the lease
+EXPORT_PROGRESS_INTERVAL_SECONDS = float(os.getenv("EXPORT_PROGRESS_INTERVAL_SECONDS", "2"))
+EXPORT_JOB_LEASE_SECONDS = float(os.getenv("EXPORT_JOB_LEASE_SECONDS", "60"))
+# Finished jobs and their files are removed after this long
+EXPORT_RETENTION_HOURS = int(os.getenv("EXPORT_RETENTION_HOURS", "24"))
+
+EXPORT_FORMATS = {"csv", "ndjson"}
+EXPORT_DATA_TYPES = {"all", "scans", "breeds", "trends"}
+
+# Column order for each exported section
+SECTION_FIELDS = {
+    "scans": ["timestamp", "breed", "confidence", "is_crossbreed"],
+    "breeds": ["breed", "count", "avg_confidence"],
+    "trends": ["week_start", "scans"],
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def normalize_export_format(format: str) -> str:
+    """Map user supplied format names onto a supported export format"""
+    format = (format or "csv").lower()
+    if format == "json":
+        # JSON exports are streamed as newline-delimited records
+        return "ndjson"
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    return format
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def export_filename(user_id: str, format: str, compress: bool, stamp: Optional[datetime] = None) -> str:
+    """Build the download filename for an export"""
+    stamp = stamp or datetime.utcnow()
+    name = f"pawdentify-analytics-{user_id}_{stamp.strftime('%Y%m%d_%H%M%S')}.{format}"
+    return name + ".gz" if compress else name
+
+
+# ==================== Record Sources ====================
+class ExportService:
+    """Streaming export operations"""
+
+    @staticmethod
+    def _sections(data_type: str):
+        if data_type not in EXPORT_DATA_TYPES:
+            raise ValueError(f"Unsupported export data type: {data_type}")
+        return ["scans", "breeds", "trends"] if data_type == "all" else [data_type]
+
+    @staticmethod
+    async def iter_scan_rows(clerk_user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every scan of a user, newest first, one cursor batch at a time"""
+        cursor = find_scans(
+            {"user_id": clerk_user_id},
+            {"_id": 0, "timestamp": 1, "predicted_breed": 1, "confidence_score": 1, "is_crossbreed": 1},
+            sort={"timestamp": -1},
+            batch_size=EXPORT_BATCH_SIZE
+        )
+
+        archived = ScanArchiveService.iter_scans(
+            clerk_user_id, fields=["timestamp", "predicted_breed", "confidence_score", "is_crossbreed"]
+        )
+        for source in (cursor, archived):
+            async for scan in source:
+                yield {
+                    "timestamp": scan["timestamp"].isoformat(),
+                    "breed": scan.get("predicted_breed"),
+                    "confidence": scan.get("confidence_score"),
+                    "is_crossbreed": scan.get("is_crossbreed", False)
+                }
+
+    @staticmethod
+    async def iter_breed_rows(clerk_user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield per-breed scan counts without a row cap, archived scans included"""
+        pipeline = [
+            {"$match": {"user_id": clerk_user_id}},
+            {"$group": {
+                "_id": "$predicted_breed",
+                "count": {"$sum": 1},
+                "confidence_sum": {"$sum": "$confidence_score"}
+            }}
+        ]
+        # One row per breed, so merging with the rollups in memory is cheap
+        breeds = await ScanArchiveService.get_breed_counts(clerk_user_id)
+        async for row in scan_collection().aggregate(scan_pipeline(pipeline), batchSize=EXPORT_BATCH_SIZE):
+            counters = breeds.setdefault(row["_id"], {"count": 0, "confidence_sum": 0.0})
+            counters["count"] += row["count"]
+            counters["confidence_sum"] += row["confidence_sum"]
+
+        for breed, counters in sorted(breeds.items(), key=lambda item: item[1]["count"], reverse=True):
+            yield {
+                "breed": breed,
+                "count": counters["count"],
+                "avg_confidence": counters["confidence_sum"] / counters["count"]
+            }
+
+    @staticmethod
+    async def iter_trend_rows(clerk_user_id: str, weeks: int = 12) -> AsyncIterator[Dict[str, Any]]:
+        """Yield weekly scan counts, counting timestamps as they stream in"""
+        end_date = datetime.utcnow().date()
+
+        weekly_counts = {}
+        for i in range(weeks):
+            week_start = end_date - timedelta(days=end_date.weekday() + (i * 7))
+            weekly_counts[week_start] = 0
+        first_week = min(weekly_counts)
+
+        since = datetime.combine(first_week, datetime.min.time())
+        cursor = find_scans(
+            {"user_id": clerk_user_id, "timestamp": {"$gte": since}},
+            {"_id": 0, "timestamp": 1},
+            batch_size=EXPORT_BATCH_SIZE
+        )
+        archived = ScanArchiveService.iter_scans(clerk_user_id, start_date=since, fields=["timestamp"])
+
+        for source in (cursor, archived):
+            async for scan in source:
+                scan_date = scan["timestamp"].date()
+                week_start = scan_date - timedelta(days=scan_date.weekday())
+                if week_start in weekly_counts:
+                    weekly_counts[week_start] += 1
+
+        for week_start, count in sorted(weekly_counts.items()):
+            yield {"week_start": week_start.isoformat(), "scans": count}
+
+    @staticmethod
+    async def iter_records(clerk_user_id: str, data_type: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (section, row) pairs for the requested data type"""
+        sources = {
+            "scans": ExportService.iter_scan_rows,
+            "breeds": ExportService.iter_breed_rows,
+            "trends": ExportService.iter_trend_rows,
+        }
+        for section in ExportService._sections(data_type):
+            async for row in sources[section](clerk_user_id):
+                yield section, row
+
+    @staticmethod
+    async def stream_export(
+        clerk_user_id: str,
+        format: str = "csv",
+        data_type: str = "all",
+        compress: bool = False
+    ) -> AsyncIterator[bytes]:
+        """
+        Encode export records as CSV or NDJSON chunks
+        Only one cursor batch is held in memory at any time
+        """
+        format = normalize_export_format(format)
+        ExportService._sections(data_type)
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = None
+        current_section = None
+        pending_rows = 0
+
+        def drain() -> bytes:
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            return compressor.compress(data) if compressor else data
+
+        async for section, row in ExportService.iter_records(clerk_user_id, data_type):
+            if format == "csv":
+                if section != current_section:
+                    if current_section is not None:
+                        # Blank line separates sections of an "all" export
+                        buffer.write("\r\n")
+                    writer = csv.DictWriter(buffer, fieldnames=SECTION_FIELDS[section], extrasaction="ignore")
+                    writer.writeheader()
+                    current_section = section
+                writer.writerow(row)
+            else:
+                record = dict(row, type=section) if data_type == "all" else row
+                buffer.write(json.dumps(record, default=str))
+                buffer.write("\n")
+
+            pending_rows += 1
+            if pending_rows >= EXPORT_BATCH_SIZE:
+                chunk = drain()
+                pending_rows = 0
+                if chunk:
+                    yield chunk
+
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+
+
+# ==================== Export Jobs ====================
+_EXPORT_FILE = re.compile(r"^([0-9a-f]{24})\.(?:csv|ndjson)(?:\.gz)?$")
+_WORKER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ExportJobService:
+    """
+    Background export jobs written to files under EXPORT_DIR
+    A running job holds a lease that is renewed with its progress updates;
+    resume_jobs() restarts jobs whose worker died once the lease lapses.
+    Finished jobs expire through a TTL index on expire_at and
+    cleanup_files() removes the files they leave behind
+    """
+
+    # Keep references so running jobs are not garbage collected
+    _tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    async def create_job(
+        clerk_user_id: str,
+        format: str = "csv",
+        data_type: str = "all",
+        compress: bool = False
+    ) -> Dict[str, Any]:
+        """Register an export job and start it in the background"""
+        format = normalize_export_format(format)
+        ExportService._sections(data_type)
+
+        db = get_database()
+        now = datetime.utcnow()
+        job = {
+            "user_id": clerk_user_id,
+            "format": format,
+            "data_type": data_type,
+            "compress": compress,
+            "status": "pending",
+            "bytes_written": 0,
+            "filename": export_filename(clerk_user_id, format, compress, now),
+            "file_path": None,
+            "worker": None,
+            "lease_expires_at": None,
+            "error": None,
+            "created_at": now,
+            "completed_at": None,
+            "expire_at": None,
+        }
+        result = await db.export_jobs.insert_one(job)
+        job["_id"] = str(result.inserted_id)
+        ExportJobService._start(job["_id"])
+        return job
+
+    @staticmethod
+    def _start(job_id: str) -> None:
+        if job_id in ExportJobService._tasks:
+            return
+        task = asyncio.create_task(ExportJobService.run_job(job_id))
+        ExportJobService._tasks[job_id] = task
+        task.add_done_callback(lambda _: ExportJobService._tasks.pop(job_id, None))
+
+    @staticmethod
+    async def resume_jobs() -> int:
+        """Restart unfinished jobs whose worker is gone; returns how many were picked up"""
+        db = get_database()
+        query = {
+            "status": {"$in": ["pending", "running"]},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": datetime.utcnow()}}],
+        }
+        resumed = 0
+        async for job in db.export_jobs.find(query, {"_id": 1}):
+            ExportJobService._start(str(job["_id"]))
+            resumed += 1
+        return resumed
+
+    @staticmethod
+    async def _claim(job_id: str) -> Optional[Dict[str, Any]]:
+        from bson import ObjectId
+        from pymongo import ReturnDocument
+
+        db = get_database()
+        now = datetime.utcnow()
+        return await db.export_jobs.find_one_and_update(
+            {
+                "_id": ObjectId(job_id),
+                "status": {"$in": ["pending", "running"]},
+                "$or": [{"worker": _WORKER}, {"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            {"$set": {
+                "status": "running",
+                "worker": _WORKER,
+                "lease_expires_at": now + timedelta(seconds=EXPORT_JOB_LEASE_SECONDS),
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    async def _update(job: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+        """Record progress and renew the lease; False once another worker has taken the job over"""
+        db = get_database()
+        lease = datetime.utcnow() + timedelta(seconds=EXPORT_JOB_LEASE_SECONDS)
+        result = await db.export_jobs.update_one(
+            {"_id": job["_id"], "worker": _WORKER},
+            {"$set": dict(fields, lease_expires_at=lease)}
+        )
+        return result.matched_count > 0
+
+    @staticmethod
+    async def run_job(job_id: str) -> None:
+        """
+        Write the export to disk, recording progress on the job document
+        A resumed job starts its file over; progress is written at most
+        once per EXPORT_PROGRESS_INTERVAL_SECONDS
+        """
+        import aiofiles
+
+        job = await ExportJobService._claim(job_id)
+        if not job:
+            return
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        extension = job["format"] + (".gz" if job["compress"] else "")
+        file_path = os.path.join(EXPORT_DIR, f"{job_id}.{extension}")
+        if not await ExportJobService._update(job, {"file_path": file_path, "bytes_written": 0}):
+            return
+
+        bytes_written = 0
+        reported_at = time.monotonic()
+        try:
+            async with aiofiles.open(file_path, "wb") as f:
+                async for chunk in ExportService.stream_export(
+                    job["user_id"], job["format"], job["data_type"], job["compress"]
+                ):
+                    await f.write(chunk)
+                    bytes_written += len(chunk)
+                    if time.monotonic() - reported_at >= EXPORT_PROGRESS_INTERVAL_SECONDS:
+                        reported_at = time.monotonic()
+                        if not await ExportJobService._update(job, {"bytes_written": bytes_written}):
+                            print(f"⚠️ Export job {job_id} was taken over by another worker")
+                            return
+
+            now = datetime.utcnow()
+            await ExportJobService._update(job, {
+                "status": "completed",
+                "bytes_written": bytes_written,
+                "lease_expires_at": None,
+                "completed_at": now,
+                "expire_at": now + timedelta(hours=EXPORT_RETENTION_HOURS),
+            })
+            print(f"✅ Export job {job_id} completed ({bytes_written} bytes)")
+        except Exception as e:
+            now = datetime.utcnow()
+            await ExportJobService._update(job, {
+                "status": "failed",
+                "error": str(e),
+                "lease_expires_at": None,
+                "completed_at": now,
+                "expire_at": now + timedelta(hours=EXPORT_RETENTION_HOURS),
+            })
+            await asyncio.to_thread(_remove_file, file_path)
+            print(f"❌ Export job {job_id} failed: {str(e)}")
+        await ExportJobService.cleanup_files()
+
+    @staticmethod
+    async def cleanup_files() -> int:
+        """
+        Delete export files whose job document has expired
+        Runs at startup and after every job; returns how many files were removed
+        """
+        from bson import ObjectId
+
+        if not os.path.isdir(EXPORT_DIR):
+            return 0
+        files = {}
+        for name in await asyncio.to_thread(os.listdir, EXPORT_DIR):
+            match = _EXPORT_FILE.match(name)
+            if match:
+                files.setdefault(ObjectId(match.group(1)), []).append(name)
+        if not files:
+            return 0
+
+        db = get_database()
+        live = {
+            job["_id"]
+            async for job in db.export_jobs.find({"_id": {"$in": list(files)}}, {"_id": 1})
+        }
+        removed = 0
+        for job_id, names in files.items():
+            if job_id in live:
+                continue
+            for name in names:
+                await asyncio.to_thread(_remove_file, os.path.join(EXPORT_DIR, name))
+                removed += 1
+        return removed
+
+    @staticmethod
+    async def get_job(job_id: str, clerk_user_id: str) -> Optional[Dict[str, Any]]:
+        """Get an export job owned by the user"""
+        db = get_database()
+        from bson import ObjectId
+        try:
+            job = await db.export_jobs.find_one({"_id": ObjectId(job_id), "user_id": clerk_user_id})
+        except Exception:
+            return None
+        if job:
+            job["_id"] = str(job["_id"])
+        return job
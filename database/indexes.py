@@ -0,0 +1,414 @@
+"""
+Declarative index management
+Index specs for every collection, drift detection against the live database
+and an explain() audit of the query shapes used in database/services.py
+
+Run from the project root:
+    python -m database.indexes check
+    python -m database.indexes apply [--drop-extra] [--rebuild-mismatched]
+    python -m database.indexes audit
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # The scan layout (SCAN_STORAGE_MODE) is read when scan_layout is imported
+    load_dotenv()
+
+from .connection import get_database
+from .scan_layout import SCAN_COLLECTIONS, SCAN_STORAGE_MODE, ensure_scan_collection, scan_pipeline
+
+
+# Options that make two indexes on the same keys behave differently
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+# ==================== Index Specs ====================
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"keys": [("clerk_user_id", 1)], "unique": True},
+        {"keys": [("email", 1)]},
+        {"keys": [("created_at", 1)]},
+    ],
+    "scan_history": [
+        {"keys": [("user_id", 1), ("timestamp", -1)]},
+        {"keys": [("user_id", 1), ("predicted_breed", 1), ("timestamp", -1)]},
+        {"keys": [("timestamp", 1)]},
+        # One scan per image per user and dedupe window (scan_layout.upsert_scan)
+        {
+            "keys": [("user_id", 1), ("image_hash", 1), ("dedupe_window", 1)],
+            "unique": True,
+            "partialFilterExpression": {"image_hash": {"$type": "string"}, "dedupe_window": {"$type": "date"}},
+        },
+    ],
+    "search_history": [
+        {"keys": [("user_id", 1), ("search_timestamp", -1)]},
+        {"keys": [("search_timestamp", 1)]},
+    ],
+    "user_preferences": [
+        {"keys": [("user_id", 1)], "unique": True},
+    ],
+    "pets": [
+        {"keys": [("user_id", 1), ("is_active", 1), ("created_at", -1)]},
+    ],
+    "vaccinations": [
+        {"keys": [("user_id", 1), ("due_date", 1)]},
+        {"keys": [("user_id", 1), ("pet_id", 1), ("due_date", 1)]},
+        {"keys": [("user_id", 1), ("status", 1), ("due_date", 1)]},
+        {"keys": [("reminder_date", 1), ("_id", 1)], "partialFilterExpression": {"reminder_sent": False}},
+        {"keys": [("status", 1), ("due_date", 1)]},
+    ],
+    "feedback": [
+        {"keys": [("user_id", 1), ("submitted_at", -1)]},
+    ],
+    "community_feedback": [
+        {"keys": [("is_approved", 1), ("approved_at", -1)]},
+        {"keys": [("is_approved", 1), ("is_featured", 1), ("approved_at", -1)]},
+        {"keys": [("user_id", 1), ("submitted_at", -1)]},
+    ],
+    "breed_leaderboard": [
+        {"keys": [("window", 1), ("search_count", -1)]},
+        {"keys": [("window", 1), ("bucket_start", 1)]},
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "export_jobs": [
+        {"keys": [("user_id", 1), ("created_at", -1)]},
+        {"keys": [("status", 1), ("lease_expires_at", 1)]},
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "scan_embeddings": [
+        {"keys": [("user_id", 1)]},
+        {"keys": [("model_version", 1), ("_id", 1)]},
+        {"keys": [("pending_index", 1), ("_id", 1)], "partialFilterExpression": {"pending_index": True}},
+    ],
+    "scan_rollups": [
+        {"keys": [("user_id", 1), ("month", -1)]},
+    ],
+    "scan_receipts": [
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0},
+    ],
+    "account_jobs": [
+        {"keys": [("user_id", 1), ("kind", 1), ("status", 1)]},
+        {"keys": [("status", 1), ("lease_expires_at", 1)]},
+        {"keys": [("expire_at", 1)], "expireAfterSeconds": 0},
+    ],
+}
+
+# Alternative scan layouts (database/scan_layout.py). Only the active one is
+# specced, so a regular collection is never created under the time-series name
+SCAN_LAYOUT_INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "scan_history_ts": [
+        # Created automatically on MongoDB 6.3+
+        {"keys": [("user_id", 1), ("timestamp", 1)]},
+        {"keys": [("user_id", 1), ("predicted_breed", 1), ("timestamp", -1)]},
+    ],
+    "scan_buckets": [
+        {"keys": [("user_id", 1), ("month", -1), ("count", 1)]},
+        {"keys": [("scans._id", 1)]},
+    ],
+}
+if SCAN_STORAGE_MODE != "collection":
+    _active = SCAN_COLLECTIONS[SCAN_STORAGE_MODE]
+    INDEX_SPECS[_active] = SCAN_LAYOUT_INDEX_SPECS[_active]
+
+
+def index_name(keys: List[tuple]) -> str:
+    """Default MongoDB index name for a key pattern, e.g. user_id_1_timestamp_-1"""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _normalize_keys(keys) -> tuple:
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in keys)
+
+
+def _options(index: Dict[str, Any]) -> Dict[str, Any]:
+    options = {}
+    for option in COMPARED_OPTIONS:
+        if option in index and not (option in ("unique", "sparse") and index[option] is False):
+            options[option] = index[option]
+    return options
+
+
+# ==================== Drift Detection ====================
+async def diff_collection_indexes(db, collection: str, specs: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Compare the live indexes of a collection against its spec"""
+    existing = await db[collection].index_information()
+    live_by_keys = {
+        _normalize_keys(info["key"]): (name, info)
+        for name, info in existing.items()
+        if name != "_id_"
+    }
+
+    missing, mismatched = [], []
+    expected_keys = set()
+    for spec in specs:
+        keys = _normalize_keys(spec["keys"])
+        expected_keys.add(keys)
+        if keys not in live_by_keys:
+            missing.append(spec)
+            continue
+        name, info = live_by_keys[keys]
+        if _options(info) != _options(spec):
+            mismatched.append({"name": name, "expected": _options(spec), "actual": _options(info), "spec": spec})
+
+    extra = [name for keys, (name, _) in live_by_keys.items() if keys not in expected_keys]
+    return {"missing": missing, "extra": extra, "mismatched": mismatched}
+
+
+async def check_indexes(db=None) -> Dict[str, Dict[str, List[Any]]]:
+    """Report missing, extra and mismatched indexes for every specced collection"""
+    db = db if db is not None else get_database()
+    return {
+        collection: await diff_collection_indexes(db, collection, specs)
+        for collection, specs in INDEX_SPECS.items()
+    }
+
+
+async def _create_index(db, collection: str, spec: Dict[str, Any]) -> None:
+    options = _options(spec)
+    await db[collection].create_index(
+        spec["keys"],
+        name=spec.get("name", index_name(spec["keys"])),
+        **options
+    )
+
+
+async def sync_indexes(
+    db=None,
+    drop_extra: bool = False,
+    rebuild_mismatched: bool = False
+) -> Dict[str, Dict[str, List[Any]]]:
+    """
+    Create missing indexes and optionally drop extra or rebuild mismatched ones
+    Returns the drift report computed before any change was made
+    """
+    db = db if db is not None else get_database()
+    await ensure_scan_collection(db)
+    report = await check_indexes(db)
+
+    for collection, drift in report.items():
+        for spec in drift["missing"]:
+            await _create_index(db, collection, spec)
+        if rebuild_mismatched:
+            for mismatch in drift["mismatched"]:
+                await db[collection].drop_index(mismatch["name"])
+                await _create_index(db, collection, mismatch["spec"])
+        if drop_extra:
+            for name in drift["extra"]:
+                await db[collection].drop_index(name)
+    return report
+
+
+def print_report(report: Dict[str, Dict[str, List[Any]]]) -> bool:
+    """Print a drift report; returns True when there is no drift"""
+    clean = True
+    for collection, drift in report.items():
+        for spec in drift["missing"]:
+            clean = False
+            print(f"❌ {collection}: missing index {index_name(spec['keys'])}")
+        for name in drift["extra"]:
+            clean = False
+            print(f"⚠️  {collection}: extra index {name}")
+        for mismatch in drift["mismatched"]:
+            clean = False
+            print(f"⚠️  {collection}: index {mismatch['name']} has options {mismatch['actual']}, "
+                  f"expected {mismatch['expected']}")
+    if clean:
+        print("✅ All indexes match the spec")
+    return clean
+
+
+# ==================== Query Audit ====================
+def _scan_shape(name: str, pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Scan reads run as aggregations over whichever layout is active"""
+    return {"name": name, "collection": SCAN_COLLECTIONS[SCAN_STORAGE_MODE], "pipeline": scan_pipeline(pipeline)}
+
+
+def query_shapes() -> List[Dict[str, Any]]:
+    """
+    Representative query shapes issued by database/services.py
+    Keep in sync when adding or changing service queries
+    """
+    user_id = "audit_user"
+    now = datetime.utcnow()
+    return [
+        {"name": "UserService.get_user_by_clerk_id", "collection": "users",
+         "filter": {"clerk_user_id": user_id}},
+        _scan_shape("ScanHistoryService.get_user_scans",
+                    [{"$match": {"user_id": user_id}}, {"$sort": {"timestamp": -1}}, {"$limit": 50}]),
+        _scan_shape("ScanHistoryService.get_scan_statistics",
+                    [{"$match": {"user_id": user_id}},
+                     {"$group": {"_id": None, "total_scans": {"$sum": 1}}}]),
+        _scan_shape("ScanHistoryService.get_breed_frequency",
+                    [{"$match": {"user_id": user_id}},
+                     {"$group": {"_id": "$predicted_breed", "count": {"$sum": 1}}}]),
+        _scan_shape("ScanHistoryService.get_scans_by_breed",
+                    [{"$match": {"user_id": user_id, "predicted_breed": "Pug"}}, {"$sort": {"timestamp": -1}}]),
+        _scan_shape("ScanHistoryService.get_user_scans_with_dates",
+                    [{"$match": {"user_id": user_id,
+                                 "timestamp": {"$gte": now - timedelta(days=30), "$lte": now}}},
+                     {"$sort": {"timestamp": -1}}, {"$limit": 1000}]),
+        _scan_shape("scan_layout.upsert_scan",
+                    [{"$match": {"user_id": user_id, "image_hash": "audit_hash",
+                                 "dedupe_window": now.replace(minute=0, second=0, microsecond=0),
+                                 "timestamp": {"$gte": now - timedelta(days=1), "$lt": now}}},
+                     {"$project": {"_id": 1}}]),
+        _scan_shape("ScanArchiveService.archive_scans",
+                    [{"$match": {"timestamp": {"$lt": now - timedelta(days=400)}}},
+                     {"$group": {"_id": "$user_id"}}]),
+        {"name": "AccountJobService.resume_jobs", "collection": "account_jobs",
+         "filter": {"status": {"$in": ["pending", "running"]},
+                    "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}]}},
+        {"name": "AccountJobService.scan_receipts", "collection": "scan_receipts",
+         "filter": {"_id": {"$regex": f"^{user_id}\\|"}}},
+        {"name": "ScanArchiveService.get_rollups", "collection": "scan_rollups",
+         "filter": {"user_id": user_id}, "sort": {"month": -1}},
+        {"name": "SearchHistoryService.get_user_searches", "collection": "search_history",
+         "filter": {"user_id": user_id}, "sort": {"search_timestamp": -1}, "limit": 20},
+        {"name": "SearchHistoryService._aggregate_recent_searches", "collection": "search_history",
+         "pipeline": [{"$match": {"user_id": user_id}}, {"$sort": {"search_timestamp": -1}},
+                      {"$group": {"_id": "$breed_searched"}}]},
+        {"name": "UserPreferencesService.get_preferences", "collection": "user_preferences",
+         "filter": {"user_id": user_id}},
+        {"name": "PetService.get_user_pets", "collection": "pets",
+         "filter": {"user_id": user_id, "is_active": True}, "sort": {"created_at": -1}},
+        {"name": "PetService.get_pets_overview", "collection": "pets",
+         "pipeline": [{"$match": {"user_id": user_id, "is_active": True}}, {"$sort": {"created_at": -1}},
+                      {"$lookup": {"from": "vaccinations", "let": {"pet_id": {"$toString": "$_id"}},
+                                   "pipeline": [{"$match": {"user_id": user_id,
+                                                            "$expr": {"$eq": ["$pet_id", "$$pet_id"]}}},
+                                                {"$sort": {"due_date": 1}}],
+                                   "as": "vaccinations"}}]},
+        {"name": "VaccinationService.get_pet_vaccinations", "collection": "vaccinations",
+         "filter": {"user_id": user_id}, "sort": {"due_date": 1}},
+        {"name": "VaccinationService.get_pet_vaccinations(pet_id)", "collection": "vaccinations",
+         "filter": {"user_id": user_id, "pet_id": "pet"}, "sort": {"due_date": 1}},
+        {"name": "VaccinationService.get_upcoming_vaccinations", "collection": "vaccinations",
+         "filter": {"user_id": user_id, "status": {"$in": ["upcoming", "scheduled"]},
+                    "due_date": {"$lte": now + timedelta(days=30)}},
+         "sort": {"due_date": 1}},
+        {"name": "VaccinationService.get_overdue_vaccinations", "collection": "vaccinations",
+         "filter": {"user_id": user_id, "status": {"$ne": "completed"}, "due_date": {"$lt": now}},
+         "sort": {"due_date": 1}},
+        {"name": "send_due_reminders", "collection": "vaccinations",
+         "filter": {"reminder_sent": False, "reminder_date": {"$lte": now}},
+         "sort": {"reminder_date": 1, "_id": 1}, "limit": 1000},
+        {"name": "sweep_overdue", "collection": "vaccinations",
+         "filter": {"status": {"$in": ["upcoming", "scheduled"]}, "due_date": {"$lt": now}}, "limit": 1000},
+        {"name": "FeedbackService.get_user_feedback", "collection": "feedback",
+         "filter": {"user_id": user_id}, "sort": {"submitted_at": -1}, "limit": 20},
+        {"name": "CommunityFeedbackService.get_approved_testimonials", "collection": "community_feedback",
+         "filter": {"is_approved": True}, "sort": {"approved_at": -1}, "limit": 10},
+        {"name": "CommunityFeedbackService.get_approved_testimonials(featured)",
+         "collection": "community_feedback",
+         "filter": {"is_approved": True, "is_featured": True}, "sort": {"approved_at": -1}, "limit": 10},
+        {"name": "CommunityFeedbackService.get_user_community_feedback", "collection": "community_feedback",
+         "filter": {"user_id": user_id}, "sort": {"submitted_at": -1}},
+        {"name": "EmbeddingService.iter_batches(model_version)", "collection": "scan_embeddings",
+         "filter": {"model_version": "1.1"}, "sort": {"_id": 1}},
+        {"name": "SimilarityIndexWriter.run_once", "collection": "scan_embeddings",
+         "filter": {"pending_index": True}, "sort": {"_id": 1}},
+        {"name": "LeaderboardService.get_top_breeds", "collection": "breed_leaderboard",
+         "filter": {"window": "all"}, "sort": {"search_count": -1}, "limit": 10},
+        {"name": "LeaderboardService.refresh_window", "collection": "breed_leaderboard",
+         "filter": {"window": "hour", "bucket_start": {"$gte": now - timedelta(hours=24)}}},
+    ]
+
+
+def _plan_stages(node: Any, stages: List[str]) -> List[str]:
+    """Collect stage names from a winning plan, skipping rejected plans"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                stages.append(value)
+            elif key == "$sort":
+                stages.append("$sort")
+            else:
+                _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for item in node:
+            _plan_stages(item, stages)
+    return stages
+
+
+async def explain_shape(db, shape: Dict[str, Any]) -> Dict[str, Any]:
+    """Run explain() for one query shape and flag collection scans and in-memory sorts"""
+    if "pipeline" in shape:
+        command = {"aggregate": shape["collection"], "pipeline": shape["pipeline"], "cursor": {}}
+    else:
+        command = {"find": shape["collection"], "filter": shape["filter"]}
+        if shape.get("sort"):
+            command["sort"] = shape["sort"]
+        if shape.get("limit"):
+            command["limit"] = shape["limit"]
+
+    explanation = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    stages = _plan_stages(explanation, [])
+    return {
+        "name": shape["name"],
+        "collection": shape["collection"],
+        "stages": stages,
+        "collection_scan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages or "$sort" in stages,
+    }
+
+
+async def audit_queries(db=None) -> List[Dict[str, Any]]:
+    """Explain every registered query shape"""
+    db = db if db is not None else get_database()
+    return [await explain_shape(db, shape) for shape in query_shapes()]
+
+
+def print_audit(results: List[Dict[str, Any]]) -> bool:
+    clean = True
+    for result in results:
+        problems = []
+        if result["collection_scan"]:
+            problems.append("COLLECTION SCAN")
+        if result["in_memory_sort"]:
+            problems.append("IN-MEMORY SORT")
+        if problems:
+            clean = False
+            print(f"❌ {result['name']}: {', '.join(problems)} ({' -> '.join(result['stages'])})")
+        else:
+            print(f"✅ {result['name']}")
+    return clean
+
+
+# ==================== CLI ====================
+async def _run(command: str, drop_extra: bool, rebuild_mismatched: bool) -> bool:
+    from .connection import close_database_connection
+    try:
+        if command == "check":
+            return print_report(await check_indexes())
+        if command == "apply":
+            report = await sync_indexes(drop_extra=drop_extra, rebuild_mismatched=rebuild_mismatched)
+            print_report(report)
+            print("✅ Index spec applied")
+            return True
+        return print_audit(await audit_queries())
+    finally:
+        await close_database_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage and audit MongoDB indexes")
+    parser.add_argument("command", choices=["check", "apply", "audit"])
+    parser.add_argument("--drop-extra", action="store_true", help="Drop indexes not in the spec")
+    parser.add_argument("--rebuild-mismatched", action="store_true",
+                        help="Drop and recreate indexes whose options differ from the spec")
+    args = parser.parse_args()
+
+    ok = asyncio.run(_run(args.command, args.drop_extra, args.rebuild_mismatched))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Buffered search-history ingestion
+/api/events/batch hands searches and interaction updates to this buffer,
+which writes them with one insert_many and one bulk_write per flush instead
+of a round trip per event. Searches get their ObjectId when accepted, so the
+client can reference them right away and a retried flush cannot insert
+them twice. A crash loses at most one flush interval of events
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Any, Tuple
+
+from bson import ObjectId
+
+from .services import SearchHistoryService
+
+
+EVENT_FLUSH_INTERVAL_SECONDS = float(os.getenv("EVENT_FLUSH_INTERVAL_SECONDS", "1.0"))
+EVENT_BUFFER_MAX_EVENTS = int(os.getenv("EVENT_BUFFER_MAX_EVENTS", "500"))
+# Hard cap while flushes are failing; past it the endpoint sheds load
+EVENT_BUFFER_MAX_PENDING = int(os.getenv("EVENT_BUFFER_MAX_PENDING", "50000"))
+
+
+class SearchEventBuffer:
+    """Pending search documents and coalesced interaction updates awaiting a flush"""
+
+    def __init__(
+        self,
+        interval_seconds: float = EVENT_FLUSH_INTERVAL_SECONDS,
+        max_events: int = EVENT_BUFFER_MAX_EVENTS,
+        max_pending: int = EVENT_BUFFER_MAX_PENDING
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_events = max_events
+        self.max_pending = max_pending
+        self._searches: Dict[ObjectId, Dict[str, Any]] = {}
+        self._interactions: Dict[Tuple[ObjectId, str], Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._searches) + len(self._interactions)
+
+    def has_room(self, events: int) -> bool:
+        return self.pending + events <= self.max_pending
+
+    def add_search(self, search: Dict[str, Any]) -> ObjectId:
+        """Queue a search_history document; returns its new _id"""
+        search_id = ObjectId()
+        self._searches[search_id] = dict(search, _id=search_id)
+        return search_id
+
+    def add_interaction(self, search_id: ObjectId, user_id: str, fields: Dict[str, Any]) -> None:
+        """Queue an interaction update; later fields win over earlier ones"""
+        search = self._searches.get(search_id)
+        if search is not None and search["user_id"] == user_id:
+            # Still buffered: fold the update into the insert
+            search.update(fields)
+            return
+        self._interactions.setdefault((search_id, user_id), {}).update(fields)
+
+    def maybe_flush(self) -> None:
+        """Don't let a burst wait for the timer"""
+        if self.pending >= self.max_events and not self._flush_lock.locked():
+            asyncio.get_running_loop().create_task(self._flush_quietly())
+
+    async def flush(self) -> Dict[str, int]:
+        """Write buffered events; returns how many searches and interactions were written"""
+        async with self._flush_lock:
+            searches, self._searches = self._searches, {}
+            interactions, self._interactions = self._interactions, {}
+            if not searches and not interactions:
+                return {"searches": 0, "interactions": 0}
+            try:
+                await SearchHistoryService.write_event_batch(
+                    list(searches.values()),
+                    [
+                        {"_id": search_id, "user_id": user_id, "fields": fields}
+                        for (search_id, user_id), fields in interactions.items()
+                    ]
+                )
+            except Exception:
+                # Put the events back, under anything that arrived meanwhile
+                self._searches = {**searches, **self._searches}
+                for key, fields in interactions.items():
+                    self._interactions[key] = {**fields, **self._interactions.get(key, {})}
+                raise
+            return {"searches": len(searches), "interactions": len(interactions)}
+
+    async def _flush_quietly(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ Search event flush failed: {str(e)}")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self._flush_quietly()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Cancel the timer and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ Final search event flush failed: {str(e)}")
+
+
+search_event_buffer = SearchEventBuffer()
@@ -0,0 +1,278 @@
+"""
+Global popular-breeds leaderboard
+Counters are maintained incrementally on every search; distinct users are
+tracked with mergeable HyperLogLog sketches instead of per-breed user sets
+"""
+import asyncio
+import hashlib
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+
+from .connection import get_database
+
+
+HLL_PRECISION = 10  # 1024 registers, ~3% standard error
+SNAPSHOT_SIZE = 100
+# rebuild() fills this collection and renames it over breed_leaderboard
+LEADERBOARD_STAGING_COLLECTION = "breed_leaderboard_rebuild"
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_SECONDS", "60"))
+
+LEADERBOARD_WINDOWS = {
+    # window name -> (bucket granularity, lookback)
+    "24h": ("hour", timedelta(hours=24)),
+    "7d": ("day", timedelta(days=7)),
+}
+
+# How long time buckets are kept before the TTL index removes them
+BUCKET_RETENTION = {
+    "hour": timedelta(days=2),
+    "day": timedelta(days=8),
+}
+
+
+# ==================== HyperLogLog ====================
+class HyperLogLog:
+    """
+    Sparse HyperLogLog sketch
+    Registers are stored as {"<index>": rank} so MongoDB can update them
+    atomically with $max and sketches merge by taking per-register maxima
+    """
+
+    def __init__(self, registers: Optional[Dict[str, int]] = None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers: Dict[str, int] = dict(registers or {})
+
+    @staticmethod
+    def register_for(value: str, precision: int = HLL_PRECISION) -> tuple:
+        """Return the (register index, rank) pair a value maps to"""
+        hashed = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        remaining_bits = 64 - precision
+        index = hashed >> remaining_bits
+        tail = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - tail.bit_length() + 1
+        return str(index), rank
+
+    def add(self, value: str) -> None:
+        index, rank = self.register_for(value, self.precision)
+        if rank > self.registers.get(index, 0):
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        for index, rank in other.registers.items():
+            if rank > self.registers.get(index, 0):
+                self.registers[index] = rank
+        return self
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values added to the sketch"""
+        m = 1 << self.precision
+        alpha = 0.7213 / (1 + 1.079 / m)
+        zeros = m - len(self.registers)
+        harmonic = zeros + sum(2.0 ** -rank for rank in self.registers.values())
+        estimate = alpha * m * m / harmonic
+        if estimate <= 2.5 * m and zeros > 0:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+# ==================== Leaderboard Operations ====================
+def _bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def leaderboard_updates(breed: str, clerk_user_id: str, timestamp: datetime) -> List[Any]:
+    """Build the upserts that count one search in every leaderboard bucket"""
+    from pymongo import UpdateOne
+
+    index, rank = HyperLogLog.register_for(clerk_user_id)
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"_id": f"all|{breed}"},
+            {
+                "$inc": {"search_count": 1},
+                "$max": {f"hll.{index}": rank},
+                "$set": {"window": "all", "breed": breed, "updated_at": now},
+            },
+            upsert=True
+        )
+    ]
+
+    for granularity, retention in BUCKET_RETENTION.items():
+        bucket_start = _bucket_start(timestamp, granularity)
+        if bucket_start + retention <= now:
+            continue
+        updates.append(UpdateOne(
+            {"_id": f"{granularity}|{bucket_start.isoformat()}|{breed}"},
+            {
+                "$inc": {"search_count": 1},
+                "$max": {f"hll.{index}": rank},
+                "$set": {
+                    "window": granularity,
+                    "breed": breed,
+                    "bucket_start": bucket_start,
+                    "expire_at": bucket_start + retention,
+                },
+            },
+            upsert=True
+        ))
+    return updates
+
+
+class LeaderboardService:
+    """Popular-breed leaderboard operations"""
+
+    _refresh_locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    async def record_search(breed: str, clerk_user_id: str, timestamp: Optional[datetime] = None) -> None:
+        """Count a search in the all-time, hourly and daily buckets in one round trip"""
+        db = get_database()
+        updates = leaderboard_updates(breed, clerk_user_id, timestamp or datetime.utcnow())
+        await db.breed_leaderboard.bulk_write(updates, ordered=False)
+
+    @staticmethod
+    async def get_top_breeds(limit: int = 10, window: str = "all") -> List[Dict[str, Any]]:
+        """Get the most searched breeds for a window: all, 24h or 7d"""
+        if window == "all":
+            db = get_database()
+            cursor = db.breed_leaderboard.find(
+                {"window": "all"},
+                {"_id": 0, "breed": 1, "search_count": 1, "hll": 1}
+            ).sort("search_count", -1).limit(limit)
+            return [
+                {
+                    "breed": entry["breed"],
+                    "search_count": entry["search_count"],
+                    "user_count": HyperLogLog(entry.get("hll")).estimate()
+                }
+                async for entry in cursor
+            ]
+
+        if window not in LEADERBOARD_WINDOWS:
+            raise ValueError(f"Unsupported leaderboard window: {window}")
+
+        snapshot = await LeaderboardService._get_fresh_snapshot(window)
+        return snapshot["entries"][:limit]
+
+    @staticmethod
+    async def _get_fresh_snapshot(window: str) -> Dict[str, Any]:
+        db = get_database()
+        snapshot = await db.leaderboard_snapshots.find_one({"_id": window})
+        if snapshot and LeaderboardService._is_fresh(snapshot):
+            return snapshot
+
+        # Only one coroutine per window rebuilds the snapshot
+        lock = LeaderboardService._refresh_locks.setdefault(window, asyncio.Lock())
+        async with lock:
+            snapshot = await db.leaderboard_snapshots.find_one({"_id": window})
+            if snapshot and LeaderboardService._is_fresh(snapshot):
+                return snapshot
+            return await LeaderboardService.refresh_window(window)
+
+    @staticmethod
+    def _is_fresh(snapshot: Dict[str, Any]) -> bool:
+        age = datetime.utcnow() - snapshot["computed_at"]
+        return age.total_seconds() < SNAPSHOT_MAX_AGE_SECONDS
+
+    @staticmethod
+    async def refresh_window(window: str) -> Dict[str, Any]:
+        """Merge the time buckets of a window into a precomputed top-N snapshot"""
+        db = get_database()
+        granularity, lookback = LEADERBOARD_WINDOWS[window]
+        now = datetime.utcnow()
+        since = _bucket_start(now - lookback, granularity)
+
+        counts: Dict[str, int] = {}
+        sketches: Dict[str, HyperLogLog] = {}
+        cursor = db.breed_leaderboard.find(
+            {"window": granularity, "bucket_start": {"$gte": since}},
+            {"_id": 0, "breed": 1, "search_count": 1, "hll": 1}
+        )
+        async for bucket in cursor:
+            breed = bucket["breed"]
+            counts[breed] = counts.get(breed, 0) + bucket["search_count"]
+            sketches.setdefault(breed, HyperLogLog()).merge(HyperLogLog(bucket.get("hll")))
+
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:SNAPSHOT_SIZE]
+        snapshot = {
+            "_id": window,
+            "entries": [
+                {"breed": breed, "search_count": count, "user_count": sketches[breed].estimate()}
+                for breed, count in top
+            ],
+            "computed_at": now,
+        }
+        await db.leaderboard_snapshots.replace_one({"_id": window}, snapshot, upsert=True)
+        return snapshot
+
+    @staticmethod
+    async def rebuild(batch_size: int = 1000) -> int:
+        """
+        Rebuild every leaderboard counter from search_history
+        Used by the migration CLI. Counters are built in a staging collection
+        while live searches keep updating breed_leaderboard; searches made
+        since the build started are replayed by _id, then the staging
+        collection replaces the live one with a rename
+        """
+        from bson import ObjectId
+
+        db = get_database()
+        staging = db[LEADERBOARD_STAGING_COLLECTION]
+        await staging.drop()
+        await _copy_indexes(db.breed_leaderboard, staging)
+
+        cutoff = ObjectId.from_datetime(datetime.utcnow())
+        processed, last_id = await _replay_searches(staging, {"_id": {"$lt": cutoff}}, batch_size)
+        # Catch up until a pass comes back short, so the rename misses as little as possible
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            replayed, newest = await _replay_searches(staging, query, batch_size)
+            processed += replayed
+            last_id = newest or last_id
+            if replayed < batch_size:
+                break
+        await staging.rename("breed_leaderboard", dropTarget=True)
+
+        for window in LEADERBOARD_WINDOWS:
+            await LeaderboardService.refresh_window(window)
+        return processed
+
+
+async def _copy_indexes(source, target) -> None:
+    """Create the source collection's secondary indexes on target"""
+    for name, info in (await source.index_information()).items():
+        if name == "_id_":
+            continue
+        options = {key: value for key, value in info.items() if key not in ("key", "v", "ns")}
+        await target.create_index(info["key"], name=name, **options)
+
+
+async def _replay_searches(target, query: Dict[str, Any], batch_size: int) -> Tuple[int, Any]:
+    """Count matching searches into target in _id order; returns (searches, last _id)"""
+    db = get_database()
+    cursor = db.search_history.find(
+        query,
+        {"breed_searched": 1, "user_id": 1, "search_timestamp": 1}
+    ).sort("_id", 1).batch_size(batch_size)
+
+    processed = 0
+    last_id = None
+    updates = []
+    async for search in cursor:
+        updates.extend(leaderboard_updates(
+            search["breed_searched"], search["user_id"], search["search_timestamp"]
+        ))
+        last_id = search["_id"]
+        processed += 1
+        if processed % batch_size == 0:
+            await target.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await target.bulk_write(updates, ordered=False)
+    return processed, last_id
@@ -0,0 +1,55 @@
+"""
+Leader leases for background jobs
+A lease is one document in scheduler_leases; whichever worker holds an
+unexpired lease runs the job, so scaling out the API doesn't multiply it
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .connection import get_database
+
+
+def worker_id() -> str:
+    """Identity of this process for lease ownership"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    """Time-bound exclusive lease on a named job"""
+
+    def __init__(self, name: str, ttl_seconds: float, holder: str = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = holder or worker_id()
+
+    async def acquire(self) -> bool:
+        """Take over an expired lease or extend our own; False while another worker holds it"""
+        db = get_database()
+        now = datetime.utcnow()
+        try:
+            lease = await db.scheduler_leases.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": {
+                    "holder": self.holder,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                    "renewed_at": now,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by someone else, so the upsert collided
+            return False
+        return lease is not None and lease.get("holder") == self.holder
+
+    async def release(self) -> None:
+        db = get_database()
+        await db.scheduler_leases.update_one(
+            {"_id": self.name, "holder": self.holder},
+            {"$set": {"expires_at": datetime.utcnow()}}
+        )
@@ -0,0 +1,110 @@
+"""
+Data migrations for Pawdentify
+Run from the project root: python -m database.migrations <name>
+"""
+import argparse
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Settings such as SCAN_STORAGE_MODE are read when the modules below are imported
+    load_dotenv()
+
+from .connection import close_database_connection
+from .leaderboard import LeaderboardService
+from .probabilities import compact_existing_scans
+from .reminders import backfill_reminder_dates
+from .scan_layout import SCAN_COLLECTIONS, SCAN_STORAGE_MODE, copy_scans_to_layout, dedupe_scans
+from .services import FeedbackService, SearchHistoryService, _bump_data_version
+
+
+async def rebuild_leaderboard() -> None:
+    """Recompute every popular-breed counter from search_history"""
+    processed = await LeaderboardService.rebuild()
+    print(f"✅ Leaderboard rebuilt from {processed} searches")
+
+
+async def seed_recent_searches() -> None:
+    """Seed each user's recent-breeds ring buffer from search_history"""
+    await SearchHistoryService.seed_recent_searches()
+    print("✅ Recent searches seeded")
+
+
+async def compact_scan_probabilities() -> None:
+    """Replace top_predictions sub-documents with packed probability blobs"""
+    converted = await compact_existing_scans()
+    print(f"✅ Compacted probabilities for {converted} scans")
+
+
+async def migrate_scan_storage() -> None:
+    """Copy scan_history into the layout selected by SCAN_STORAGE_MODE"""
+    from .indexes import sync_indexes
+
+    if SCAN_STORAGE_MODE == "collection":
+        print("ℹ️  SCAN_STORAGE_MODE is 'collection'; scans already live in scan_history")
+        return
+    copied = await copy_scans_to_layout(SCAN_STORAGE_MODE)
+    await sync_indexes()
+    target = SCAN_COLLECTIONS[SCAN_STORAGE_MODE]
+    print(f"✅ Copied {copied} scans into {target}; drop scan_history once the new layout is verified")
+
+
+async def backfill_vaccination_reminders() -> None:
+    """Set reminder_date on vaccinations created before the reminder scheduler"""
+    updated = await backfill_reminder_dates()
+    print(f"✅ Backfilled reminder dates on {updated} vaccinations")
+
+
+async def rebuild_feedback_stats() -> None:
+    """Recompute the feedback_stats counter document from the feedback collection"""
+    stats = await FeedbackService.rebuild_feedback_statistics()
+    print(f"✅ Feedback statistics rebuilt from {stats['total']} records")
+
+
+async def dedupe_scan_history() -> None:
+    """Remove repeated scans of one image within a dedupe window and correct total_scans"""
+    from pymongo import UpdateOne
+    from .connection import get_database
+
+    removed = await dedupe_scans()
+    if removed:
+        await get_database().users.bulk_write(
+            [UpdateOne({"clerk_user_id": user_id}, {"$inc": {"total_scans": -count}})
+             for user_id, count in removed.items()],
+            ordered=False
+        )
+        for user_id in removed:
+            await _bump_data_version(user_id)
+    print(f"✅ Removed {sum(removed.values())} duplicate scans across {len(removed)} users")
+
+
+MIGRATIONS: Dict[str, Callable[[], Awaitable[None]]] = {
+    "rebuild-leaderboard": rebuild_leaderboard,
+    "seed-recent-searches": seed_recent_searches,
+    "compact-scan-probabilities": compact_scan_probabilities,
+    "migrate-scan-storage": migrate_scan_storage,
+    "backfill-vaccination-reminders": backfill_vaccination_reminders,
+    "rebuild-feedback-stats": rebuild_feedback_stats,
+    "dedupe-scans": dedupe_scan_history,
+}
+
+
+async def run_migration(name: str) -> None:
+    try:
+        await MIGRATIONS[name]()
+    finally:
+        await close_database_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run Pawdentify data migrations")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+
+    asyncio.run(run_migration(args.migration))
+
+
+if __name__ == "__main__":
+    main()
@@ -104,6 +104,8 @@ class ScanHistory(BaseModel):
     is_crossbreed: bool = Field(default=False, description="Flagged as potential crossbreed")
     secondary_breed: Optional[str] = Field(None, description="Secondary breed if crossbreed")
     top_predictions: List[BreedPrediction] = Field(default_factory=list, description="Top 5 predictions")
+    probabilities: Optional[bytes] = Field(None, description="Full class distribution as a packed blob (see database.probabilities)")
+    probability_encoding: Optional[str] = Field(None, description="Blob encoding: f16 or u8")
     
     # Metadata
     timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,130 @@
+"""
+Compact storage of per-scan class probabilities
+The full softmax output is stored as one little-endian float16 (or
+uint8-quantized) binary blob indexed by class id; top_predictions is
+rebuilt from it on read
+"""
+import json
+import os
+from typing import Optional, List, Dict, Any, Sequence
+
+import numpy as np
+
+from .scan_layout import find_scans, scan_collection, scan_update
+
+
+CLASS_INDICES_PATH = os.getenv(
+    "CLASS_INDICES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model", "class_indices.json")
+)
+PROBABILITY_ENCODING = os.getenv("PROBABILITY_ENCODING", "f16")
+STORE_COMPACT_PROBABILITIES = os.getenv("SCAN_PROBABILITY_STORAGE", "compact").lower() == "compact"
+TOP_PREDICTIONS_SIZE = 10
+
+_DTYPES = {
+    "f16": np.dtype("<f2"),
+    "u8": np.dtype("u1"),
+}
+
+_class_names: Optional[List[str]] = None
+
+
+def class_names() -> List[str]:
+    """Class names ordered by model output index"""
+    global _class_names
+    if _class_names is None:
+        with open(CLASS_INDICES_PATH, "r") as f:
+            indices = json.load(f)
+        _class_names = [indices[str(i)] for i in range(len(indices))]
+    return _class_names
+
+
+def encode_probabilities(probabilities: Sequence[float], encoding: str = PROBABILITY_ENCODING) -> bytes:
+    """Pack a probability vector into the given encoding"""
+    if encoding not in _DTYPES:
+        raise ValueError(f"Unknown probability encoding '{encoding}'. Choose from: {', '.join(_DTYPES)}")
+    values = np.clip(np.asarray(probabilities, dtype=np.float32), 0.0, 1.0)
+    if encoding == "u8":
+        values = np.rint(values * 255.0)
+    return values.astype(_DTYPES[encoding]).tobytes()
+
+
+def decode_probabilities(blob: bytes, encoding: str) -> np.ndarray:
+    """Unpack a stored blob into a float32 probability vector"""
+    values = np.frombuffer(blob, dtype=_DTYPES[encoding]).astype(np.float32)
+    if encoding == "u8":
+        values /= 255.0
+    return values
+
+
+def top_predictions(probabilities: np.ndarray, k: int = TOP_PREDICTIONS_SIZE) -> List[Dict[str, Any]]:
+    """Highest-probability classes in the stored top_predictions shape"""
+    names = class_names()
+    k = min(k, len(probabilities))
+    indices = np.argpartition(probabilities, -k)[-k:]
+    indices = indices[np.argsort(probabilities[indices])[::-1]]
+    return [
+        {"breed_name": names[i] if i < len(names) else "Unknown", "confidence": round(float(probabilities[i]), 4)}
+        for i in indices
+        if probabilities[i] > 0
+    ]
+
+
+def expand_scan(scan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace a stored probability blob with top_predictions in place
+    Documents without a blob (legacy or projected away) are left as they are
+    """
+    blob = scan.pop("probabilities", None)
+    encoding = scan.pop("probability_encoding", None)
+    if blob is not None and encoding and "top_predictions" not in scan:
+        scan["top_predictions"] = top_predictions(decode_probabilities(blob, encoding))
+    return scan
+
+
+def vector_from_top_predictions(predictions: List[Dict[str, Any]]) -> np.ndarray:
+    """Rebuild a (sparse) probability vector from legacy top_predictions"""
+    names = class_names()
+    index_of = {name: i for i, name in enumerate(names)}
+    vector = np.zeros(len(names), dtype=np.float32)
+    for prediction in predictions:
+        index = index_of.get(prediction.get("breed_name"))
+        if index is not None:
+            vector[index] = prediction.get("confidence", 0.0)
+    return vector
+
+
+async def compact_existing_scans(batch_size: int = 1000, encoding: str = PROBABILITY_ENCODING) -> int:
+    """
+    Convert scans that still store top_predictions sub-documents
+    Legacy scans only kept the top classes, so the remaining entries of
+    their vectors are zero
+    """
+    # Goes through the layout helpers so bucketed and time-series storage
+    # get compacted as well, not just a leftover scan_history
+    cursor = find_scans(
+        {"top_predictions": {"$exists": True}, "probabilities": {"$exists": False}},
+        {"_id": 1, "top_predictions": 1},
+        batch_size=batch_size
+    )
+
+    converted = 0
+    operations = []
+    async for scan in cursor:
+        vector = vector_from_top_predictions(scan.get("top_predictions") or [])
+        operations.append(scan_update(scan["_id"], {
+            "$set": {
+                "probabilities": encode_probabilities(vector, encoding),
+                "probability_encoding": encoding,
+            },
+            "$unset": {"top_predictions": ""},
+        }))
+        if len(operations) >= batch_size:
+            await scan_collection().bulk_write(operations, ordered=False)
+            converted += len(operations)
+            operations = []
+
+    if operations:
+        await scan_collection().bulk_write(operations, ordered=False)
+        converted += len(operations)
+    return converted
@@ -0,0 +1,335 @@
+"""
+Vaccination reminder scheduler
+Each run first sweeps open records past their due date to overdue, then
+finds due reminders across all users with range scans over a partial index
+on reminder_date, hands them to a pluggable sink in bounded batches and
+flips reminder_sent with bulk_write. A leader lease keeps it to one worker.
+Delivery is at-least-once: reminders are flipped only after the sink has
+accepted them
+
+Enable in the API process with REMINDER_SCHEDULER_ENABLED=true, or run once:
+    python -m database.reminders [--dry-run] [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Awaitable, Callable
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+if __name__ == "__main__":
+    # REMINDER_* settings are read when this module is imported
+    load_dotenv()
+
+from .connection import get_database
+from .events import event_hub
+from .leases import LeaderLease
+
+
+REMINDER_LEAD_DAYS = int(os.getenv("REMINDER_LEAD_DAYS", "7"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "1000"))
+REMINDER_INTERVAL_SECONDS = float(os.getenv("REMINDER_INTERVAL_SECONDS", "300"))
+REMINDER_LEASE_SECONDS = float(os.getenv("REMINDER_LEASE_SECONDS", "120"))
+REMINDER_QUEUE_SIZE = int(os.getenv("REMINDER_QUEUE_SIZE", "10000"))
+REMINDER_OUTBOX_PATH = os.getenv(
+    "REMINDER_OUTBOX_PATH", os.path.join(os.getcwd(), "exports", "vaccination_reminders.ndjson")
+)
+
+REMINDER_FIELDS = {"user_id": 1, "pet_id": 1, "vaccine_name": 1, "due_date": 1, "reminder_date": 1, "status": 1}
+
+
+def default_reminder_date(due_date: datetime) -> datetime:
+    return due_date - timedelta(days=REMINDER_LEAD_DAYS)
+
+
+# ==================== Sinks ====================
+class FileReminderSink:
+    """Append reminders as NDJSON lines, e.g. for a mailer that tails the file"""
+
+    def __init__(self, path: str = REMINDER_OUTBOX_PATH):
+        self.path = path
+
+    def _write(self, lines: List[str]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write("".join(lines))
+
+    async def send(self, reminders: List[Dict[str, Any]]) -> None:
+        lines = [json.dumps(reminder, default=str) + "\n" for reminder in reminders]
+        await asyncio.to_thread(self._write, lines)
+
+
+async def publish_reminder(reminder: Dict[str, Any]) -> None:
+    """Push one reminder to the user's live /api/stream clients"""
+    event_hub.publish(reminder["user_id"], "vaccination.reminder", reminder)
+
+
+class QueueReminderSink:
+    """
+    In-process stand-in for a message queue
+    The queue is bounded, so send waits (and the scan slows down) while the
+    consumer task is behind instead of buffering every due reminder in memory
+    """
+
+    def __init__(
+        self,
+        maxsize: int = REMINDER_QUEUE_SIZE,
+        deliver: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.deliver = deliver or publish_reminder
+        self._consumer: Optional[asyncio.Task] = None
+
+    async def _consume(self) -> None:
+        while True:
+            reminder = await self.queue.get()
+            try:
+                await self.deliver(reminder)
+            except Exception as e:
+                print(f"⚠️ Reminder delivery failed: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def send(self, reminders: List[Dict[str, Any]]) -> None:
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._consume())
+        for reminder in reminders:
+            await self.queue.put(reminder)
+
+    async def close(self) -> None:
+        """Deliver whatever is still queued, then stop the consumer"""
+        if self._consumer is None:
+            return
+        await self.queue.join()
+        self._consumer.cancel()
+        try:
+            await self._consumer
+        except asyncio.CancelledError:
+            pass
+        self._consumer = None
+
+
+def _default_sink():
+    """Pick the sink from the REMINDER_SINK environment variable"""
+    if os.getenv("REMINDER_SINK", "file").lower() == "queue":
+        return QueueReminderSink()
+    return FileReminderSink()
+
+
+# ==================== Scanning ====================
+def due_query(now: datetime, after: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Unsent reminders due by now, resuming after the (reminder_date, _id) of
+    the previous batch; matches the partial reminder_date_1__id_1 index
+    """
+    query: Dict[str, Any] = {"reminder_sent": False, "reminder_date": {"$lte": now}}
+    if after is not None:
+        query["$or"] = [
+            {"reminder_date": {"$gt": after["reminder_date"]}},
+            {"reminder_date": after["reminder_date"], "_id": {"$gt": after["_id"]}},
+        ]
+    return query
+
+
+def to_reminder(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "vaccination_id": str(record["_id"]),
+        "user_id": record["user_id"],
+        "pet_id": record.get("pet_id"),
+        "vaccine_name": record.get("vaccine_name"),
+        "due_date": record.get("due_date"),
+        "overdue": record["due_date"] < datetime.utcnow() if record.get("due_date") else False,
+    }
+
+
+async def send_due_reminders(
+    sink=None,
+    batch_size: int = REMINDER_BATCH_SIZE,
+    lease: Optional[LeaderLease] = None,
+    dry_run: bool = False,
+    now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """
+    Deliver every due reminder in batches of batch_size
+    Completed vaccinations are flipped without a notification so they leave
+    the index. With a lease, it is renewed between batches and the run stops
+    if it was lost. Returns counters
+    """
+    db = get_database()
+    sink = sink if sink is not None else _default_sink()
+    now = now or datetime.utcnow()
+    totals = {"batches": 0, "sent": 0, "skipped": 0}
+
+    after = None
+    while True:
+        records = await db.vaccinations.find(due_query(now, after), REMINDER_FIELDS) \
+            .sort([("reminder_date", 1), ("_id", 1)]) \
+            .limit(batch_size) \
+            .to_list(batch_size)
+        if not records:
+            break
+        after = records[-1]
+
+        reminders = [to_reminder(record) for record in records if record.get("status") != "completed"]
+        totals["batches"] += 1
+        totals["sent"] += len(reminders)
+        totals["skipped"] += len(records) - len(reminders)
+        if dry_run:
+            continue
+
+        if reminders:
+            await sink.send(reminders)
+        sent_at = datetime.utcnow()
+        await db.vaccinations.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": record["_id"], "reminder_sent": False},
+                    {"$set": {"reminder_sent": True, "reminder_sent_at": sent_at}}
+                )
+                for record in records
+            ],
+            ordered=False
+        )
+
+        if lease is not None and not await lease.acquire():
+            print("⚠️ Reminder lease lost; stopping this run")
+            break
+    return totals
+
+
+async def sweep_overdue(batch_size: int = REMINDER_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """
+    Flip upcoming/scheduled records past their due date to overdue
+    Works in bounded batches over the (status, due_date) index; returns the
+    number of records flipped
+    """
+    from .services import _bump_data_version
+
+    db = get_database()
+    now = now or datetime.utcnow()
+    query = {"status": {"$in": ["upcoming", "scheduled"]}, "due_date": {"$lt": now}}
+
+    flipped = 0
+    while True:
+        records = await db.vaccinations.find(query, {"_id": 1, "user_id": 1}).limit(batch_size).to_list(batch_size)
+        if not records:
+            return flipped
+        result = await db.vaccinations.update_many(
+            dict(query, _id={"$in": [record["_id"] for record in records]}),
+            {"$set": {"status": "overdue", "updated_at": now}}
+        )
+        flipped += result.modified_count
+        # A background status change is still a write to the user's data, so
+        # validators handed out before it must not match afterwards
+        for user_id in {record["user_id"] for record in records}:
+            await _bump_data_version(user_id)
+
+
+async def backfill_reminder_dates() -> int:
+    """Give records without a reminder_date the default one and an explicit reminder_sent"""
+    db = get_database()
+    result = await db.vaccinations.update_many(
+        {"reminder_date": None},
+        [{"$set": {
+            "reminder_date": {"$subtract": ["$due_date", REMINDER_LEAD_DAYS * 24 * 3600 * 1000]},
+            "reminder_sent": {"$ifNull": ["$reminder_sent", False]},
+        }}]
+    )
+    return result.modified_count
+
+
+# ==================== Scheduler ====================
+class ReminderScheduler:
+    """Periodic background task that runs send_due_reminders while holding the lease"""
+
+    def __init__(
+        self,
+        sink=None,
+        interval_seconds: float = REMINDER_INTERVAL_SECONDS,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        lease: Optional[LeaderLease] = None
+    ):
+        self.sink = sink if sink is not None else _default_sink()
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.lease = lease or LeaderLease("vaccination-reminders", REMINDER_LEASE_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> Optional[Dict[str, int]]:
+        if not await self.lease.acquire():
+            return None
+        flipped = await sweep_overdue(self.batch_size)
+        if flipped:
+            print(f"🔔 Marked {flipped} vaccinations overdue")
+        totals = await send_due_reminders(self.sink, self.batch_size, self.lease)
+        if totals["sent"] or totals["skipped"]:
+            print(f"🔔 Sent {totals['sent']} vaccination reminders in {totals['batches']} batches")
+        return totals
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Reminder run failed: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if hasattr(self.sink, "close"):
+            await self.sink.close()
+        try:
+            await self.lease.release()
+        except Exception as e:
+            print(f"⚠️ Failed to release reminder lease: {str(e)}")
+
+
+# ==================== CLI ====================
+async def _run(batch_size: int, dry_run: bool) -> None:
+    from .connection import close_database_connection
+    lease = LeaderLease("vaccination-reminders", REMINDER_LEASE_SECONDS)
+    sink = _default_sink()
+    try:
+        if not await lease.acquire():
+            print("⚠️ Another worker holds the reminder lease; try again later")
+            return
+        try:
+            if not dry_run:
+                print(f"✅ Marked {await sweep_overdue(batch_size)} vaccinations overdue")
+            totals = await send_due_reminders(sink, batch_size, lease, dry_run)
+        finally:
+            if hasattr(sink, "close"):
+                await sink.close()
+            await lease.release()
+    finally:
+        await close_database_connection()
+    verb = "Would send" if dry_run else "Sent"
+    print(f"✅ {verb} {totals['sent']} reminders ({totals['skipped']} completed skipped) in {totals['batches']} batches")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep overdue vaccinations and send due reminders once")
+    parser.add_argument("--batch-size", type=int, default=REMINDER_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(_run(args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""
+Physical layout of scan history
+SCAN_STORAGE_MODE picks where scans are stored; ScanHistoryService keeps the
+same API in every mode:
+  collection  one document per scan in scan_history (default)
+  timeseries  a time-series collection with timestamp as timeField and
+              user_id as metaField (MongoDB 6.3+; updating non-meta fields
+              such as feedback needs 7.0+)
+  bucketed    per-user monthly bucket documents, for deployments without
+              time-series collections
+Scan reads are written as aggregation pipelines over flat scan documents;
+scan_pipeline() prepends the $unwind stages the bucketed layout needs
+
+Scans with an image_hash are deduplicated per (user_id, image_hash,
+dedupe_window): upsert_scan stores at most one per window, enforced by a
+unique partial index in the collection layout
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .connection import get_database
+
+
+SCAN_STORAGE_MODES = ("collection", "timeseries", "bucketed")
+
+SCAN_COLLECTIONS = {
+    "collection": "scan_history",
+    "timeseries": "scan_history_ts",
+    "bucketed": "scan_buckets",
+}
+
+# Scans per bucket document; keeps heavy users well below the 16 MB limit
+BUCKET_MAX_SCANS = int(os.getenv("SCAN_BUCKET_MAX_SCANS", "1000"))
+TIMESERIES_GRANULARITY = os.getenv("SCAN_TIMESERIES_GRANULARITY", "hours")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _mode_from_env() -> str:
+    mode = os.getenv("SCAN_STORAGE_MODE", "collection").lower()
+    if mode not in SCAN_STORAGE_MODES:
+        raise ValueError(f"Unknown SCAN_STORAGE_MODE '{mode}'. Choose from: {', '.join(SCAN_STORAGE_MODES)}")
+    return mode
+
+
+SCAN_STORAGE_MODE = _mode_from_env()
+
+
+def configure_scan_storage(mode: str) -> str:
+    """Switch the active layout, e.g. to benchmark several layouts in one process"""
+    global SCAN_STORAGE_MODE
+    if mode not in SCAN_STORAGE_MODES:
+        raise ValueError(f"Unknown scan storage mode '{mode}'")
+    SCAN_STORAGE_MODE = mode
+    return mode
+
+
+def scan_collection(db=None, mode: Optional[str] = None):
+    """The collection holding scans in the given (default: active) layout"""
+    db = db if db is not None else get_database()
+    return db[SCAN_COLLECTIONS[mode or SCAN_STORAGE_MODE]]
+
+
+def month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def dedupe_window_hours() -> int:
+    """
+    Rescans of the same image within one window count as a single scan
+    Read on use rather than at import, so a .env loaded later still applies
+    """
+    return int(os.getenv("SCAN_DEDUPE_WINDOW_HOURS", "24"))
+
+
+def dedupe_window(timestamp: datetime) -> datetime:
+    """Start of the fixed, epoch-aligned dedupe window containing timestamp"""
+    window = timedelta(hours=dedupe_window_hours())
+    return timestamp - (timestamp - _EPOCH) % window
+
+
+def _bucket_filter(match: Dict[str, Any]) -> Dict[str, Any]:
+    """Narrow the buckets to unwind using the scan-level $match"""
+    bucket: Dict[str, Any] = {}
+    if "user_id" in match:
+        bucket["user_id"] = match["user_id"]
+    if "_id" in match:
+        bucket["scans._id"] = match["_id"]
+
+    timestamp = match.get("timestamp")
+    if isinstance(timestamp, dict):
+        month = {}
+        lower = timestamp.get("$gte", timestamp.get("$gt"))
+        upper = timestamp.get("$lte", timestamp.get("$lt"))
+        if isinstance(lower, datetime):
+            month["$gte"] = month_start(lower)
+        if isinstance(upper, datetime):
+            month["$lte"] = month_start(upper)
+        if month:
+            bucket["month"] = month
+    return bucket
+
+
+def scan_pipeline(pipeline: List[Dict[str, Any]], mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Adapt a pipeline over flat scan documents to the layout
+    The pipeline's leading $match is reused to select buckets before the
+    $unwind, so only the matching users and months are expanded
+    """
+    if (mode or SCAN_STORAGE_MODE) != "bucketed":
+        return pipeline
+    match = pipeline[0].get("$match", {}) if pipeline else {}
+    return [
+        {"$match": _bucket_filter(match)},
+        {"$unwind": "$scans"},
+        {"$replaceRoot": {"newRoot": "$scans"}},
+    ] + pipeline
+
+
+def find_scans(
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, int]] = None,
+    sort: Optional[Dict[str, int]] = None,
+    batch_size: int = 1000,
+    db=None
+):
+    """Aggregation cursor over matching scans, whatever the layout"""
+    pipeline: List[Dict[str, Any]] = [{"$match": query}]
+    if sort:
+        pipeline.append({"$sort": sort})
+    if projection:
+        pipeline.append({"$project": projection})
+    return scan_collection(db).aggregate(scan_pipeline(pipeline), batchSize=batch_size)
+
+
+# ==================== Writes ====================
+async def insert_scan(scan: Dict[str, Any], db=None, session=None) -> ObjectId:
+    """
+    Store one scan dict and return its ObjectId
+    Only the plain collection rejects a repeated _id; time-series and
+    bucketed layouts would store it twice (see scan_exists)
+    """
+    collection = scan_collection(db)
+    if SCAN_STORAGE_MODE != "bucketed":
+        result = await collection.insert_one(scan, session=session)
+        return result.inserted_id
+
+    scan.setdefault("_id", ObjectId())
+    # Appends to the user's open bucket for the month; once it is full the
+    # filter stops matching and the upsert opens a new one
+    await collection.update_one(
+        {
+            "user_id": scan["user_id"],
+            "month": month_start(scan["timestamp"]),
+            "count": {"$lt": BUCKET_MAX_SCANS},
+        },
+        {"$push": {"scans": scan}, "$inc": {"count": 1}},
+        upsert=True,
+        session=session
+    )
+    return scan["_id"]
+
+
+async def upsert_scan(scan: Dict[str, Any], db=None, session=None) -> ObjectId:
+    """
+    Store a scan unless its (user_id, image_hash, dedupe_window) slot is taken
+    Returns the _id of the scan holding the slot: the scan's own _id when it
+    was stored now or by an earlier attempt, another one for a duplicate.
+    The collection layout upserts against the unique partial index; the
+    other layouts look the slot up first, which a concurrent identical
+    write can race
+    """
+    if scan.get("image_hash") is None or scan.get("dedupe_window") is None:
+        try:
+            return await insert_scan(scan, db, session=session)
+        except DuplicateKeyError:
+            # Same _id: an earlier attempt already stored it
+            return scan["_id"]
+
+    slot = {"user_id": scan["user_id"], "image_hash": scan["image_hash"], "dedupe_window": scan["dedupe_window"]}
+    if SCAN_STORAGE_MODE == "collection":
+        collection = scan_collection(db)
+        try:
+            stored = await collection.find_one_and_update(
+                slot,
+                {"$setOnInsert": scan},
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race on the unique index
+            stored = await collection.find_one(slot, {"_id": 1}, session=session)
+        return stored["_id"]
+
+    window_end = scan["dedupe_window"] + timedelta(hours=dedupe_window_hours())
+    query = dict(slot, timestamp={"$gte": scan["dedupe_window"], "$lt": window_end})
+    existing = await find_scans(query, projection={"_id": 1}, db=db).to_list(1)
+    if existing:
+        return existing[0]["_id"]
+    return await insert_scan(scan, db, session=session)
+
+
+async def scan_exists(scan_id: ObjectId, db=None) -> bool:
+    field = "scans._id" if SCAN_STORAGE_MODE == "bucketed" else "_id"
+    return await scan_collection(db).find_one({field: scan_id}, {"_id": 1}) is not None
+
+
+def scan_update(scan_id: ObjectId, change: Dict[str, Dict[str, Any]]) -> UpdateOne:
+    """
+    UpdateOne for a single scan; change uses $set/$unset over scan fields
+    Bucketed scans are addressed through the positional operator
+    """
+    if SCAN_STORAGE_MODE == "bucketed":
+        return UpdateOne(
+            {"scans._id": scan_id},
+            {operator: {f"scans.$.{field}": value for field, value in fields.items()}
+             for operator, fields in change.items()}
+        )
+    return UpdateOne({"_id": scan_id}, change)
+
+
+async def update_scan(scan_id: ObjectId, fields: Dict[str, Any], db=None) -> Optional[str]:
+    """Set fields on one scan; returns the owner's user_id, or None when not found"""
+    collection = scan_collection(db)
+    if SCAN_STORAGE_MODE == "bucketed":
+        bucket = await collection.find_one_and_update(
+            {"scans._id": scan_id},
+            {"$set": {f"scans.$.{field}": value for field, value in fields.items()}},
+            projection={"user_id": 1}
+        )
+        return bucket["user_id"] if bucket else None
+
+    if SCAN_STORAGE_MODE == "timeseries":
+        # Time-series collections don't support findAndModify; filtering on
+        # the metaField as well keeps the update on a single series
+        scan = await collection.find_one({"_id": scan_id}, {"user_id": 1})
+        if scan is None:
+            return None
+        await collection.update_one({"_id": scan_id, "user_id": scan["user_id"]}, {"$set": fields})
+        return scan["user_id"]
+
+    scan = await collection.find_one_and_update(
+        {"_id": scan_id},
+        {"$set": fields},
+        projection={"user_id": 1}
+    )
+    return scan["user_id"] if scan else None
+
+
+async def delete_scans(scan_ids: List[ObjectId], clerk_user_id: str, db=None) -> None:
+    """Delete scans of one user by _id; emptied buckets are removed"""
+    collection = scan_collection(db)
+    if SCAN_STORAGE_MODE == "bucketed":
+        await collection.update_many(
+            {"user_id": clerk_user_id, "scans._id": {"$in": scan_ids}},
+            [
+                {"$set": {"scans": {"$filter": {
+                    "input": "$scans",
+                    "cond": {"$not": [{"$in": ["$$this._id", scan_ids]}]},
+                }}}},
+                {"$set": {"count": {"$size": "$scans"}}},
+            ]
+        )
+        await collection.delete_many({"user_id": clerk_user_id, "count": 0})
+        return
+    await collection.delete_many({"user_id": clerk_user_id, "_id": {"$in": scan_ids}})
+
+
+# ==================== Setup & Migration ====================
+async def ensure_scan_collection(db=None, mode: Optional[str] = None) -> None:
+    """
+    Create the time-series collection explicitly
+    Must run before any index or insert would implicitly create a regular
+    collection under the same name
+    """
+    mode = mode or SCAN_STORAGE_MODE
+    if mode != "timeseries":
+        return
+    db = db if db is not None else get_database()
+    name = SCAN_COLLECTIONS[mode]
+    if await db.list_collection_names(filter={"name": name}):
+        return
+    await db.create_collection(
+        name,
+        timeseries={"timeField": "timestamp", "metaField": "user_id", "granularity": TIMESERIES_GRANULARITY}
+    )
+
+
+async def copy_scans_to_layout(mode: str, batch_size: int = 1000, db=None) -> int:
+    """
+    Copy every scan from scan_history into the given layout, keeping _ids
+    Refuses to run into a non-empty target so a rerun can't duplicate scans;
+    scan_history is left in place until the copy has been verified
+    """
+    db = db if db is not None else get_database()
+    if mode == "collection":
+        return 0
+    await ensure_scan_collection(db, mode)
+    target = scan_collection(db, mode)
+    if await target.find_one({}, {"_id": 1}):
+        raise RuntimeError(f"{target.name} already holds scans; drop it before migrating again")
+
+    # (user_id, timestamp desc) matches the scan_history index, so buckets
+    # fill user by user and month by month without an in-memory sort
+    cursor = db.scan_history.find({}).sort([("user_id", 1), ("timestamp", -1)]).batch_size(batch_size)
+
+    copied = 0
+    pending: List[Dict[str, Any]] = []
+    pending_scans = 0
+    bucket: Optional[Dict[str, Any]] = None
+    async for scan in cursor:
+        copied += 1
+        if mode == "timeseries":
+            pending.append(scan)
+            pending_scans += 1
+        else:
+            month = month_start(scan["timestamp"])
+            if bucket is None or bucket["user_id"] != scan["user_id"] or bucket["month"] != month \
+                    or bucket["count"] >= BUCKET_MAX_SCANS:
+                if pending_scans >= batch_size:
+                    # Only flush between buckets, never one that may still grow
+                    await target.insert_many(pending, ordered=False)
+                    pending, pending_scans = [], 0
+                bucket = {"user_id": scan["user_id"], "month": month, "count": 0, "scans": []}
+                pending.append(bucket)
+            bucket["scans"].append(scan)
+            bucket["count"] += 1
+            pending_scans += 1
+            continue
+
+        if pending_scans >= batch_size:
+            await target.insert_many(pending, ordered=False)
+            pending, pending_scans = [], 0
+
+    if pending:
+        await target.insert_many(pending, ordered=False)
+    return copied
+
+
+async def dedupe_scans(batch_size: int = 1000, db=None) -> Dict[str, int]:
+    """
+    Delete repeated scans of the same image by the same user within a dedupe
+    window, keeping the one with feedback, else the earliest
+    Works on every layout; returns the number of scans removed per user so
+    their counters can be corrected
+    """
+    db = db if db is not None else get_database()
+    window_ms = dedupe_window_hours() * 3600 * 1000
+    epoch_ms = {"$toLong": "$timestamp"}
+    pipeline = scan_pipeline([
+        {"$match": {"image_hash": {"$type": "string"}}},
+        {"$sort": {"user_feedback": -1, "timestamp": 1}},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "image_hash": "$image_hash",
+                "window": {"$subtract": [epoch_ms, {"$mod": [epoch_ms, window_ms]}]},
+            },
+            "ids": {"$push": "$_id"},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+        {"$project": {"user_id": "$_id.user_id", "remove": {"$slice": ["$ids", 1, {"$size": "$ids"}]}}},
+    ])
+
+    removed: Dict[str, int] = {}
+    pending: Dict[str, List[ObjectId]] = {}
+    pending_count = 0
+
+    async def flush() -> None:
+        for user_id, scan_ids in pending.items():
+            await delete_scans(scan_ids, user_id, db)
+            removed[user_id] = removed.get(user_id, 0) + len(scan_ids)
+        pending.clear()
+
+    cursor = scan_collection(db).aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    async for group in cursor:
+        pending.setdefault(group["user_id"], []).extend(group["remove"])
+        pending_count += len(group["remove"])
+        if pending_count >= batch_size:
+            await flush()
+            pending_count = 0
+    await flush()
+    return removed
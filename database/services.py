@@ -2,9 +2,37 @@
 Database service layer - CRUD operations
 Handles all database interactions
 """
-from typing import Optional, List, Dict, Any
-from datetime import datetime
-from .connection import get_database
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Set, Tuple
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import asyncio
+import copy
+import os
+import re
+import time
+from .archive import ScanArchiveService
+from . import scan_layout
+from .connection import get_database, supports_transactions
+from .events import event_hub
+from .leaderboard import LeaderboardService, leaderboard_updates
+from .probabilities import (
+    PROBABILITY_ENCODING,
+    STORE_COMPACT_PROBABILITIES,
+    encode_probabilities,
+    expand_scan,
+    vector_from_top_predictions,
+)
+from .reminders import default_reminder_date
+from .scan_layout import (
+    dedupe_window,
+    dedupe_window_hours,
+    scan_collection,
+    scan_exists,
+    scan_pipeline,
+    update_scan,
+    upsert_scan,
+)
+from .votes import vote_buffer
 from .models import (
     User, 
     ScanHistory, 
@@ -21,6 +49,390 @@ from .models import (
 )
 
 
+# ==================== Read-Through Cache ====================
+_MISS = object()
+
+
+class InMemoryCacheBackend:
+    """Process-local cache backend with TTL expiry and LRU eviction"""
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+    
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISS
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISS
+        self._entries.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RedisCacheBackend:
+    """
+    Cache backend for any client speaking the Redis GET/SET/DEL protocol
+    Values are BSON-encoded so datetimes survive the round trip;
+    LRU bounds come from the server's maxmemory-policy
+    """
+    
+    def __init__(self, client, prefix: str = "pawdentify:cache:"):
+        self.client = client
+        self.prefix = prefix
+    
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCacheBackend":
+        import redis.asyncio as redis
+        return cls(redis.from_url(url), **kwargs)
+    
+    async def get(self, key: str) -> Any:
+        import bson
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return _MISS
+        return bson.decode(raw)["v"]
+    
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        import bson
+        await self.client.set(
+            self.prefix + key,
+            bson.encode({"v": value}),
+            px=max(int(ttl_seconds * 1000), 1)
+        )
+    
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*[self.prefix + key for key in keys])
+
+
+class ReadThroughCache:
+    """
+    Read-through cache with write-through invalidation
+    Concurrent misses for the same key share a single loader call
+    """
+    
+    def __init__(self, backend, ttl_seconds: float = 60.0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._invalidated_while_loading: set = set()
+    
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️ Cache read failed for {key}: {str(e)}")
+            return await loader()
+        if value is not _MISS:
+            return copy.deepcopy(value)
+        
+        # Stampede protection: wait on the in-flight load instead of querying again
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return copy.deepcopy(await asyncio.shield(inflight))
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except Exception as e:
+            # Nothing gets cached, so an invalidation during this load is moot
+            self._invalidated_while_loading.discard(key)
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        
+        future.set_result(value)
+        if key in self._invalidated_while_loading:
+            # A write landed during the load, so this value may already be stale
+            self._invalidated_while_loading.discard(key)
+        else:
+            try:
+                await self.backend.set(key, value, self.ttl_seconds)
+            except Exception as e:
+                print(f"⚠️ Cache write failed for {key}: {str(e)}")
+        return copy.deepcopy(value)
+    
+    async def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            if key in self._inflight:
+                self._invalidated_while_loading.add(key)
+        try:
+            await self.backend.delete(*keys)
+        except Exception as e:
+            print(f"⚠️ Cache invalidation failed for {keys}: {str(e)}")
+
+
+def _default_cache_backend():
+    """Pick the cache backend from the CACHE_BACKEND environment variable"""
+    if os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+        return RedisCacheBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryCacheBackend(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")))
+
+
+cache = ReadThroughCache(
+    _default_cache_backend(),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "60"))
+)
+
+
+def configure_cache(backend=None, ttl_seconds: Optional[float] = None) -> ReadThroughCache:
+    """Swap the cache backend, e.g. for a local fake Redis in tests"""
+    global cache
+    cache = ReadThroughCache(
+        backend if backend is not None else _default_cache_backend(),
+        ttl_seconds=ttl_seconds if ttl_seconds is not None else cache.ttl_seconds
+    )
+    return cache
+
+
+# Size of the per-user recent-breeds ring buffer
+RECENT_SEARCHES_SIZE = 20
+
+
+def _user_cache_key(clerk_user_id: str) -> str:
+    return f"user:{clerk_user_id}"
+
+
+def _preferences_cache_key(clerk_user_id: str) -> str:
+    return f"prefs:{clerk_user_id}"
+
+
+# ==================== Query Orchestration ====================
+DEFAULT_SECTION_TIMEOUT = float(os.getenv("SECTION_TIMEOUT_SECONDS", "2.0"))
+
+
+async def gather_sections(
+    sections: Dict[str, Awaitable[Any]],
+    defaults: Optional[Dict[str, Any]] = None,
+    timeout: float = DEFAULT_SECTION_TIMEOUT
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Run independent reads concurrently with a per-section timeout
+    A section that fails or times out degrades to its default instead of
+    failing the whole response; returns (results, degraded section names)
+    """
+    defaults = defaults or {}
+    
+    async def run_section(name: str, awaitable: Awaitable[Any]):
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout), False
+        except asyncio.TimeoutError:
+            print(f"⚠️ Section '{name}' timed out after {timeout}s")
+        except Exception as e:
+            print(f"⚠️ Section '{name}' failed: {str(e)}")
+        return copy.deepcopy(defaults.get(name)), True
+    
+    names = list(sections)
+    outcomes = await asyncio.gather(*(run_section(name, sections[name]) for name in names))
+    
+    results = {}
+    degraded = []
+    for name, (value, failed) in zip(names, outcomes):
+        results[name] = value
+        if failed:
+            degraded.append(name)
+    return results, degraded
+
+
+# ==================== Document Reads ====================
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", "1000"))
+
+# Named projections per collection; None returns the whole document
+PROJECTION_VIEWS: Dict[str, Dict[str, Optional[List[str]]]] = {
+    "scan_history": {
+        "list": [
+            "predicted_breed", "confidence_score", "is_crossbreed", "secondary_breed",
+            "top_predictions", "timestamp", "device_type", "image_url",
+            "user_feedback", "user_notes", "user_confirmed_breed",
+        ],
+        "analytics": ["timestamp", "predicted_breed", "confidence_score", "is_crossbreed"],
+        "detail": None,
+    },
+    "search_history": {
+        "list": ["breed_searched", "search_query", "search_timestamp", "is_bookmarked", "user_rating"],
+        "detail": None,
+    },
+    "pets": {
+        "list": [
+            "name", "breed", "secondary_breed", "age_years", "age_months",
+            "weight_lbs", "color", "created_at", "updated_at",
+        ],
+        "detail": None,
+    },
+    "vaccinations": {
+        "list": [
+            "pet_id", "vaccine_name", "vaccine_type", "administered_date", "due_date",
+            "next_due_date", "status", "is_core_vaccine", "veterinarian_name",
+            "clinic_name", "notes",
+        ],
+        "detail": None,
+    },
+    "feedback": {
+        "list": [
+            "feedback_type", "subject", "message", "status", "rating", "scan_id",
+            "predicted_breed", "corrected_breed", "submitted_at", "updated_at", "resolved_at",
+        ],
+        "detail": None,
+    },
+    "community_feedback": {
+        "list": [
+            "display_name", "user_location", "title", "content", "rating",
+            "usage_duration", "favorite_features", "scan_count", "is_approved",
+            "is_featured", "helpful_votes", "total_votes", "submitted_at", "approved_at",
+        ],
+        "detail": None,
+    },
+}
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def resolve_projection(
+    collection: str,
+    view: str = "detail",
+    fields: Optional[List[str]] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Projection for a named view, optionally narrowed to requested fields
+    Raises ValueError for unknown views, malformed field names, or fields
+    the view does not expose
+    """
+    views = PROJECTION_VIEWS[collection]
+    if view not in views:
+        raise ValueError(f"Unknown view '{view}'. Choose from: {', '.join(views)}")
+    
+    allowed = views[view]
+    if fields:
+        requested = [field for field in fields if field != "_id"]
+        invalid = [field for field in requested if not _FIELD_NAME.match(field)]
+        if invalid:
+            raise ValueError(f"Invalid field names: {', '.join(invalid)}")
+        if allowed is not None:
+            outside = [field for field in requested if field.split(".")[0] not in allowed]
+            if outside:
+                raise ValueError(f"Fields not available in the '{view}' view: {', '.join(outside)}")
+        allowed = requested
+    
+    if allowed is None:
+        return None
+    return {field: 1 for field in allowed}
+
+
+def list_pipeline(
+    query: Dict[str, Any],
+    sort: Optional[Dict[str, int]] = None,
+    skip: int = 0,
+    limit: int = 0,
+    projection: Optional[Dict[str, int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Aggregation equivalent of find().sort().skip().limit() that returns
+    _id as a string, so the server does the ObjectId conversion
+    """
+    pipeline: List[Dict[str, Any]] = [{"$match": query}]
+    if sort:
+        pipeline.append({"$sort": sort})
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline.append({"$set": {"_id": {"$toString": "$_id"}}})
+    return pipeline
+
+
+async def fetch_documents(
+    collection,
+    query: Dict[str, Any],
+    sort: Optional[Dict[str, int]] = None,
+    skip: int = 0,
+    limit: int = 0,
+    projection: Optional[Dict[str, int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Read a list of documents with string ids
+    The cursor is drained with to_list in READ_BATCH_SIZE batches instead of
+    touching each document in a Python loop
+    """
+    cursor = collection.aggregate(
+        list_pipeline(query, sort, skip, limit, projection),
+        batchSize=READ_BATCH_SIZE
+    )
+    return await cursor.to_list(None)
+
+
+# ==================== Data Versions ====================
+class DataVersionService:
+    """
+    Per-user data version counters
+    Bumped on every write that changes what the dashboards show, so
+    responses can be validated with an ETag instead of being recomputed
+    """
+    
+    # Users whose last bump failed; their stored version is stale until it lands
+    _pending_bumps: Set[str] = set()
+    
+    @staticmethod
+    async def bump(clerk_user_id: str) -> None:
+        db = get_database()
+        await db.user_data_versions.update_one(
+            {"_id": clerk_user_id},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        DataVersionService._pending_bumps.discard(clerk_user_id)
+    
+    @staticmethod
+    async def get_version(clerk_user_id: str) -> Tuple[int, Optional[datetime]]:
+        """
+        Return (version, last change time); (0, None) for users without writes
+        A failed bump is retried first and the error propagates while it
+        keeps failing, so callers never validate against a stale version
+        """
+        if clerk_user_id in DataVersionService._pending_bumps:
+            await DataVersionService.bump(clerk_user_id)
+        db = get_database()
+        doc = await db.user_data_versions.find_one({"_id": clerk_user_id})
+        if not doc:
+            return 0, None
+        return doc.get("version", 0), doc.get("updated_at")
+
+
+async def _bump_data_version(clerk_user_id: Optional[str]) -> None:
+    """
+    Bump a user's data version after a write without failing the write
+    A failed bump is remembered and retried with the next one, and until it
+    lands get_version() raises instead of returning the stale version
+    """
+    if not clerk_user_id:
+        return
+    for user_id in [clerk_user_id] + list(DataVersionService._pending_bumps - {clerk_user_id}):
+        try:
+            await DataVersionService.bump(user_id)
+        except Exception as e:
+            DataVersionService._pending_bumps.add(user_id)
+            print(f"⚠️ Failed to bump data version for {user_id}: {str(e)}")
+            return
+
+
 # ==================== User Operations ====================
 class UserService:
     """User database operations"""
@@ -32,16 +444,20 @@ class UserService:
         user_dict = user_data.model_dump()
         result = await db.users.insert_one(user_dict)
         user_dict["_id"] = str(result.inserted_id)
+        await cache.invalidate(_user_cache_key(user_data.clerk_user_id))
         return user_dict
     
     @staticmethod
     async def get_user_by_clerk_id(clerk_user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user by Clerk ID"""
-        db = get_database()
-        user = await db.users.find_one({"clerk_user_id": clerk_user_id})
-        if user:
-            user["_id"] = str(user["_id"])
-        return user
+        """Get user by Clerk ID (served from the read-through cache)"""
+        async def load():
+            db = get_database()
+            user = await db.users.find_one({"clerk_user_id": clerk_user_id})
+            if user:
+                user["_id"] = str(user["_id"])
+            return user
+        
+        return await cache.get_or_load(_user_cache_key(clerk_user_id), load)
     
     @staticmethod
     async def update_user(clerk_user_id: str, update_data: Dict[str, Any]) -> bool:
@@ -52,17 +468,27 @@ class UserService:
             {"clerk_user_id": clerk_user_id},
             {"$set": update_data}
         )
+        await cache.invalidate(_user_cache_key(clerk_user_id))
+        await _bump_data_version(clerk_user_id)
         return result.modified_count > 0
     
     @staticmethod
     async def increment_scan_count(clerk_user_id: str) -> bool:
         """Increment user's total scan count"""
         db = get_database()
-        result = await db.users.update_one(
+        from pymongo import ReturnDocument
+        user = await db.users.find_one_and_update(
             {"clerk_user_id": clerk_user_id},
-            {"$inc": {"total_scans": 1}}
+            {"$inc": {"total_scans": 1}},
+            projection={"total_scans": 1},
+            return_document=ReturnDocument.AFTER
         )
-        return result.modified_count > 0
+        await cache.invalidate(_user_cache_key(clerk_user_id))
+        await _bump_data_version(clerk_user_id)
+        if user is None:
+            return False
+        event_hub.publish(clerk_user_id, "counters.updated", {"total_scans": user.get("total_scans", 0)})
+        return True
     
     @staticmethod
     async def add_favorite_breed(clerk_user_id: str, breed_name: str) -> bool:
@@ -72,6 +498,10 @@ class UserService:
             {"clerk_user_id": clerk_user_id},
             {"$addToSet": {"favorite_breeds": breed_name}}
         )
+        await cache.invalidate(_user_cache_key(clerk_user_id))
+        await _bump_data_version(clerk_user_id)
+        if result.modified_count > 0:
+            event_hub.publish(clerk_user_id, "favorites.updated", {"breed": breed_name, "action": "added"})
         return result.modified_count > 0
     
     @staticmethod
@@ -82,103 +512,379 @@ class UserService:
             {"clerk_user_id": clerk_user_id},
             {"$pull": {"favorite_breeds": breed_name}}
         )
+        await cache.invalidate(_user_cache_key(clerk_user_id))
+        await _bump_data_version(clerk_user_id)
+        if result.modified_count > 0:
+            event_hub.publish(clerk_user_id, "favorites.updated", {"breed": breed_name, "action": "removed"})
         return result.modified_count > 0
 
 
 # ==================== Scan History Operations ====================
+def _scan_projection(view: str, fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    """Scan projection that also fetches the probability blob behind top_predictions"""
+    projection = resolve_projection("scan_history", view, fields)
+    if projection and "top_predictions" in projection:
+        projection["probabilities"] = 1
+        projection["probability_encoding"] = 1
+    return projection
+
+
+async def _fetch_scans(
+    query: Dict[str, Any],
+    sort: Optional[Dict[str, int]] = None,
+    skip: int = 0,
+    limit: int = 0,
+    projection: Optional[Dict[str, int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    fetch_documents over the active scan layout, newest first
+    Once the hot scans run out the page continues into the cold archive, so
+    callers see one history; probabilities are expanded on the way out
+    """
+    pipeline = scan_pipeline(list_pipeline(query, sort, skip, limit, projection))
+    scans = await scan_collection().aggregate(pipeline, batchSize=READ_BATCH_SIZE).to_list(None)
+    
+    if not limit or len(scans) < limit:
+        cold_skip = 0
+        if skip and not scans:
+            # The page starts past the hot scans; skip the rest in the archive
+            counted = await scan_collection().aggregate(
+                scan_pipeline([{"$match": query}, {"$count": "total"}])
+            ).to_list(1)
+            cold_skip = max(skip - (counted[0]["total"] if counted else 0), 0)
+        
+        timestamp = query.get("timestamp", {})
+        async for scan in ScanArchiveService.iter_scans(
+            query["user_id"],
+            start_date=timestamp.get("$gte"),
+            end_date=timestamp.get("$lte"),
+            breed=query.get("predicted_breed"),
+            fields=list(projection) if projection else None,
+            skip=cold_skip
+        ):
+            scans.append(scan)
+            if limit and len(scans) >= limit:
+                break
+    return [expand_scan(scan) for scan in scans]
+
+
+# ==================== Scan Recording ====================
+# auto: use a transaction where the deployment supports one (replica set or
+# sharded cluster); on: always; off: never. The time-series layout can't be
+# written inside a transaction, so it always takes the sequential path
+SCAN_WRITE_TRANSACTIONS = os.getenv("SCAN_WRITE_TRANSACTIONS", "auto").lower()
+# How long a retried Idempotency-Key still maps to its original scan
+SCAN_RECEIPT_TTL_HOURS = float(os.getenv("SCAN_RECEIPT_TTL_HOURS", "24"))
+
+
+def _scan_document(scan_data: ScanHistory) -> Dict[str, Any]:
+    """The scan_history document for a scan, probabilities packed if enabled"""
+    scan_dict = scan_data.model_dump()
+    if STORE_COMPACT_PROBABILITIES and scan_dict["probabilities"] is None and scan_dict["top_predictions"]:
+        vector = vector_from_top_predictions(scan_dict["top_predictions"])
+        scan_dict["probabilities"] = encode_probabilities(vector)
+        scan_dict["probability_encoding"] = PROBABILITY_ENCODING
+    if scan_dict["probabilities"] is not None:
+        # The blob supersedes the per-breed sub-documents
+        scan_dict.pop("top_predictions")
+    else:
+        scan_dict.pop("probabilities")
+        scan_dict.pop("probability_encoding")
+    if scan_dict.get("image_hash"):
+        scan_dict["dedupe_window"] = dedupe_window(scan_dict["timestamp"])
+    return scan_dict
+
+
+async def _announce_scan(scan_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a stored scan into its API form and notify listeners"""
+    scan_dict["_id"] = str(scan_dict["_id"])
+    expand_scan(scan_dict)
+    await _bump_data_version(scan_dict["user_id"])
+    event_hub.publish(scan_dict["user_id"], "scan.created", {
+        "_id": scan_dict["_id"],
+        "predicted_breed": scan_dict["predicted_breed"],
+        "confidence_score": scan_dict["confidence_score"],
+        "is_crossbreed": scan_dict["is_crossbreed"],
+        "timestamp": scan_dict["timestamp"],
+    })
+    return scan_dict
+
+
+async def _use_scan_transactions() -> bool:
+    if SCAN_WRITE_TRANSACTIONS == "off" or scan_layout.SCAN_STORAGE_MODE == "timeseries":
+        return False
+    if SCAN_WRITE_TRANSACTIONS == "on":
+        return True
+    try:
+        return await supports_transactions()
+    except Exception as e:
+        print(f"⚠️ Could not detect transaction support: {str(e)}")
+        return False
+
+
 class ScanHistoryService:
     """Scan history database operations"""
     
     @staticmethod
     async def create_scan(scan_data: ScanHistory) -> Dict[str, Any]:
-        """Save new scan to database"""
+        """
+        Save new scan to database (without counting it; see record_scan)
+        A repeat of an image already scanned in this dedupe window returns
+        just the existing scan's _id
+        """
+        from bson import ObjectId
+        scan_dict = _scan_document(scan_data)
+        scan_dict["_id"] = ObjectId()
+        stored_id = await upsert_scan(scan_dict)
+        if stored_id != scan_dict["_id"]:
+            return {"_id": str(stored_id)}
+        return await _announce_scan(scan_dict)
+    
+    @staticmethod
+    async def record_scan(
+        scan_data: ScanHistory,
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Store a scan and count it in the user's total_scans as one unit
+        With a key (the image hash and dedupe window, else the client's
+        Idempotency-Key) a scan_receipts document pins the scan's _id and
+        records whether it was counted, so retries and the /predict plus
+        POST /api/scans double save neither store nor count it twice.
+        Where transactions are available both writes commit together;
+        otherwise they run in sequence and a crash between them can only
+        leave the count one short, never double it.
+        Returns (scan, created); a repeat returns just the original _id
+        """
+        from bson import ObjectId
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
         db = get_database()
-        scan_dict = scan_data.model_dump()
-        result = await db.scan_history.insert_one(scan_dict)
-        scan_dict["_id"] = str(result.inserted_id)
-        return scan_dict
+        user_id = scan_data.user_id
+        scan_dict = _scan_document(scan_data)
+        
+        receipt = None
+        now = datetime.utcnow()
+        if scan_dict.get("dedupe_window") is not None:
+            key = f"image:{scan_dict['image_hash']}:{scan_dict['dedupe_window'].isoformat()}"
+            expire_at = scan_dict["dedupe_window"] + timedelta(hours=dedupe_window_hours() + 1)
+        elif idempotency_key:
+            key = f"key:{idempotency_key}"
+            expire_at = now + timedelta(hours=SCAN_RECEIPT_TTL_HOURS)
+        else:
+            key = None
+        if key is not None:
+            receipt_filter = {"_id": f"{user_id}|{key}"}
+            try:
+                receipt = await db.scan_receipts.find_one_and_update(
+                    receipt_filter,
+                    {
+                        "$setOnInsert": {
+                            "scan_id": ObjectId(),
+                            "user_id": user_id,
+                            "counted": False,
+                            "created_at": now,
+                            "expire_at": expire_at,
+                        },
+                        "$inc": {"attempts": 1},
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # A concurrent first attempt won the upsert
+                receipt = await db.scan_receipts.find_one_and_update(
+                    receipt_filter, {"$inc": {"attempts": 1}}, return_document=ReturnDocument.AFTER
+                )
+            if receipt["counted"]:
+                return {"_id": str(receipt["scan_id"])}, False
+            scan_dict["_id"] = receipt["scan_id"]
+        else:
+            scan_dict["_id"] = ObjectId()
+        
+        if await _use_scan_transactions():
+            stored_id, created, user = await ScanHistoryService._record_in_transaction(db, scan_dict, receipt)
+        else:
+            stored_id, created, user = await ScanHistoryService._record_in_sequence(db, scan_dict, receipt)
+        if not created:
+            if stored_id is None:
+                # A concurrent attempt counted it; the receipt has the final _id
+                current = await db.scan_receipts.find_one({"_id": receipt["_id"]}, {"scan_id": 1})
+                stored_id = current["scan_id"] if current else scan_dict["_id"]
+            return {"_id": str(stored_id)}, False
+        
+        await cache.invalidate(_user_cache_key(user_id))
+        if user is not None:
+            event_hub.publish(user_id, "counters.updated", {"total_scans": user.get("total_scans", 0)})
+        return await _announce_scan(scan_dict), True
+    
+    @staticmethod
+    async def _count_scan(db, clerk_user_id: str, session=None) -> Optional[Dict[str, Any]]:
+        from pymongo import ReturnDocument
+        return await db.users.find_one_and_update(
+            {"clerk_user_id": clerk_user_id},
+            {"$inc": {"total_scans": 1}},
+            projection={"total_scans": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+    
+    @staticmethod
+    async def _claim_receipt(db, receipt: Dict[str, Any], session=None) -> bool:
+        """Flip the receipt to counted; False when another attempt already did"""
+        result = await db.scan_receipts.update_one(
+            {"_id": receipt["_id"], "counted": False},
+            {"$set": {"counted": True}},
+            session=session
+        )
+        return result.modified_count == 1
+    
+    @staticmethod
+    async def _adopt_existing_scan(db, receipt: Optional[Dict[str, Any]], stored_id, session=None) -> None:
+        """Point the receipt at a scan stored (and counted) through another path"""
+        if receipt is not None:
+            await db.scan_receipts.update_one(
+                {"_id": receipt["_id"]},
+                {"$set": {"scan_id": stored_id, "counted": True}},
+                session=session
+            )
+    
+    @staticmethod
+    async def _record_in_transaction(
+        db,
+        scan_dict: Dict[str, Any],
+        receipt: Optional[Dict[str, Any]]
+    ) -> Tuple[Any, bool, Optional[Dict[str, Any]]]:
+        outcome: Dict[str, Any] = {}
+        
+        async def write(session):
+            # Claiming the receipt first makes concurrent retries conflict on
+            # it; the loser is retried by with_transaction and sees it counted
+            if receipt is not None and not await ScanHistoryService._claim_receipt(db, receipt, session):
+                outcome.update(stored_id=None, created=False, user=None)
+                return
+            stored_id = await upsert_scan(scan_dict, db, session=session)
+            if stored_id != scan_dict["_id"]:
+                await ScanHistoryService._adopt_existing_scan(db, receipt, stored_id, session)
+                outcome.update(stored_id=stored_id, created=False, user=None)
+                return
+            user = await ScanHistoryService._count_scan(db, scan_dict["user_id"], session)
+            outcome.update(stored_id=stored_id, created=True, user=user)
+        
+        async with await db.client.start_session() as session:
+            await session.with_transaction(write)
+        return outcome["stored_id"], outcome["created"], outcome["user"]
+    
+    @staticmethod
+    async def _record_in_sequence(
+        db,
+        scan_dict: Dict[str, Any],
+        receipt: Optional[Dict[str, Any]]
+    ) -> Tuple[Any, bool, Optional[Dict[str, Any]]]:
+        # A retry may find the scan already stored by the attempt that failed
+        first_attempt = receipt is None or receipt["attempts"] == 1
+        if first_attempt or not await scan_exists(scan_dict["_id"], db):
+            stored_id = await upsert_scan(scan_dict, db)
+        else:
+            stored_id = scan_dict["_id"]
+        if stored_id != scan_dict["_id"]:
+            await ScanHistoryService._adopt_existing_scan(db, receipt, stored_id)
+            return stored_id, False, None
+        if receipt is not None and not await ScanHistoryService._claim_receipt(db, receipt):
+            return None, False, None
+        return stored_id, True, await ScanHistoryService._count_scan(db, scan_dict["user_id"])
     
     @staticmethod
     async def get_user_scans(
         clerk_user_id: str,
         limit: int = 50,
-        skip: int = 0
+        skip: int = 0,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get user's scan history with pagination"""
-        db = get_database()
-        cursor = db.scan_history.find(
-            {"user_id": clerk_user_id}
-        ).sort("timestamp", -1).skip(skip).limit(limit)
-        
-        scans = []
-        async for scan in cursor:
-            scan["_id"] = str(scan["_id"])
-            scans.append(scan)
-        return scans
+        return await _fetch_scans(
+            {"user_id": clerk_user_id},
+            sort={"timestamp": -1},
+            skip=skip,
+            limit=limit,
+            projection=_scan_projection(view, fields)
+        )
     
     @staticmethod
     async def get_scan_statistics(clerk_user_id: str) -> Dict[str, Any]:
-        """Get user's scan statistics"""
-        db = get_database()
-        
+        """Get user's scan statistics, archived scans included"""
         pipeline = [
             {"$match": {"user_id": clerk_user_id}},
             {"$group": {
                 "_id": None,
                 "total_scans": {"$sum": 1},
-                "avg_confidence": {"$avg": "$confidence_score"},
+                "confidence_sum": {"$sum": "$confidence_score"},
                 "crossbreed_count": {
                     "$sum": {"$cond": ["$is_crossbreed", 1, 0]}
                 }
             }}
         ]
         
-        result = await db.scan_history.aggregate(pipeline).to_list(1)
-        return result[0] if result else {
-            "total_scans": 0,
-            "avg_confidence": 0,
-            "crossbreed_count": 0
+        result = await scan_collection().aggregate(scan_pipeline(pipeline)).to_list(1)
+        hot = result[0] if result else {"total_scans": 0, "confidence_sum": 0.0, "crossbreed_count": 0}
+        cold = await ScanArchiveService.get_statistics(clerk_user_id)
+        
+        total_scans = hot["total_scans"] + cold["total_scans"]
+        if total_scans == 0:
+            return {
+                "total_scans": 0,
+                "avg_confidence": 0,
+                "crossbreed_count": 0
+            }
+        return {
+            "_id": None,
+            "total_scans": total_scans,
+            "avg_confidence": (hot["confidence_sum"] + cold["confidence_sum"]) / total_scans,
+            "crossbreed_count": hot["crossbreed_count"] + cold["crossbreed_count"]
         }
     
     @staticmethod
     async def get_breed_frequency(clerk_user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get most frequently scanned breeds"""
-        db = get_database()
-        
+        """Get most frequently scanned breeds, archived scans included"""
         pipeline = [
             {"$match": {"user_id": clerk_user_id}},
             {"$group": {
                 "_id": "$predicted_breed",
                 "count": {"$sum": 1},
-                "avg_confidence": {"$avg": "$confidence_score"}
-            }},
-            {"$sort": {"count": -1}},
-            {"$limit": limit},
-            {"$project": {
-                "breed": "$_id",
-                "count": 1,
-                "avg_confidence": 1,
-                "_id": 0
+                "confidence_sum": {"$sum": "$confidence_score"}
             }}
         ]
         
-        return await db.scan_history.aggregate(pipeline).to_list(limit)
+        breeds = await ScanArchiveService.get_breed_counts(clerk_user_id)
+        async for row in scan_collection().aggregate(scan_pipeline(pipeline)):
+            counters = breeds.setdefault(row["_id"], {"count": 0, "confidence_sum": 0.0})
+            counters["count"] += row["count"]
+            counters["confidence_sum"] += row["confidence_sum"]
+        
+        ranked = sorted(breeds.items(), key=lambda item: item[1]["count"], reverse=True)[:limit]
+        return [
+            {
+                "breed": breed,
+                "count": counters["count"],
+                "avg_confidence": counters["confidence_sum"] / counters["count"]
+            }
+            for breed, counters in ranked
+        ]
     
     @staticmethod
-    async def get_scans_by_breed(clerk_user_id: str, breed_name: str) -> List[Dict[str, Any]]:
+    async def get_scans_by_breed(
+        clerk_user_id: str,
+        breed_name: str,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """Get all scans for a specific breed"""
-        db = get_database()
-        
-        cursor = db.scan_history.find({
-            "user_id": clerk_user_id,
-            "predicted_breed": breed_name
-        }).sort("timestamp", -1)
-        
-        scans = []
-        async for scan in cursor:
-            scan["_id"] = str(scan["_id"])
-            scans.append(scan)
-        return scans
+        return await _fetch_scans(
+            {"user_id": clerk_user_id, "predicted_breed": breed_name},
+            sort={"timestamp": -1},
+            projection=_scan_projection(view, fields)
+        )
     
     @staticmethod
     async def get_user_scans_with_dates(
@@ -186,11 +892,11 @@ class ScanHistoryService:
         limit: int = 50, 
         skip: int = 0,
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
+        end_date: Optional[datetime] = None,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get user's scan history with optional date filtering"""
-        db = get_database()
-        
         # Build query with optional date filtering
         query = {"user_id": clerk_user_id}
         if start_date or end_date:
@@ -200,13 +906,13 @@ class ScanHistoryService:
             if end_date:
                 query["timestamp"]["$lte"] = end_date
         
-        cursor = db.scan_history.find(query).sort("timestamp", -1).skip(skip).limit(limit)
-        
-        scans = []
-        async for scan in cursor:
-            scan["_id"] = str(scan["_id"])
-            scans.append(scan)
-        return scans
+        return await _fetch_scans(
+            query,
+            sort={"timestamp": -1},
+            skip=skip,
+            limit=limit,
+            projection=_scan_projection(view, fields)
+        )
     
     @staticmethod
     async def update_scan_feedback(
@@ -215,18 +921,18 @@ class ScanHistoryService:
         confirmed_breed: Optional[str] = None
     ) -> bool:
         """Update user feedback on a scan"""
-        db = get_database()
         from bson import ObjectId
         
         update_data = {"user_feedback": feedback}
         if confirmed_breed:
             update_data["user_confirmed_breed"] = confirmed_breed
         
-        result = await db.scan_history.update_one(
-            {"_id": ObjectId(scan_id)},
-            {"$set": update_data}
-        )
-        return result.modified_count > 0
+        owner = await update_scan(ObjectId(scan_id), update_data)
+        if owner is None:
+            return False
+        await _bump_data_version(owner)
+        event_hub.publish(owner, "scan.feedback_updated", dict(update_data, scan_id=scan_id))
+        return True
 
 
 # ==================== Search History Operations ====================
@@ -240,29 +946,133 @@ class SearchHistoryService:
         search_dict = search_data.model_dump()
         result = await db.search_history.insert_one(search_dict)
         search_dict["_id"] = str(result.inserted_id)
+        
+        try:
+            await LeaderboardService.record_search(
+                search_data.breed_searched,
+                search_data.user_id,
+                search_data.search_timestamp
+            )
+        except Exception as e:
+            # The leaderboard is derived data; never fail the search because of it
+            print(f"⚠️ Failed to update breed leaderboard: {str(e)}")
+        
+        try:
+            await SearchHistoryService.push_recent_search(
+                search_data.user_id, search_data.breed_searched
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to update recent searches: {str(e)}")
+        
+        await _bump_data_version(search_data.user_id)
+        event_hub.publish(search_data.user_id, "search.created", {
+            "_id": search_dict["_id"],
+            "breed_searched": search_data.breed_searched,
+        })
         return search_dict
     
+    @staticmethod
+    async def push_recent_search(clerk_user_id: str, breed_name: str) -> None:
+        """
+        Move a breed to the front of the user's bounded, deduplicated recent list
+        Expects the search to be in search_history already: a user without a
+        buffer yet (not migrated) gets one seeded from it on the first push
+        """
+        from pymongo import UpdateOne
+        db = get_database()
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne({"_id": clerk_user_id}, {"$pull": {"breeds": breed_name}}),
+            UpdateOne(
+                {"_id": clerk_user_id},
+                {
+                    "$push": {"breeds": {
+                        "$each": [breed_name],
+                        "$position": 0,
+                        "$slice": RECENT_SEARCHES_SIZE
+                    }},
+                    "$set": {"updated_at": now}
+                }
+            )
+        ]
+        result = await db.recent_searches.bulk_write(operations, ordered=True)
+        if result.matched_count:
+            return
+        
+        history = await SearchHistoryService._aggregate_recent_searches(clerk_user_id, RECENT_SEARCHES_SIZE)
+        breeds = [breed_name] + [breed for breed in history if breed != breed_name]
+        seeded = await db.recent_searches.update_one(
+            {"_id": clerk_user_id},
+            {"$setOnInsert": {"breeds": breeds[:RECENT_SEARCHES_SIZE], "updated_at": now}},
+            upsert=True
+        )
+        if seeded.upserted_id is None:
+            # A concurrent request seeded the buffer first; apply this push on top
+            await db.recent_searches.bulk_write(operations, ordered=True)
+    
     @staticmethod
     async def get_user_searches(
         clerk_user_id: str,
         limit: int = 20,
-        skip: int = 0
+        skip: int = 0,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get user's search history with pagination"""
         db = get_database()
-        cursor = db.search_history.find(
-            {"user_id": clerk_user_id}
-        ).sort("search_timestamp", -1).skip(skip).limit(limit)
-        
-        searches = []
-        async for search in cursor:
-            search["_id"] = str(search["_id"])
-            searches.append(search)
-        return searches
+        return await fetch_documents(
+            db.search_history,
+            {"user_id": clerk_user_id},
+            sort={"search_timestamp": -1},
+            skip=skip,
+            limit=limit,
+            projection=resolve_projection("search_history", view, fields)
+        )
     
     @staticmethod
     async def get_recent_searches(clerk_user_id: str, limit: int = 10) -> List[str]:
-        """Get recent unique breed searches"""
+        """Get recent unique breed searches from the user's ring buffer"""
+        db = get_database()
+        recent = await db.recent_searches.find_one(
+            {"_id": clerk_user_id},
+            {"breeds": {"$slice": limit}}
+        )
+        if recent is not None:
+            return recent.get("breeds", [])
+        
+        breeds = await SearchHistoryService._ensure_recent_searches([clerk_user_id])
+        return breeds.get(clerk_user_id, [])[:limit]
+    
+    @staticmethod
+    async def _ensure_recent_searches(clerk_user_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Derive the buffer from history for users that don't have one yet (not
+        migrated), so the first push doesn't replace their earlier searches.
+        Returns the seeded buffers
+        """
+        db = get_database()
+        existing = {
+            document["_id"]
+            async for document in db.recent_searches.find({"_id": {"$in": clerk_user_ids}}, {"_id": 1})
+        }
+        seeded = {}
+        for clerk_user_id in clerk_user_ids:
+            if clerk_user_id in existing:
+                continue
+            breeds = await SearchHistoryService._aggregate_recent_searches(clerk_user_id, RECENT_SEARCHES_SIZE)
+            if breeds:
+                # $setOnInsert: a concurrent push that got there first wins
+                await db.recent_searches.update_one(
+                    {"_id": clerk_user_id},
+                    {"$setOnInsert": {"breeds": breeds, "updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            seeded[clerk_user_id] = breeds
+        return seeded
+    
+    @staticmethod
+    async def _aggregate_recent_searches(clerk_user_id: str, limit: int) -> List[str]:
+        """Derive recent unique breeds from the full search history"""
         db = get_database()
         
         pipeline = [
@@ -281,27 +1091,36 @@ class SearchHistoryService:
         return [r["breed"] for r in results]
     
     @staticmethod
-    async def get_popular_breeds(limit: int = 10) -> List[Dict[str, Any]]:
-        """Get most searched breeds globally"""
+    async def seed_recent_searches() -> None:
+        """Build every user's recent-breeds buffer from existing search history"""
         db = get_database()
         
         pipeline = [
             {"$group": {
-                "_id": "$breed_searched",
-                "search_count": {"$sum": 1},
-                "unique_users": {"$addToSet": "$user_id"}
+                "_id": {"user_id": "$user_id", "breed": "$breed_searched"},
+                "latest_search": {"$max": "$search_timestamp"}
+            }},
+            {"$sort": {"_id.user_id": 1, "latest_search": -1}},
+            {"$group": {
+                "_id": "$_id.user_id",
+                "breeds": {"$push": "$_id.breed"}
             }},
             {"$project": {
-                "breed": "$_id",
-                "search_count": 1,
-                "user_count": {"$size": "$unique_users"},
-                "_id": 0
+                "breeds": {"$slice": ["$breeds", RECENT_SEARCHES_SIZE]},
+                "updated_at": "$$NOW"
             }},
-            {"$sort": {"search_count": -1}},
-            {"$limit": limit}
+            {"$merge": {"into": "recent_searches", "whenMatched": "replace", "whenNotMatched": "insert"}}
         ]
         
-        return await db.search_history.aggregate(pipeline).to_list(limit)
+        await db.search_history.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    
+    @staticmethod
+    async def get_popular_breeds(limit: int = 10, window: str = "all") -> List[Dict[str, Any]]:
+        """
+        Get most searched breeds globally
+        Served from the precomputed leaderboard; window is all, 24h or 7d
+        """
+        return await LeaderboardService.get_top_breeds(limit, window)
     
     @staticmethod
     async def update_search_interaction(
@@ -315,6 +1134,26 @@ class SearchHistoryService:
         db = get_database()
         from bson import ObjectId
         
+        update_data = SearchHistoryService.interaction_update(
+            time_spent, sections_viewed, is_bookmarked, rating
+        )
+        if not update_data:
+            return False
+        
+        result = await db.search_history.update_one(
+            {"_id": ObjectId(search_id)},
+            {"$set": update_data}
+        )
+        return result.modified_count > 0
+    
+    @staticmethod
+    def interaction_update(
+        time_spent: Optional[int] = None,
+        sections_viewed: Optional[List[str]] = None,
+        is_bookmarked: Optional[bool] = None,
+        rating: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Map interaction arguments to search_history fields, skipping unset ones"""
         update_data = {}
         if time_spent is not None:
             update_data["time_spent_viewing"] = time_spent
@@ -324,15 +1163,86 @@ class SearchHistoryService:
             update_data["is_bookmarked"] = is_bookmarked
         if rating is not None:
             update_data["user_rating"] = rating
+        return update_data
+    
+    @staticmethod
+    async def write_event_batch(
+        searches: List[Dict[str, Any]],
+        interactions: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Persist a batch of buffered search and interaction events
+        Searches carry server-generated _ids, so inserting them again after a
+        partial failure only hits duplicate keys. Interactions are
+        {"_id", "user_id", "fields"} and run after the inserts, so they can
+        target searches from the same batch. Leaderboard and recent-search
+        updates are grouped into one bulk_write each
+        """
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+        db = get_database()
         
-        if not update_data:
-            return False
+        if searches:
+            try:
+                await db.search_history.insert_many(searches, ordered=False)
+            except BulkWriteError as e:
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        if interactions:
+            await db.search_history.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": interaction["_id"], "user_id": interaction["user_id"]},
+                        {"$set": interaction["fields"]}
+                    )
+                    for interaction in interactions
+                ],
+                ordered=False
+            )
         
-        result = await db.search_history.update_one(
-            {"_id": ObjectId(search_id)},
-            {"$set": update_data}
-        )
-        return result.modified_count > 0
+        breeds_by_user: Dict[str, List[str]] = {}
+        leaderboard = []
+        for search in searches:
+            breeds_by_user.setdefault(search["user_id"], []).append(search["breed_searched"])
+            leaderboard.extend(leaderboard_updates(
+                search["breed_searched"], search["user_id"], search["search_timestamp"]
+            ))
+        try:
+            if leaderboard:
+                await db.breed_leaderboard.bulk_write(leaderboard, ordered=False)
+        except Exception as e:
+            print(f"⚠️ Failed to update breed leaderboard: {str(e)}")
+        
+        recent = []
+        now = datetime.utcnow()
+        for user_id, breeds in breeds_by_user.items():
+            # Newest first, each breed once
+            latest = list(dict.fromkeys(reversed(breeds)))[:RECENT_SEARCHES_SIZE]
+            recent.append(UpdateOne({"_id": user_id}, {"$pull": {"breeds": {"$in": latest}}}))
+            recent.append(UpdateOne(
+                {"_id": user_id},
+                {
+                    "$push": {"breeds": {"$each": latest, "$position": 0, "$slice": RECENT_SEARCHES_SIZE}},
+                    "$set": {"updated_at": now}
+                }
+            ))
+        try:
+            if recent:
+                result = await db.recent_searches.bulk_write(recent, ordered=True)
+                if result.matched_count < len(recent):
+                    # Some users have no buffer yet; seed theirs from history,
+                    # which already holds this batch's searches
+                    await SearchHistoryService._ensure_recent_searches(list(breeds_by_user))
+        except Exception as e:
+            print(f"⚠️ Failed to update recent searches: {str(e)}")
+        
+        for user_id in set(breeds_by_user) | {interaction["user_id"] for interaction in interactions}:
+            await _bump_data_version(user_id)
+        for search in searches:
+            event_hub.publish(search["user_id"], "search.created", {
+                "_id": str(search["_id"]),
+                "breed_searched": search["breed_searched"],
+            })
 
 
 # ==================== User Preferences Operations ====================
@@ -346,16 +1256,20 @@ class UserPreferencesService:
         prefs_dict = preferences_data.model_dump()
         result = await db.user_preferences.insert_one(prefs_dict)
         prefs_dict["_id"] = str(result.inserted_id)
+        await cache.invalidate(_preferences_cache_key(preferences_data.user_id))
         return prefs_dict
     
     @staticmethod
     async def get_preferences(clerk_user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user preferences"""
-        db = get_database()
-        prefs = await db.user_preferences.find_one({"user_id": clerk_user_id})
-        if prefs:
-            prefs["_id"] = str(prefs["_id"])
-        return prefs
+        """Get user preferences (served from the read-through cache)"""
+        async def load():
+            db = get_database()
+            prefs = await db.user_preferences.find_one({"user_id": clerk_user_id})
+            if prefs:
+                prefs["_id"] = str(prefs["_id"])
+            return prefs
+        
+        return await cache.get_or_load(_preferences_cache_key(clerk_user_id), load)
     
     @staticmethod
     async def update_preferences(
@@ -370,6 +1284,7 @@ class UserPreferencesService:
             {"$set": update_data},
             upsert=True
         )
+        await cache.invalidate(_preferences_cache_key(clerk_user_id))
         return result.modified_count > 0 or result.upserted_id is not None
 
 
@@ -389,26 +1304,99 @@ class PetService:
         return pet_dict
     
     @staticmethod
-    async def get_user_pets(clerk_user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_pets(
+        clerk_user_id: str,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """Get all pets for a user"""
         db = get_database()
-        cursor = db.pets.find(
-            {"user_id": clerk_user_id, "is_active": True}
-        ).sort("created_at", -1)
+        return await fetch_documents(
+            db.pets,
+            {"user_id": clerk_user_id, "is_active": True},
+            sort={"created_at": -1},
+            projection=resolve_projection("pets", view, fields)
+        )
+    
+    @staticmethod
+    async def get_pets_overview(clerk_user_id: str, upcoming_limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Active pets with their vaccination summary in one aggregation
+        Each pet gets its next due vaccinations, overdue count and last
+        administered date from a $lookup that runs on the
+        (user_id, pet_id, due_date) vaccinations index
+        """
+        db = get_database()
+        now = datetime.utcnow()
+        is_open = {"$ne": ["$status", VaccinationStatus.COMPLETED.value]}
+        
+        pipeline = [
+            {"$match": {"user_id": clerk_user_id, "is_active": True}},
+            {"$sort": {"created_at": -1}},
+            {"$project": resolve_projection("pets", "list")},
+            {"$lookup": {
+                "from": "vaccinations",
+                "let": {"pet_id": {"$toString": "$_id"}},
+                "pipeline": [
+                    {"$match": {"user_id": clerk_user_id, "$expr": {"$eq": ["$pet_id", "$$pet_id"]}}},
+                    {"$sort": {"due_date": 1}},
+                    {"$group": {
+                        "_id": None,
+                        "total_vaccinations": {"$sum": 1},
+                        "overdue_count": {"$sum": {"$cond": [
+                            {"$and": [is_open, {"$lt": ["$due_date", now]}]}, 1, 0
+                        ]}},
+                        "last_administered_date": {"$max": "$administered_date"},
+                        "open": {"$push": {"$cond": [
+                            {"$and": [is_open, {"$gte": ["$due_date", now]}]},
+                            {
+                                "_id": {"$toString": "$_id"},
+                                "vaccine_name": "$vaccine_name",
+                                "due_date": "$due_date",
+                                "status": "$status",
+                            },
+                            None
+                        ]}},
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "total_vaccinations": 1,
+                        "overdue_count": 1,
+                        "last_administered_date": 1,
+                        "next_due_vaccinations": {"$slice": [
+                            {"$filter": {"input": "$open", "cond": {"$ne": ["$$this", None]}}},
+                            upcoming_limit
+                        ]},
+                    }},
+                ],
+                "as": "vaccination_summary",
+            }},
+            {"$set": {
+                "_id": {"$toString": "$_id"},
+                "vaccination_summary": {"$ifNull": [
+                    {"$arrayElemAt": ["$vaccination_summary", 0]},
+                    {
+                        "total_vaccinations": 0,
+                        "overdue_count": 0,
+                        "last_administered_date": None,
+                        "next_due_vaccinations": [],
+                    }
+                ]},
+            }},
+        ]
         
-        pets = []
-        async for pet in cursor:
-            pet["_id"] = str(pet["_id"])
-            pets.append(pet)
-        return pets
+        return await db.pets.aggregate(pipeline, batchSize=READ_BATCH_SIZE).to_list(None)
     
     @staticmethod
-    async def get_pet_by_id(pet_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific pet by ID"""
+    async def get_pet_by_id(pet_id: str, clerk_user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get specific pet by ID, optionally only if it belongs to the user"""
         db = get_database()
         from bson import ObjectId
         try:
-            pet = await db.pets.find_one({"_id": ObjectId(pet_id)})
+            query = {"_id": ObjectId(pet_id)}
+            if clerk_user_id is not None:
+                query["user_id"] = clerk_user_id
+            pet = await db.pets.find_one(query)
             if pet:
                 pet["_id"] = str(pet["_id"])
             return pet
@@ -447,6 +1435,10 @@ class PetService:
 
 
 # ==================== Vaccination Operations ====================
+# Statuses that turn into overdue once the due date has passed
+OPEN_VACCINATION_STATUSES = (VaccinationStatus.UPCOMING.value, VaccinationStatus.SCHEDULED.value)
+
+
 class VaccinationService:
     """Vaccination record database operations"""
     
@@ -455,6 +1447,12 @@ class VaccinationService:
         """Create new vaccination record"""
         from .models import VaccinationRecord
         vaccination = VaccinationRecord(**vaccination_data)
+        if vaccination.reminder_date is None:
+            vaccination.reminder_date = default_reminder_date(vaccination.due_date)
+        due_date = vaccination.due_date
+        now = datetime.now(due_date.tzinfo) if due_date.tzinfo else datetime.utcnow()
+        if vaccination.status in OPEN_VACCINATION_STATUSES and due_date < now:
+            vaccination.status = VaccinationStatus.OVERDUE
         db = get_database()
         vaccination_dict = vaccination.model_dump()
         result = await db.vaccinations.insert_one(vaccination_dict)
@@ -464,7 +1462,9 @@ class VaccinationService:
     @staticmethod
     async def get_pet_vaccinations(
         user_id: str, 
-        pet_id: str = None
+        pet_id: str = None,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get vaccinations for user's pets"""
         db = get_database()
@@ -472,18 +1472,19 @@ class VaccinationService:
         if pet_id:
             query["pet_id"] = pet_id
             
-        cursor = db.vaccinations.find(query).sort("due_date", 1)
-        
-        vaccinations = []
-        async for vaccination in cursor:
-            vaccination["_id"] = str(vaccination["_id"])
-            vaccinations.append(vaccination)
-        return vaccinations
+        return await fetch_documents(
+            db.vaccinations,
+            query,
+            sort={"due_date": 1},
+            projection=resolve_projection("vaccinations", view, fields)
+        )
     
     @staticmethod
     async def get_upcoming_vaccinations(
         user_id: str, 
-        days_ahead: int = 30
+        days_ahead: int = 30,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get upcoming vaccinations within specified days"""
         from datetime import timedelta
@@ -491,34 +1492,36 @@ class VaccinationService:
         
         end_date = datetime.utcnow() + timedelta(days=days_ahead)
         
-        cursor = db.vaccinations.find({
-            "user_id": user_id,
-            "status": {"$in": ["upcoming", "scheduled"]},
-            "due_date": {"$lte": end_date}
-        }).sort("due_date", 1)
-        
-        vaccinations = []
-        async for vaccination in cursor:
-            vaccination["_id"] = str(vaccination["_id"])
-            vaccinations.append(vaccination)
-        return vaccinations
+        return await fetch_documents(
+            db.vaccinations,
+            {
+                "user_id": user_id,
+                "status": {"$in": ["upcoming", "scheduled"]},
+                "due_date": {"$lte": end_date}
+            },
+            sort={"due_date": 1},
+            projection=resolve_projection("vaccinations", view, fields)
+        )
     
     @staticmethod
-    async def get_overdue_vaccinations(user_id: str) -> List[Dict[str, Any]]:
+    async def get_overdue_vaccinations(
+        user_id: str,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """Get overdue vaccinations"""
         db = get_database()
         
-        cursor = db.vaccinations.find({
-            "user_id": user_id,
-            "status": {"$ne": "completed"},
-            "due_date": {"$lt": datetime.utcnow()}
-        }).sort("due_date", 1)
-        
-        vaccinations = []
-        async for vaccination in cursor:
-            vaccination["_id"] = str(vaccination["_id"])
-            vaccinations.append(vaccination)
-        return vaccinations
+        return await fetch_documents(
+            db.vaccinations,
+            {
+                "user_id": user_id,
+                "status": {"$ne": "completed"},
+                "due_date": {"$lt": datetime.utcnow()}
+            },
+            sort={"due_date": 1},
+            projection=resolve_projection("vaccinations", view, fields)
+        )
     
     @staticmethod
     async def update_vaccination_status(
@@ -540,11 +1543,21 @@ class VaccinationService:
             update_data["administered_date"] = administered_date
         if notes:
             update_data["notes"] = notes
+        
+        # Values go through $literal so user text can't be read as an expression
+        stage = {field: {"$literal": value} for field, value in update_data.items()}
+        if status in OPEN_VACCINATION_STATUSES:
+            # Reopening a past-due record makes it overdue straight away
+            stage["status"] = {"$cond": [
+                {"$lt": ["$due_date", update_data["updated_at"]]},
+                VaccinationStatus.OVERDUE.value,
+                {"$literal": status}
+            ]}
             
         try:
             result = await db.vaccinations.update_one(
                 {"_id": ObjectId(vaccination_id)},
-                {"$set": update_data}
+                [{"$set": stage}]
             )
             return result.modified_count > 0
         except:
@@ -552,14 +1565,25 @@ class VaccinationService:
     
     @staticmethod
     async def get_vaccination_statistics(user_id: str) -> Dict[str, Any]:
-        """Get vaccination statistics for user"""
+        """
+        Get vaccination statistics for user
+        One $group over the effective status: open records past their due
+        date count as overdue even before the sweep flips them, and every
+        record lands in exactly one bucket
+        """
         db = get_database()
         
-        # Aggregate vaccination data
         pipeline = [
             {"$match": {"user_id": user_id}},
             {"$group": {
-                "_id": "$status",
+                "_id": {"$cond": [
+                    {"$and": [
+                        {"$ne": ["$status", VaccinationStatus.COMPLETED.value]},
+                        {"$lt": ["$due_date", datetime.utcnow()]}
+                    ]},
+                    VaccinationStatus.OVERDUE.value,
+                    "$status"
+                ]},
                 "count": {"$sum": 1}
             }}
         ]
@@ -569,23 +1593,24 @@ class VaccinationService:
         async for result in db.vaccinations.aggregate(pipeline):
             stats[result["_id"]] = result["count"]
         
-        # Calculate overdue count
-        overdue_count = await db.vaccinations.count_documents({
-            "user_id": user_id,
-            "status": {"$ne": "completed"},
-            "due_date": {"$lt": datetime.utcnow()}
-        })
-        
-        stats["overdue"] = overdue_count
         stats["total"] = sum(stats.values())
         
         return stats
 
 
 # ==================== Feedback Operations ====================
+FEEDBACK_STATS_ID = "feedback"
+FEEDBACK_STATS_RECONCILE_SECONDS = float(os.getenv("FEEDBACK_STATS_RECONCILE_SECONDS", "3600"))
+FEEDBACK_STATS_REBUILD_ATTEMPTS = 3
+
+
 class FeedbackService:
     """User feedback database operations"""
     
+    # Set when an increment could not be applied, so the next read rebuilds
+    _stats_stale: bool = False
+    _stats_rebuild_lock = asyncio.Lock()
+    
     @staticmethod
     async def create_feedback(feedback_data: dict) -> Dict[str, Any]:
         """Create new feedback record"""
@@ -595,25 +1620,38 @@ class FeedbackService:
         feedback_dict = feedback.model_dump()
         result = await db.feedback.insert_one(feedback_dict)
         feedback_dict["_id"] = str(result.inserted_id)
+        status = getattr(feedback.status, "value", feedback.status)
+        increments = {"total": 1, f"status_counts.{status}": 1}
+        if feedback_dict.get("rating") is not None:
+            increments["rating_count"] = 1
+            increments["rating_sum"] = feedback_dict["rating"]
+        await FeedbackService._update_statistics(increments)
+        await _bump_data_version(feedback.user_id)
+        event_hub.publish(feedback.user_id, "feedback.created", {
+            "_id": feedback_dict["_id"],
+            "feedback_type": feedback_dict["feedback_type"],
+            "status": feedback_dict["status"],
+        })
         return feedback_dict
     
     @staticmethod
     async def get_user_feedback(
         user_id: str,
         limit: int = 20,
-        skip: int = 0
+        skip: int = 0,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get user's feedback history"""
         db = get_database()
-        cursor = db.feedback.find(
-            {"user_id": user_id}
-        ).sort("submitted_at", -1).skip(skip).limit(limit)
-        
-        feedback_list = []
-        async for feedback in cursor:
-            feedback["_id"] = str(feedback["_id"])
-            feedback_list.append(feedback)
-        return feedback_list
+        return await fetch_documents(
+            db.feedback,
+            {"user_id": user_id},
+            sort={"submitted_at": -1},
+            skip=skip,
+            limit=limit,
+            projection=resolve_projection("feedback", view, fields)
+        )
     
     @staticmethod
     async def update_feedback_status(
@@ -636,48 +1674,149 @@ class FeedbackService:
             update_data["resolution_notes"] = resolution_notes
             
         try:
-            result = await db.feedback.update_one(
+            feedback = await db.feedback.find_one_and_update(
                 {"_id": ObjectId(feedback_id)},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"user_id": 1, "status": 1}
             )
-            return result.modified_count > 0
         except:
             return False
+        if feedback is None:
+            return False
+        # The pre-image tells which status bucket the record leaves
+        previous = getattr(feedback.get("status"), "value", feedback.get("status"))
+        status = getattr(status, "value", status)
+        if previous != status:
+            await FeedbackService._update_statistics({
+                f"status_counts.{previous}": -1,
+                f"status_counts.{status}": 1,
+            })
+        await _bump_data_version(feedback.get("user_id"))
+        event_hub.publish(feedback.get("user_id"), "feedback.status_changed", {
+            "feedback_id": feedback_id,
+            "status": status,
+        })
+        return True
     
     @staticmethod
-    async def get_feedback_statistics() -> Dict[str, Any]:
-        """Get overall feedback statistics"""
+    async def _update_statistics(increments: Dict[str, int]) -> None:
+        """
+        Apply deltas to the feedback stats document; never fails the write itself
+        No upsert: while the document is missing, get_feedback_statistics
+        rebuilds it from the collection, which already includes this write.
+        Every delta bumps seq so a concurrent rebuild can tell it was overtaken
+        """
         db = get_database()
+        try:
+            await db.feedback_stats.update_one(
+                {"_id": FEEDBACK_STATS_ID},
+                {"$inc": dict(increments, seq=1), "$set": {"updated_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            FeedbackService._stats_stale = True
+            print(f"⚠️ Failed to update feedback statistics: {str(e)}")
+    
+    @staticmethod
+    async def discount_statistics(feedback_records: List[Dict[str, Any]]) -> None:
+        """Subtract deleted feedback records (status and rating) from the stats document"""
+        increments: Dict[str, int] = {}
+        for record in feedback_records:
+            status = f"status_counts.{getattr(record.get('status'), 'value', record.get('status'))}"
+            increments[status] = increments.get(status, 0) - 1
+            if record.get("rating") is not None:
+                increments["rating_count"] = increments.get("rating_count", 0) - 1
+                increments["rating_sum"] = increments.get("rating_sum", 0) - record["rating"]
+        if increments:
+            increments["total"] = -len(feedback_records)
+            await FeedbackService._update_statistics(increments)
+    
+    @staticmethod
+    async def rebuild_feedback_statistics() -> Dict[str, Any]:
+        """
+        Recompute the stats document from the feedback collection in one $facet
+        The result only replaces the document if no delta landed while it was
+        being computed (same seq); otherwise the rebuild is retried
+        """
+        from pymongo.errors import DuplicateKeyError
         
-        # Aggregate feedback by status
+        db = get_database()
+        for _ in range(FEEDBACK_STATS_REBUILD_ATTEMPTS):
+            current = await db.feedback_stats.find_one({"_id": FEEDBACK_STATS_ID}, {"seq": 1})
+            doc = await FeedbackService._compute_feedback_statistics()
+            try:
+                if current is None:
+                    await db.feedback_stats.insert_one(dict(doc, _id=FEEDBACK_STATS_ID, seq=0))
+                    stored = True
+                else:
+                    doc["seq"] = current.get("seq", 0)
+                    result = await db.feedback_stats.replace_one(
+                        {"_id": FEEDBACK_STATS_ID, "seq": current.get("seq")}, doc
+                    )
+                    stored = result.matched_count == 1
+            except DuplicateKeyError:
+                stored = False
+            if stored:
+                FeedbackService._stats_stale = False
+                return doc
+        # Still contended; serve the fresh numbers and let a later read store them
+        return doc
+    
+    @staticmethod
+    async def _compute_feedback_statistics() -> Dict[str, Any]:
+        db = get_database()
         pipeline = [
-            {"$group": {
-                "_id": "$status",
-                "count": {"$sum": 1}
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "ratings": [
+                    {"$match": {"rating": {"$ne": None}}},
+                    {"$group": {"_id": None, "count": {"$sum": 1}, "sum": {"$sum": "$rating"}}},
+                ],
             }}
         ]
+        result = (await db.feedback.aggregate(pipeline).to_list(1))[0]
+        status_counts = {row["_id"]: row["count"] for row in result["by_status"]}
+        ratings = result["ratings"][0] if result["ratings"] else {"count": 0, "sum": 0}
+        now = datetime.utcnow()
+        return {
+            "status_counts": status_counts,
+            "total": sum(status_counts.values()),
+            "rating_count": ratings["count"],
+            "rating_sum": ratings["sum"],
+            "updated_at": now,
+            "rebuilt_at": now,
+        }
+    
+    @staticmethod
+    def _needs_rebuild(doc: Optional[Dict[str, Any]]) -> bool:
+        if doc is None or FeedbackService._stats_stale:
+            return True
+        rebuilt_at = doc.get("rebuilt_at")
+        return rebuilt_at is None or \
+            (datetime.utcnow() - rebuilt_at).total_seconds() > FEEDBACK_STATS_RECONCILE_SECONDS
+    
+    @staticmethod
+    async def get_feedback_statistics() -> Dict[str, Any]:
+        """
+        Get overall feedback statistics
+        Served from the incrementally maintained stats document; it is
+        rebuilt from the collection when missing, after a failed delta, and
+        every FEEDBACK_STATS_RECONCILE_SECONDS to correct any drift
+        """
+        db = get_database()
+        doc = await db.feedback_stats.find_one({"_id": FEEDBACK_STATS_ID})
+        if FeedbackService._needs_rebuild(doc):
+            async with FeedbackService._stats_rebuild_lock:
+                # Another request may have rebuilt it while this one waited
+                doc = await db.feedback_stats.find_one({"_id": FEEDBACK_STATS_ID})
+                if FeedbackService._needs_rebuild(doc):
+                    doc = await FeedbackService.rebuild_feedback_statistics()
         
         stats = {"pending": 0, "reviewed": 0, "in_progress": 0, "resolved": 0, "closed": 0}
-        
-        async for result in db.feedback.aggregate(pipeline):
-            stats[result["_id"]] = result["count"]
-        
-        # Get average rating
-        rating_pipeline = [
-            {"$match": {"rating": {"$exists": True}}},
-            {"$group": {
-                "_id": None,
-                "average_rating": {"$avg": "$rating"},
-                "total_ratings": {"$sum": 1}
-            }}
-        ]
-        
-        rating_stats = {"average_rating": 0, "total_ratings": 0}
-        async for result in db.feedback.aggregate(rating_pipeline):
-            rating_stats = result
-        
-        stats.update(rating_stats)
-        stats["total"] = sum([v for k, v in stats.items() if k not in ["average_rating", "total_ratings"]])
+        stats.update(doc.get("status_counts", {}))
+        rating_count = doc.get("rating_count", 0)
+        stats["average_rating"] = doc.get("rating_sum", 0) / rating_count if rating_count else 0
+        stats["total_ratings"] = rating_count
+        stats["total"] = doc.get("total", 0)
         
         return stats
 
@@ -695,12 +1834,15 @@ class CommunityFeedbackService:
         feedback_dict = feedback.model_dump()
         result = await db.community_feedback.insert_one(feedback_dict)
         feedback_dict["_id"] = str(result.inserted_id)
+        await _bump_data_version(feedback.user_id)
         return feedback_dict
     
     @staticmethod
     async def get_approved_testimonials(
         limit: int = 10,
-        featured_only: bool = False
+        featured_only: bool = False,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get approved testimonials for public display"""
         db = get_database()
@@ -709,43 +1851,46 @@ class CommunityFeedbackService:
         if featured_only:
             query["is_featured"] = True
             
-        cursor = db.community_feedback.find(query).sort("approved_at", -1).limit(limit)
-        
-        testimonials = []
-        async for testimonial in cursor:
-            testimonial["_id"] = str(testimonial["_id"])
-            testimonials.append(testimonial)
-        return testimonials
+        return await fetch_documents(
+            db.community_feedback,
+            query,
+            sort={"approved_at": -1},
+            limit=limit,
+            projection=resolve_projection("community_feedback", view, fields)
+        )
     
     @staticmethod
-    async def get_user_community_feedback(user_id: str) -> List[Dict[str, Any]]:
+    async def get_user_community_feedback(
+        user_id: str,
+        view: str = "detail",
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """Get user's community feedback submissions"""
         db = get_database()
-        cursor = db.community_feedback.find(
-            {"user_id": user_id}
-        ).sort("submitted_at", -1)
-        
-        feedback_list = []
-        async for feedback in cursor:
-            feedback["_id"] = str(feedback["_id"])
-            feedback_list.append(feedback)
-        return feedback_list
+        return await fetch_documents(
+            db.community_feedback,
+            {"user_id": user_id},
+            sort={"submitted_at": -1},
+            projection=resolve_projection("community_feedback", view, fields)
+        )
     
     @staticmethod
     async def vote_on_feedback(feedback_id: str, is_helpful: bool) -> bool:
-        """Vote on community feedback"""
-        db = get_database()
+        """
+        Vote on community feedback
+        Votes are coalesced in memory and flushed with bulk_write (see
+        database/votes.py); returns False for malformed or unknown ids, so
+        only testimonials that exist ever reach the buffer
+        """
         from bson import ObjectId
+        from bson.errors import InvalidId
         
         try:
-            update_operation = {"$inc": {"total_votes": 1}}
-            if is_helpful:
-                update_operation["$inc"]["helpful_votes"] = 1
-                
-            result = await db.community_feedback.update_one(
-                {"_id": ObjectId(feedback_id)},
-                update_operation
-            )
-            return result.modified_count > 0
-        except:
+            object_id = ObjectId(feedback_id)
+        except (InvalidId, TypeError):
+            return False
+        db = get_database()
+        if await db.community_feedback.find_one({"_id": object_id}, {"_id": 1}) is None:
             return False
+        vote_buffer.add(object_id, is_helpful)
+        return True
\ No newline at end of file
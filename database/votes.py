@@ -0,0 +1,94 @@
+"""
+Coalesced testimonial votes
+Votes are summed per testimonial in memory and written with one bulk_write
+per flush instead of one update_one per vote. A crash loses at most one
+flush interval of votes, which is acceptable for helpfulness counters
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from .connection import get_database
+
+
+VOTE_FLUSH_INTERVAL_SECONDS = float(os.getenv("VOTE_FLUSH_INTERVAL_SECONDS", "2.0"))
+VOTE_BUFFER_MAX_KEYS = int(os.getenv("VOTE_BUFFER_MAX_KEYS", "1000"))
+
+
+class VoteBuffer:
+    """Per-testimonial [total_votes, helpful_votes] deltas awaiting a flush"""
+
+    def __init__(
+        self,
+        interval_seconds: float = VOTE_FLUSH_INTERVAL_SECONDS,
+        max_keys: int = VOTE_BUFFER_MAX_KEYS
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_keys = max_keys
+        self._pending: Dict[ObjectId, List[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def add(self, feedback_id: ObjectId, is_helpful: bool) -> None:
+        counts = self._pending.setdefault(feedback_id, [0, 0])
+        counts[0] += 1
+        if is_helpful:
+            counts[1] += 1
+        if len(self._pending) >= self.max_keys:
+            # Don't let a burst across many testimonials wait for the timer
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Write buffered votes; returns the number of testimonials updated"""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            operations = []
+            for feedback_id, (total, helpful) in pending.items():
+                increments = {"total_votes": total}
+                if helpful:
+                    increments["helpful_votes"] = helpful
+                operations.append(UpdateOne({"_id": feedback_id}, {"$inc": increments}))
+            try:
+                await get_database().community_feedback.bulk_write(operations, ordered=False)
+            except Exception:
+                # Put the votes back so the next flush retries them
+                for feedback_id, (total, helpful) in pending.items():
+                    counts = self._pending.setdefault(feedback_id, [0, 0])
+                    counts[0] += total
+                    counts[1] += helpful
+                raise
+            return len(operations)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Vote flush failed: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Cancel the timer and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ Final vote flush failed: {str(e)}")
+
+
+vote_buffer = VoteBuffer()
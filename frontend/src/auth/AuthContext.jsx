@@ -83,6 +83,8 @@ function AuthContextProvider({ children, isSignedIn: fallbackIsSignedIn, isLoade
   const [dashboardStats, setDashboardStats] = useState(null)
   const [isLoadingData, setIsLoadingData] = useState(false)
   const [currentTheme, setCurrentTheme] = useState('light')
+  const [liveUpdatesEnabled, setLiveUpdatesEnabled] = useState(false)
+  const [liveUpdate, setLiveUpdate] = useState(null)
 
   // Initialize theme on app load
   useEffect(() => {
@@ -125,6 +127,14 @@ function AuthContextProvider({ children, isSignedIn: fallbackIsSignedIn, isLoade
     }
   }, [isSignedIn, user])
 
+  // Live dashboard deltas over Server-Sent Events while signed in with the API online
+  useEffect(() => {
+    if (!liveUpdatesEnabled || !isSignedIn || !user || fallbackUser) return
+    
+    const unsubscribe = apiService.subscribeToUpdates(user.id, handleLiveUpdate)
+    return () => unsubscribe()
+  }, [liveUpdatesEnabled, isSignedIn, user?.id])
+
   // Recalculate dashboard stats whenever userHistory or savedBreeds change
   useEffect(() => {
     if (isSignedIn && user) {
@@ -164,6 +174,36 @@ function AuthContextProvider({ children, isSignedIn: fallbackIsSignedIn, isLoade
     setCurrentTheme(theme)
   }
 
+  const handleLiveUpdate = (type, data) => {
+    if (type === 'scan.created') {
+      setUserHistory(prev => {
+        if (prev.some(item => item.id === data._id)) return prev
+        // A scan saved from this tab still carries its temporary id until the save returns
+        const pending = prev.findIndex(item => typeof item.id === 'number' && item.breed === data.predicted_breed)
+        if (pending !== -1) {
+          return prev.map((item, index) => index === pending ? { ...item, id: data._id } : item)
+        }
+        return [{
+          id: data._id,
+          breed: data.predicted_breed,
+          confidence: data.confidence_score,
+          timestamp: data.timestamp,
+          isCorssbreed: data.is_crossbreed
+        }, ...prev].slice(0, 50)
+      })
+    } else if (type === 'counters.updated') {
+      setDashboardStats(prev => prev ? { ...prev, totalScans: data.total_scans } : prev)
+    } else if (type === 'favorites.updated') {
+      setSavedBreeds(prev => {
+        const others = prev.filter(item => item.breed !== data.breed)
+        if (data.action === 'removed') return others
+        return [...others, { id: `fav-${data.breed}`, breed: data.breed, timestamp: new Date().toISOString() }]
+      })
+    }
+    // Components with server-computed views (analytics) reload on any event
+    setLiveUpdate({ type, data, receivedAt: Date.now() })
+  }
+
   const syncUserData = async () => {
     try {
       setIsLoadingData(true)
@@ -179,6 +219,7 @@ function AuthContextProvider({ children, isSignedIn: fallbackIsSignedIn, isLoade
           loadDashboardStats(),
           loadUserPreferences()
         ])
+        setLiveUpdatesEnabled(true)
         console.log('✅ User data synced successfully with MongoDB')
       } else {
         // API not available, load from localStorage
@@ -321,7 +362,8 @@ function AuthContextProvider({ children, isSignedIn: fallbackIsSignedIn, isLoade
       isCorssbreed: result.is_potential_crossbreed,
       topPredictions: result.top_predictions,
       crossbreedAnalysis: result.crossbreed_analysis,
-      detectionMetadata: result.detection_metadata
+      detectionMetadata: result.detection_metadata,
+      imageHash: result.image_hash
     }
     
     // Update local state immediately for responsive UI
@@ -455,6 +497,7 @@ function AuthContextProvider({ children, isSignedIn: fallbackIsSignedIn, isLoade
     savedBreeds,
     dashboardStats,
     isLoadingData,
+    liveUpdate,
     currentTheme,
     applyTheme,
     addToHistory,
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react'
+import React, { useState, useEffect, useCallback, useRef } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { 
   TrendingUp, 
@@ -49,7 +49,7 @@ import { useAuthContext } from '../auth/AuthContext'
 import apiService from '../services/api'
 
 export default function EnhancedAnalytics() {
-  const { user } = useAuthContext()
+  const { user, liveUpdate } = useAuthContext()
   const [selectedTimeRange, setSelectedTimeRange] = useState('30d')
   const [selectedChart, setSelectedChart] = useState('accuracy')
   const [analyticsData, setAnalyticsData] = useState(null)
@@ -77,11 +77,11 @@ export default function EnhancedAnalytics() {
 
   const colors = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#06B6D4', '#EC4899', '#14B8A6']
 
-  const loadAnalyticsData = useCallback(async () => {
+  const loadAnalyticsData = useCallback(async ({ silent = false } = {}) => {
     if (!user?.id) return
     
     try {
-      setLoading(true)
+      if (!silent) setLoading(true)
       const days = timeRanges.find(range => range.value === selectedTimeRange)?.days || 30
       
       const [dashboardData, breedData, trendsData] = await Promise.all([
@@ -114,6 +114,16 @@ export default function EnhancedAnalytics() {
     loadAnalyticsData()
   }, [loadAnalyticsData])
 
+  // Reload in the background when the server pushes a change, coalescing bursts of events
+  const liveReloadTimer = useRef(null)
+  useEffect(() => {
+    if (!liveUpdate) return
+    clearTimeout(liveReloadTimer.current)
+    liveReloadTimer.current = setTimeout(() => loadAnalyticsData({ silent: true }), 2000)
+  }, [liveUpdate, loadAnalyticsData])
+
+  useEffect(() => () => clearTimeout(liveReloadTimer.current), [])
+
   const generateMockData = () => ({
     overview: {
       total_scans: 127,
@@ -185,14 +195,9 @@ export default function EnhancedAnalytics() {
     
     try {
       setExportLoading(true)
-      const exportResult = await apiService.exportAnalyticsData(user.id, format, 'all')
+      const dataBlob = await apiService.exportAnalyticsData(user.id, format, 'all')
       
       // Create download link
-      const dataStr = format === 'csv' 
-        ? Object.values(exportResult.data).join('\n\n')
-        : JSON.stringify(exportResult.data, null, 2)
-      
-      const dataBlob = new Blob([dataStr], { type: format === 'csv' ? 'text/csv' : 'application/json' })
       const url = URL.createObjectURL(dataBlob)
       
       const link = document.createElement('a')
@@ -189,7 +189,8 @@ export default function ScanPage() {
         top_predictions: data.top_predictions,
         crossbreed_analysis: data.crossbreed_analysis,
         detection_metadata: data.detection_metadata,
-        timestamp: data.timestamp
+        timestamp: data.timestamp,
+        image_hash: data.image_hash
       }
       
       setResult(newResult)
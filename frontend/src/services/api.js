@@ -197,20 +197,24 @@ class ApiService {
     }
 
     try {
-      const response = await fetch(`${this.baseUrl}/api/scan-history/user/${clerkUserId}`, {
+      const topPredictions = scanData.top_predictions || scanData.topPredictions || []
+      const response = await fetch(`${this.baseUrl}/api/scans`, {
         method: 'POST',
         headers: {
+          'X-User-ID': clerkUserId,
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          breed: scanData.breed || scanData.predicted_class,
-          confidence: scanData.confidence,
-          timestamp: scanData.timestamp || new Date().toISOString(),
-          imageUrl: scanData.imageUrl,
-          isCorssbreed: scanData.is_potential_crossbreed || scanData.isCorssbreed,
-          topPredictions: scanData.top_predictions || scanData.topPredictions,
-          crossbreedAnalysis: scanData.crossbreed_analysis,
-          detectionMetadata: scanData.detection_metadata
+          predicted_breed: scanData.breed || scanData.predicted_class,
+          confidence_score: scanData.confidence,
+          is_crossbreed: Boolean(scanData.is_potential_crossbreed || scanData.isCorssbreed),
+          top_predictions: topPredictions.map(prediction => ({
+            breed_name: prediction.breed_name || prediction.breed,
+            confidence: prediction.confidence
+          })),
+          // Hash from the /predict response: when /predict already saved this
+          // scan, the API returns the existing scan instead of storing it twice
+          image_hash: scanData.image_hash || scanData.imageHash || null
         })
       })
       
@@ -225,7 +229,7 @@ class ApiService {
       
       const result = await response.json()
       console.log('✅ Scan saved to MongoDB:', result)
-      return { success: true, savedToMongo: true, data: result }
+      return { success: true, savedToMongo: true, data: { ...result, _id: result.scan_id } }
     } catch (error) {
       if (error.message.includes('Failed to fetch')) {
         this.apiAvailable = false
@@ -473,11 +477,9 @@ class ApiService {
   }
 
   async exportAnalyticsData(clerkUserId, format = 'csv', dataType = 'all') {
-    const response = await fetch(`${this.baseUrl}/api/analytics/export?format=${format}&data_type=${dataType}`, {
-      method: 'POST',
+    const response = await fetch(`${this.baseUrl}/api/analytics/export/stream?format=${format}&data_type=${dataType}`, {
       headers: {
-        'X-User-ID': clerkUserId,
-        'Content-Type': 'application/json'
+        'X-User-ID': clerkUserId
       }
     })
     
@@ -485,7 +487,32 @@ class ApiService {
       throw new Error(`Failed to export analytics data: ${response.statusText}`)
     }
     
-    return response.json()
+    return response.blob()
+  }
+
+  /**
+   * Live dashboard updates over Server-Sent Events
+   * Returns a function that closes the stream
+   */
+  subscribeToUpdates(clerkUserId, onEvent) {
+    const source = new EventSource(`${this.baseUrl}/api/stream?user_id=${encodeURIComponent(clerkUserId)}`)
+    const eventTypes = [
+      'scan.created',
+      'scan.feedback_updated',
+      'counters.updated',
+      'favorites.updated',
+      'search.created',
+      'feedback.created',
+      'feedback.status_changed'
+    ]
+    
+    eventTypes.forEach((type) => {
+      source.addEventListener(type, (event) => {
+        onEvent(type, JSON.parse(event.data))
+      })
+    })
+    
+    return () => source.close()
   }
 
   /**
@@ -0,0 +1,52 @@
+"""
+Fast JSON serialization for API responses
+Uses orjson when installed, with native datetime/ObjectId/Enum handling, and
+lets routes return trusted internal dicts without FastAPI re-validating and
+re-encoding them through jsonable_encoder
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Encode the non-JSON types that show up in Motor documents and models"""
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if type(obj).__name__ in ("ObjectId", "Decimal128"):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with the fast encoder
+    Returning one directly from a route skips response_model validation
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -11,16 +11,25 @@ from PIL import Image
 import numpy as np
 import io
 import json
+import hashlib
 from datetime import datetime
 from typing import Optional
 
+from crossbreed import DEFAULT_THRESHOLDS, analyze_crossbreed
+from model_head import split_model
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Import our database components (optional)
 try:
-    from database.connection import get_database, close_database_connection
-    from database.services import ScanHistoryService, UserService
+    from database.connection import get_database, close_database_connection, create_indexes
+    from database.services import ScanHistoryService
+    from database.exports import ExportJobService
+    from database.reminders import ReminderScheduler
+    from database.votes import vote_buffer
+    from database.ingest import search_event_buffer
+    from database.account import AccountJobService
     from api_routes import router as api_router
     DATABASE_AVAILABLE = True
     print("✅ Database components imported successfully")
@@ -34,11 +43,48 @@ async def lifespan(app: FastAPI):
     if DATABASE_AVAILABLE:
         get_database()
         print("✅ Database connection established")
+        if os.getenv("AUTO_CREATE_INDEXES", "true").lower() == "true":
+            try:
+                await create_indexes()
+            except Exception as e:
+                print(f"⚠️  Failed to sync database indexes: {e}")
+        try:
+            resumed = await ExportJobService.resume_jobs()
+            if resumed:
+                print(f"✅ Resumed {resumed} export jobs")
+            await ExportJobService.cleanup_files()
+        except Exception as e:
+            print(f"⚠️  Failed to resume export jobs: {e}")
     else:
         print("⚠️  Running without database")
+    if DATABASE_AVAILABLE:
+        vote_buffer.start()
+        search_event_buffer.start()
+        try:
+            resumed = await AccountJobService.resume_jobs()
+            if resumed:
+                print(f"✅ Resumed {resumed} account data jobs")
+        except Exception as e:
+            print(f"⚠️  Failed to resume account data jobs: {e}")
+    similarity_writer = None
+    if DATABASE_AVAILABLE and STORE_EMBEDDINGS:
+        from similarity import SimilarityIndexWriter
+        similarity_writer = SimilarityIndexWriter()
+        similarity_writer.start()
+    reminder_scheduler = None
+    if DATABASE_AVAILABLE and os.getenv("REMINDER_SCHEDULER_ENABLED", "false").lower() == "true":
+        reminder_scheduler = ReminderScheduler()
+        reminder_scheduler.start()
+        print("✅ Vaccination reminder scheduler started")
     yield
     # Shutdown
+    if reminder_scheduler is not None:
+        await reminder_scheduler.stop()
+    if similarity_writer is not None:
+        await similarity_writer.stop()
     if DATABASE_AVAILABLE:
+        await vote_buffer.stop()
+        await search_event_buffer.stop()
         await close_database_connection()
         print("✅ Database connection closed")
 
@@ -71,6 +117,17 @@ model = tf.keras.models.load_model(MODEL_PATH)
 input_shape = model.input_shape  # e.g., (None, 300, 300, 3)
 IMG_HEIGHT, IMG_WIDTH = input_shape[1], input_shape[2]
 
+# Optionally run backbone and head separately so the pooled embedding can be
+# stored per scan and re-scored later without the image (see rescoring.py)
+STORE_EMBEDDINGS = os.getenv("STORE_EMBEDDINGS", "false").lower() == "true"
+backbone, classifier_head = None, None
+if STORE_EMBEDDINGS:
+    try:
+        backbone, classifier_head = split_model(model)
+        print(f"✅ Storing {classifier_head.embedding_dim}-d scan embeddings")
+    except ValueError as e:
+        print(f"⚠️  Embedding storage disabled: {e}")
+
 # -------------------------------
 # Load class indices (your format: "0": "Afghan_hound")
 # -------------------------------
@@ -105,10 +162,17 @@ async def predict(
 ):
     try:
         image_bytes = await file.read()
+        # Lets POST /api/scans recognise this image as already saved
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
         img_array = preprocess_image(image_bytes)
 
         # Get predictions
-        predictions = model.predict(img_array)
+        if backbone is not None:
+            embedding = backbone.predict(img_array)
+            predictions = classifier_head(embedding)
+        else:
+            embedding = None
+            predictions = model.predict(img_array)
         predicted_index = int(np.argmax(predictions, axis=1)[0])
         confidence = float(np.max(predictions))
         predicted_class = idx_to_class.get(predicted_index, "Unknown")
@@ -124,32 +188,9 @@ async def predict(
         ]
 
         # Advanced crossbreed detection criteria
-        confidence_threshold = 0.70
-        secondary_threshold = 0.15  # Secondary breed must have at least 15% confidence
-        confidence_gap = 0.30  # Gap between top 2 predictions should be less than 30%
-        
-        is_potential_crossbreed = False
-        crossbreed_analysis = {}
-        
-        if len(top_predictions) >= 2:
-            primary_conf = top_predictions[0]["confidence"]
-            secondary_conf = top_predictions[1]["confidence"]
-            confidence_gap_actual = primary_conf - secondary_conf
-            
-            # Determine crossbreed based on multiple criteria
-            if (primary_conf < confidence_threshold or 
-                (secondary_conf > secondary_threshold and confidence_gap_actual < confidence_gap)):
-                is_potential_crossbreed = True
-                
-                crossbreed_analysis = {
-                    "primary_breed": top_predictions[0]["breed"],
-                    "primary_confidence": primary_conf,
-                    "secondary_breed": top_predictions[1]["breed"],
-                    "secondary_confidence": secondary_conf,
-                    "confidence_gap": confidence_gap_actual,
-                    "crossbreed_likelihood": min(1.0, (secondary_conf / primary_conf) + 0.3),
-                    "suggested_mix": f"{top_predictions[0]['breed']} x {top_predictions[1]['breed']} Mix"
-                }
+        confidence_threshold = DEFAULT_THRESHOLDS.confidence_threshold
+        crossbreed_analysis = analyze_crossbreed(top_predictions, DEFAULT_THRESHOLDS)
+        is_potential_crossbreed = crossbreed_analysis is not None
 
         # Enhanced response with crossbreed analysis
         response_data = {
@@ -157,28 +198,42 @@ async def predict(
             "confidence": confidence,
             "is_potential_crossbreed": is_potential_crossbreed,
             "top_predictions": top_predictions[:5],  # Return top 5 for display
-            "crossbreed_analysis": crossbreed_analysis if is_potential_crossbreed else None,
+            "crossbreed_analysis": crossbreed_analysis,
             "detection_metadata": {
                 "confidence_threshold": confidence_threshold,
                 "analysis_timestamp": datetime.utcnow().isoformat(),
                 "algorithm_version": "1.1"
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow().isoformat(),
+            "image_hash": image_hash
         }
 
         # Save scan history to database if user_id provided
         if user_id:
             try:
                 from database.models import ScanHistory, BreedPrediction
+                from database.probabilities import (
+                    PROBABILITY_ENCODING,
+                    STORE_COMPACT_PROBABILITIES,
+                    encode_probabilities,
+                )
                 
-                # Create breed predictions objects
-                breed_predictions = [
-                    BreedPrediction(
-                        breed_name=pred["breed"],
-                        confidence=pred["confidence"]
-                    )
-                    for pred in top_predictions
-                ]
+                if STORE_COMPACT_PROBABILITIES:
+                    # Keep the full distribution; top_predictions is rebuilt on read
+                    breed_predictions = []
+                    probabilities = encode_probabilities(predictions[0])
+                    probability_encoding = PROBABILITY_ENCODING
+                else:
+                    # Create breed predictions objects
+                    breed_predictions = [
+                        BreedPrediction(
+                            breed_name=pred["breed"],
+                            confidence=pred["confidence"]
+                        )
+                        for pred in top_predictions
+                    ]
+                    probabilities = None
+                    probability_encoding = None
                 
                 # Create scan history object
                 scan_history = ScanHistory(
@@ -187,9 +242,11 @@ async def predict(
                     confidence_score=confidence,
                     is_crossbreed=is_potential_crossbreed,
                     top_predictions=breed_predictions,
+                    probabilities=probabilities,
+                    probability_encoding=probability_encoding,
                     timestamp=datetime.utcnow(),
                     image_url=None,  # Could store image URL if implementing image storage
-                    image_hash=None,  # Could calculate hash for deduplication
+                    image_hash=image_hash,  # Dedupes rescans within SCAN_DEDUPE_WINDOW_HOURS
                     secondary_breed=top_predictions[1]["breed"] if len(top_predictions) > 1 and is_potential_crossbreed else None,
                     location=None,  # Could be added from frontend
                     user_feedback=None,  # Will be updated via separate endpoint
@@ -197,11 +254,14 @@ async def predict(
                     user_confirmed_breed=None  # Will be updated if user corrects
                 )
                 
-                # Save to database
-                await ScanHistoryService.create_scan(scan_history)
+                # Save to database and count it in the user's total_scans
+                created_scan, created = await ScanHistoryService.record_scan(scan_history)
                 
-                # Increment user's scan count
-                await UserService.increment_scan_count(user_id)
+                if created and embedding is not None:
+                    from database.embeddings import EmbeddingService
+                    
+                    # Stored as pending; the similarity index writer appends it within seconds
+                    await EmbeddingService.store_embedding(created_scan["_id"], user_id, embedding[0])
                 
                 print(f"✅ Scan history saved for user: {user_id}")
             except Exception as db_error:
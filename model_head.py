@@ -0,0 +1,95 @@
+"""
+Backbone/head split of the breed classifier
+The backbone produces the pooled embedding stored per scan; the final dense
+layer is replayed in NumPy so stored embeddings can be re-scored without
+TensorFlow or the original images
+
+Export the head weights once per model version:
+    python -m model_head export
+"""
+import argparse
+import os
+from typing import Tuple
+
+import numpy as np
+
+
+MODEL_PATH = "model/final_model.keras"
+HEAD_WEIGHTS_PATH = os.getenv("HEAD_WEIGHTS_PATH", "model/head_weights.npz")
+
+
+class DenseHead:
+    """The classifier's final Dense layer as a NumPy function"""
+
+    def __init__(self, kernel: np.ndarray, bias: np.ndarray, activation: str = "softmax"):
+        if activation not in ("softmax", "linear"):
+            raise ValueError(f"Unsupported head activation: {activation}")
+        self.kernel = np.asarray(kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.activation = activation
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.kernel.shape[0]
+
+    @property
+    def num_classes(self) -> int:
+        return self.kernel.shape[1]
+
+    @classmethod
+    def from_keras(cls, layer) -> "DenseHead":
+        kernel, bias = layer.get_weights()
+        return cls(kernel, bias, layer.get_config().get("activation", "linear"))
+
+    @classmethod
+    def load(cls, path: str = HEAD_WEIGHTS_PATH) -> "DenseHead":
+        with np.load(path) as weights:
+            return cls(weights["kernel"], weights["bias"], str(weights["activation"]))
+
+    def save(self, path: str = HEAD_WEIGHTS_PATH) -> None:
+        np.savez(path, kernel=self.kernel, bias=self.bias, activation=self.activation)
+
+    def __call__(self, embeddings: np.ndarray) -> np.ndarray:
+        """Class probabilities for an (n, embedding_dim) batch"""
+        logits = np.asarray(embeddings, dtype=np.float32) @ self.kernel + self.bias
+        if self.activation == "linear":
+            return logits
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+
+def split_model(model) -> Tuple[object, DenseHead]:
+    """
+    Split a loaded Keras classifier into (backbone, head)
+    The backbone outputs whatever feeds the final Dense layer, i.e. the pooled
+    features (dropout is inactive at inference, so the split is exact)
+    """
+    import tensorflow as tf
+
+    head_layer = model.layers[-1]
+    if not isinstance(head_layer, tf.keras.layers.Dense):
+        raise ValueError(f"Expected a Dense classifier head, found {type(head_layer).__name__}")
+    backbone = tf.keras.Model(inputs=model.inputs, outputs=head_layer.input)
+    return backbone, DenseHead.from_keras(head_layer)
+
+
+def export_head(model_path: str = MODEL_PATH, path: str = HEAD_WEIGHTS_PATH) -> DenseHead:
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    _, head = split_model(model)
+    head.save(path)
+    return head
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Breed classifier head utilities")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=HEAD_WEIGHTS_PATH)
+    args = parser.parse_args()
+
+    head = export_head(args.model, args.output)
+    print(f"✅ Exported {head.embedding_dim}x{head.num_classes} {head.activation} head to {args.output}")
@@ -0,0 +1,141 @@
+"""
+Re-score past scans from their stored embeddings
+Runs only the dense head over scan_embeddings in vectorized batches and
+rewrites the crossbreed flags (and optionally the predictions) that change,
+e.g. after tuning the crossbreed thresholds or retraining the head
+
+Usage (from the project root):
+    python -m rescoring --confidence-threshold 0.65 [--secondary-threshold 0.15]
+        [--confidence-gap 0.30] [--head model/head_weights.npz]
+        [--update-predictions] [--dry-run]
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional, Dict
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Settings such as SCAN_STORAGE_MODE and the argument defaults are read on import
+    load_dotenv()
+
+from crossbreed import CrossbreedThresholds, crossbreed_flags
+from database.connection import get_database, close_database_connection
+from database.embeddings import EMBEDDING_BATCH_SIZE, EmbeddingService
+from database.probabilities import PROBABILITY_ENCODING, class_names, encode_probabilities
+from database.scan_layout import find_scans, scan_collection, scan_update
+from database.services import DataVersionService
+from model_head import HEAD_WEIGHTS_PATH, DenseHead
+
+
+async def rescore_scans(
+    head: DenseHead,
+    thresholds: CrossbreedThresholds,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    update_predictions: bool = False,
+    dry_run: bool = False,
+    model_version: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Recompute crossbreed flags for every stored embedding
+    Only scans whose stored fields differ are written; returns counters
+    """
+    db = get_database()
+    names = class_names()
+    totals = {"scanned": 0, "flagged": 0, "changed": 0}
+    touched_users = set()
+
+    query = {"model_version": model_version} if model_version else None
+    async for ids, users, embeddings in EmbeddingService.iter_batches(query, batch_size):
+        probabilities = head(embeddings)
+        flags, primary, secondary = crossbreed_flags(probabilities, thresholds)
+
+        current = {
+            scan["_id"]: scan
+            async for scan in find_scans(
+                {"_id": {"$in": ids}},
+                {"is_crossbreed": 1, "secondary_breed": 1, "predicted_breed": 1, "confidence_score": 1},
+                db=db
+            )
+        }
+
+        operations = []
+        for row, scan_id in enumerate(ids):
+            scan = current.get(scan_id)
+            if scan is None:
+                continue
+            update = {
+                "is_crossbreed": bool(flags[row]),
+                "secondary_breed": names[secondary[row]] if flags[row] else None,
+            }
+            unchanged = all(scan.get(key) == value for key, value in update.items())
+            if update_predictions:
+                update["predicted_breed"] = names[primary[row]]
+                update["confidence_score"] = float(probabilities[row, primary[row]])
+                unchanged = unchanged and scan.get("predicted_breed") == update["predicted_breed"] and \
+                    abs((scan.get("confidence_score") or 0.0) - update["confidence_score"]) < 1e-4
+            if unchanged:
+                continue
+
+            change = {"$set": update}
+            if update_predictions:
+                update["probabilities"] = encode_probabilities(probabilities[row])
+                update["probability_encoding"] = PROBABILITY_ENCODING
+                change["$unset"] = {"top_predictions": ""}
+            operations.append(scan_update(scan_id, change))
+            touched_users.add(users[row])
+
+        totals["scanned"] += len(ids)
+        totals["flagged"] += int(flags.sum())
+        totals["changed"] += len(operations)
+        if operations and not dry_run:
+            await scan_collection(db).bulk_write(operations, ordered=False)
+
+    if not dry_run:
+        # Let cached dashboards and ETags pick up the rewritten scans
+        for clerk_user_id in touched_users:
+            await DataVersionService.bump(clerk_user_id)
+    return totals
+
+
+async def main(args) -> None:
+    head = DenseHead.load(args.head)
+    thresholds = CrossbreedThresholds(
+        confidence_threshold=args.confidence_threshold,
+        secondary_threshold=args.secondary_threshold,
+        confidence_gap=args.confidence_gap
+    )
+    started = time.perf_counter()
+    try:
+        totals = await rescore_scans(
+            head,
+            thresholds,
+            batch_size=args.batch_size,
+            update_predictions=args.update_predictions,
+            dry_run=args.dry_run,
+            model_version=args.model_version
+        )
+    finally:
+        await close_database_connection()
+
+    elapsed = time.perf_counter() - started
+    verb = "would change" if args.dry_run else "changed"
+    print(
+        f"✅ Re-scored {totals['scanned']} scans in {elapsed:.1f}s: "
+        f"{totals['flagged']} flagged as crossbreeds, {totals['changed']} {verb}"
+    )
+
+
+if __name__ == "__main__":
+    defaults = CrossbreedThresholds()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--head", default=HEAD_WEIGHTS_PATH)
+    parser.add_argument("--confidence-threshold", type=float, default=defaults.confidence_threshold)
+    parser.add_argument("--secondary-threshold", type=float, default=defaults.secondary_threshold)
+    parser.add_argument("--confidence-gap", type=float, default=defaults.confidence_gap)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--model-version", default=None, help="Only re-score embeddings from this backbone version")
+    parser.add_argument("--update-predictions", action="store_true", help="Also rewrite predicted breed and probabilities")
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,271 @@
+"""
+Response caching
+Conditional GET support for per-user API responses: ETags are derived from
+the user's data version, so unchanged data short-circuits to 304 before any
+aggregation runs. Public responses that are identical for everyone are
+served from a stale-while-revalidate byte cache
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from database.services import DataVersionService
+from json_responses import dumps
+
+
+PAYLOAD_CACHE_MAX_ENTRIES = int(os.getenv("PAYLOAD_CACHE_MAX_ENTRIES", "2000"))
+PUBLIC_CACHE_MAX_ENTRIES = int(os.getenv("PUBLIC_CACHE_MAX_ENTRIES", "256"))
+PUBLIC_CACHE_MAX_AGE = float(os.getenv("PUBLIC_CACHE_MAX_AGE", "30"))
+PUBLIC_CACHE_STALE_SECONDS = float(os.getenv("PUBLIC_CACHE_STALE_SECONDS", "300"))
+
+
+class PayloadCache:
+    """LRU cache of the last serialized payload per (user, request), keyed by its ETag"""
+
+    def __init__(self, max_entries: int = PAYLOAD_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+
+    def get(self, user_id: str, resource: str, etag: str) -> Optional[bytes]:
+        entry = self._entries.get((user_id, resource))
+        if entry is None or entry[0] != etag:
+            return None
+        self._entries.move_to_end((user_id, resource))
+        return entry[1]
+
+    def put(self, user_id: str, resource: str, etag: str, body: bytes) -> None:
+        self._entries[(user_id, resource)] = (etag, body)
+        self._entries.move_to_end((user_id, resource))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict_user(self, user_id: str) -> None:
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
+
+
+payload_cache = PayloadCache()
+
+
+def _resource_key(request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def build_etag(user_id: str, resource: str, version: int) -> str:
+    # The UTC date is part of the tag because responses such as streaks and
+    # "last N days" windows change with the calendar even without new writes
+    day = datetime.utcnow().date().isoformat()
+    digest = hashlib.sha1(f"{user_id}|{resource}|{version}|{day}".encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def serialize_payload(payload: Any) -> bytes:
+    return dumps(payload)
+
+
+async def conditional_json_response(
+    request: Request,
+    user_id: str,
+    compute: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Response:
+    """
+    Serve a per-user JSON payload with ETag/Last-Modified validation
+    compute() only runs when neither the client nor the payload cache
+    already holds the current version. A payload with degraded_sections
+    (timed-out or failed reads) is sent uncached and without validators,
+    so the next request computes it again. So is every payload while the
+    user's data version can't be read or a failed bump is still pending
+    """
+    try:
+        version, updated_at = await DataVersionService.get_version(user_id)
+    except Exception as e:
+        print(f"⚠️ Data version unavailable for {user_id}, serving without validators: {str(e)}")
+        body = serialize_payload(await compute())
+        return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+    resource = _resource_key(request)
+    etag = build_etag(user_id, resource, version)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    last_modified = None
+    if updated_at is not None:
+        # Like the ETag, the validator rolls over at midnight UTC
+        start_of_day = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        last_modified = max(updated_at, start_of_day)
+        headers["Last-Modified"] = last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+    if_none_match = request.headers.get("if-none-match")
+    if _etag_matches(if_none_match, etag) or (
+        if_none_match is None
+        and _not_modified_since(request.headers.get("if-modified-since"), last_modified)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    body = payload_cache.get(user_id, resource, etag)
+    if body is None:
+        payload = await compute()
+        body = serialize_payload(payload)
+        if isinstance(payload, dict) and payload.get("degraded_sections"):
+            return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+        payload_cache.put(user_id, resource, etag, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ==================== Public Responses ====================
+class PublicResponseCache:
+    """
+    Stale-while-revalidate cache of serialized public responses
+    Fresh entries are served as is; stale ones are served immediately while
+    a single background task per key rebuilds them; misses are single-flight
+    so concurrent requests share one computation
+    """
+
+    def __init__(self, max_entries: int = PUBLIC_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (body, etag, fresh_until, stale_until)
+        self._entries: "OrderedDict[str, Tuple[bytes, str, float, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def metrics(self) -> Dict[str, Any]:
+        served = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return dict(
+            self.stats,
+            entries=len(self._entries),
+            hit_ratio=(self.stats["hits"] + self.stats["stale_hits"]) / served if served else 0.0
+        )
+
+    def _store(self, key: str, body: bytes, max_age: float, stale_seconds: float) -> Tuple[bytes, str]:
+        now = time.monotonic()
+        etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self._entries[key] = (body, etag, now + max_age, now + max_age + stale_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body, etag
+
+    async def _compute(self, key, compute, max_age, stale_seconds) -> Tuple[bytes, str]:
+        body = serialize_payload(await compute())
+        return self._store(key, body, max_age, stale_seconds)
+
+    async def _refresh(self, key, compute, max_age, stale_seconds) -> None:
+        self.stats["refreshes"] += 1
+        try:
+            await self._compute(key, compute, max_age, stale_seconds)
+        except Exception as e:
+            # Keep serving the stale copy until it expires
+            self.stats["refresh_errors"] += 1
+            print(f"⚠️ Background refresh of {key} failed: {str(e)}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        max_age: float = PUBLIC_CACHE_MAX_AGE,
+        stale_seconds: float = PUBLIC_CACHE_STALE_SECONDS
+    ) -> Tuple[bytes, str]:
+        """Return (body, etag) for key; errors from a cold compute propagate"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry[3]:
+            self._entries.move_to_end(key)
+            if now < entry[2]:
+                self.stats["hits"] += 1
+            else:
+                self.stats["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(
+                        self._refresh(key, compute, max_age, stale_seconds)
+                    )
+            return entry[0], entry[1]
+
+        self.stats["misses"] += 1
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._compute(key, compute, max_age, stale_seconds)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unwaited one isn't logged
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+public_cache = PublicResponseCache()
+
+
+def public_resource_key(path: str, params: Dict[str, Any]) -> str:
+    """
+    Cache key from the route path and its validated parameters only
+    Unknown or reordered query parameters map to the same entry, so callers
+    can't push the shared cache's real entries out with throwaway variants
+    """
+    query = "&".join(f"{name}={value}" for name, value in sorted(params.items()) if value is not None)
+    return f"{path}?{query}"
+
+
+async def public_json_response(
+    request: Request,
+    compute: Callable[[], Awaitable[Any]],
+    params: Optional[Dict[str, Any]] = None,
+    max_age: float = PUBLIC_CACHE_MAX_AGE,
+    stale_seconds: float = PUBLIC_CACHE_STALE_SECONDS
+) -> Response:
+    """
+    Serve a response that is identical for every caller from public_cache
+    params are the route's validated (and normalized) query parameters.
+    Cache-Control lets browsers and a CDN apply the same freshness rules
+    """
+    key = public_resource_key(request.url.path, params or {})
+    body, etag = await public_cache.get_or_compute(key, compute, max_age, stale_seconds)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={int(max_age)}, stale-while-revalidate={int(stale_seconds)}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
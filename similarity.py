@@ -0,0 +1,424 @@
+"""
+Similar-dog search over scan embeddings
+An inverted-file (IVF) index: embeddings are L2-normalized, bucketed by their
+nearest k-means centroid and scored with cosine similarity in the nprobe
+closest buckets. Vectors live in an append-only float16 file that is
+memory-mapped for search, so new scans are added without a rebuild: /predict
+flags each stored embedding as pending, and SimilarityIndexWriter appends
+them from whichever API worker holds the writer lease, so the files only
+ever have one writer
+
+Build or rebuild from scan_embeddings:
+    python -m similarity build [--nlist 1024] [--train-size 100000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+
+
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", os.path.join(os.getcwd(), "ann_index"))
+DEFAULT_NPROBE = int(os.getenv("SIMILARITY_NPROBE", "16"))
+SIMILARITY_SYNC_INTERVAL_SECONDS = float(os.getenv("SIMILARITY_SYNC_INTERVAL_SECONDS", "5"))
+SIMILARITY_SYNC_BATCH_SIZE = int(os.getenv("SIMILARITY_SYNC_BATCH_SIZE", "1000"))
+SIMILARITY_LEASE_SECONDS = float(os.getenv("SIMILARITY_LEASE_SECONDS", "60"))
+SIMILARITY_WRITER_LEASE = "similarity-index-writer"
+
+VECTOR_DTYPE = np.dtype("<f2")
+ASSIGNMENT_DTYPE = np.dtype("<i4")
+ID_BYTES = 12  # ObjectId binary
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each (normalized) vector"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(sample: np.ndarray, nlist: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over a training sample"""
+    rng = np.random.default_rng(seed)
+    sample = normalize(sample)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists from random points instead of leaving them dead
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def brute_force_search(vectors: np.ndarray, query: np.ndarray, k: int, chunk_size: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k rows by cosine similarity; the baseline for recall"""
+    query = normalize(query)[0]
+    best_rows = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        scores = np.asarray(vectors[start:start + chunk_size], dtype=np.float32) @ query
+        best_rows = np.concatenate([best_rows, np.arange(start, start + len(scores))])
+        best_scores = np.concatenate([best_scores, scores])
+        if len(best_scores) > k:
+            keep = np.argpartition(best_scores, -k)[-k:]
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+    order = np.argsort(best_scores)[::-1]
+    return best_rows[order], best_scores[order]
+
+
+class IVFIndex:
+    """
+    On-disk IVF index
+    Files: meta.json, centroids.npy, and three append-only files (vectors,
+    list assignments, ids) whose row counts are reconciled on load, so a
+    crash mid-append only loses the partial row. Appends assume a single
+    writer process (the holder of the writer lease); other processes pick
+    them up through refresh()
+    """
+
+    def __init__(self, directory: str = SIMILARITY_INDEX_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @classmethod
+    def exists(cls, directory: str = SIMILARITY_INDEX_DIR) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
+
+    @classmethod
+    def create(cls, directory: str, centroids: np.ndarray) -> "IVFIndex":
+        """Start an empty index over trained centroids, replacing any existing one"""
+        os.makedirs(directory, exist_ok=True)
+        centroids = normalize(centroids)
+        np.save(os.path.join(directory, "centroids.npy"), centroids)
+        for name in ("vectors.f16", "assignments.i4", "ids.bin"):
+            open(os.path.join(directory, name), "wb").close()
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"dim": int(centroids.shape[1]), "nlist": int(centroids.shape[0])}, f)
+        return cls(directory)
+
+    def _row_counts(self) -> int:
+        sizes = (
+            os.path.getsize(self._path("vectors.f16")) // (self.dim * VECTOR_DTYPE.itemsize),
+            os.path.getsize(self._path("assignments.i4")) // ASSIGNMENT_DTYPE.itemsize,
+            os.path.getsize(self._path("ids.bin")) // ID_BYTES,
+        )
+        return min(sizes)
+
+    def _load(self) -> None:
+        with open(self._path("meta.json")) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.nlist = meta["nlist"]
+        self.centroids = np.load(self._path("centroids.npy"))
+
+        count = self._row_counts()
+        self._open_maps(count)
+        assignments = np.fromfile(self._path("assignments.i4"), dtype=ASSIGNMENT_DTYPE, count=count)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=self.nlist))[:-1]
+        self._lists: List[np.ndarray] = np.split(order, bounds)
+
+    def _open_maps(self, count: int) -> None:
+        self._count = count
+        if count:
+            self._vectors = np.memmap(self._path("vectors.f16"), dtype=VECTOR_DTYPE, mode="r", shape=(count, self.dim))
+            self._ids = np.memmap(self._path("ids.bin"), dtype=np.uint8, mode="r", shape=(count, ID_BYTES))
+        else:
+            self._vectors = np.empty((0, self.dim), dtype=VECTOR_DTYPE)
+            self._ids = np.empty((0, ID_BYTES), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def refresh(self) -> None:
+        """Pick up rows appended by another process"""
+        if self._row_counts() != self._count:
+            with self._lock:
+                self._load()
+
+    def _truncate_partial_rows(self) -> None:
+        """Drop a row left half-written by a crash so appends stay aligned"""
+        if self._row_counts() != self._count:
+            self._load()
+        row_sizes = {
+            "vectors.f16": self.dim * VECTOR_DTYPE.itemsize,
+            "assignments.i4": ASSIGNMENT_DTYPE.itemsize,
+            "ids.bin": ID_BYTES,
+        }
+        for name, row_size in row_sizes.items():
+            if os.path.getsize(self._path(name)) > self._count * row_size:
+                os.truncate(self._path(name), self._count * row_size)
+
+    def add(self, ids: List[bytes], vectors: np.ndarray) -> None:
+        """Append vectors with their 12-byte ids; visible to searches immediately"""
+        vectors = normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+        if len(ids) != len(vectors) or any(len(item) != ID_BYTES for item in ids):
+            raise ValueError(f"Expected one {ID_BYTES}-byte id per vector")
+        assignments = _nearest(vectors, self.centroids)
+
+        with self._lock:
+            self._truncate_partial_rows()
+            with open(self._path("vectors.f16"), "ab") as f:
+                f.write(vectors.astype(VECTOR_DTYPE).tobytes())
+            with open(self._path("assignments.i4"), "ab") as f:
+                f.write(assignments.astype(ASSIGNMENT_DTYPE).tobytes())
+            with open(self._path("ids.bin"), "ab") as f:
+                f.write(b"".join(ids))
+
+            # Extend the in-memory lists instead of reloading every assignment
+            first_row = self._count
+            self._open_maps(first_row + len(vectors))
+            for list_id in np.unique(assignments):
+                rows = first_row + np.flatnonzero(assignments == list_id)
+                self._lists[list_id] = np.concatenate([self._lists[list_id], rows])
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = DEFAULT_NPROBE) -> List[Tuple[bytes, float]]:
+        """Approximate top-k (id, cosine similarity) pairs"""
+        query = normalize(query)[0]
+        vectors, ids, lists = self._vectors, self._ids, self._lists
+        probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        rows = np.concatenate([lists[probe] for probe in probes]) if len(probes) else np.empty(0, dtype=np.int64)
+        if not len(rows):
+            return []
+
+        rows.sort()  # Sequential reads from the memory map
+        scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+        k = min(k, len(rows))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(ids[rows[i]].tobytes(), float(scores[i])) for i in top]
+
+
+_index: Optional[IVFIndex] = None
+
+
+def get_similarity_index() -> Optional[IVFIndex]:
+    """The process-wide index, or None until one has been built"""
+    global _index
+    if _index is None and IVFIndex.exists():
+        _index = IVFIndex()
+    elif _index is not None:
+        _index.refresh()
+    return _index
+
+
+async def find_similar_scans(
+    scan_id: str,
+    clerk_user_id: str,
+    k: int = 10,
+    nprobe: int = DEFAULT_NPROBE
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Scans that look most like one of the user's scans
+    Returns None when the scan is not the user's or has no stored embedding;
+    other users' scans are returned without their ids
+    """
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    from database.embeddings import EmbeddingService
+    from database.scan_layout import find_scans
+
+    index = await asyncio.to_thread(get_similarity_index)
+    if index is None:
+        raise RuntimeError("Similarity index has not been built")
+
+    try:
+        object_id = ObjectId(scan_id)
+    except InvalidId:
+        return None
+    if not await find_scans({"_id": object_id, "user_id": clerk_user_id}, {"_id": 1}).to_list(1):
+        return None
+    embedding = await EmbeddingService.get_embedding(scan_id)
+    if embedding is None:
+        return None
+
+    matches = await asyncio.to_thread(index.search, embedding, k + 1, nprobe)
+    # A scan embedded during a rebuild can be appended twice; keep its best row
+    seen = {object_id.binary}
+    unique = []
+    for raw, score in matches:
+        if raw not in seen:
+            seen.add(raw)
+            unique.append((ObjectId(raw), score))
+    matches = unique[:k]
+    scans = {
+        scan["_id"]: scan
+        async for scan in find_scans(
+            {"_id": {"$in": [match_id for match_id, _ in matches]}},
+            {"user_id": 1, "predicted_breed": 1, "confidence_score": 1, "is_crossbreed": 1, "timestamp": 1}
+        )
+    }
+
+    results = []
+    for match_id, score in matches:
+        scan = scans.get(match_id)
+        if scan is None:
+            continue  # Deleted since it was indexed
+        is_own_scan = scan.get("user_id") == clerk_user_id
+        results.append({
+            "scan_id": str(match_id) if is_own_scan else None,
+            "is_own_scan": is_own_scan,
+            "similarity": round(score, 4),
+            "predicted_breed": scan.get("predicted_breed"),
+            "confidence_score": scan.get("confidence_score"),
+            "is_crossbreed": scan.get("is_crossbreed", False),
+            "timestamp": scan.get("timestamp"),
+        })
+    return results
+
+
+class SimilarityIndexWriter:
+    """
+    Periodic background task that appends pending embeddings to the index
+    Every API worker runs one, but only the holder of the writer lease
+    touches the files, and all file IO runs off the event loop
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = SIMILARITY_SYNC_INTERVAL_SECONDS,
+        batch_size: int = SIMILARITY_SYNC_BATCH_SIZE,
+        lease=None
+    ):
+        from database.leases import LeaderLease
+
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.lease = lease or LeaderLease(SIMILARITY_WRITER_LEASE, SIMILARITY_LEASE_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> Optional[int]:
+        """Append one batch of pending embeddings; None when another worker holds the lease"""
+        from database.embeddings import EmbeddingService
+
+        if not await self.lease.acquire():
+            return None
+        try:
+            index = await asyncio.to_thread(get_similarity_index)
+            if index is None:
+                # Nothing to append to; the first build picks everything up
+                return 0
+            async for ids, _, embeddings in EmbeddingService.iter_batches({"pending_index": True}, self.batch_size):
+                if embeddings.shape[1] == index.dim:
+                    await asyncio.to_thread(index.add, [scan_id.binary for scan_id in ids], embeddings)
+                # Other dimensions come from another model version and wait for a rebuild
+                await EmbeddingService.mark_indexed(ids)
+                return len(ids)
+            return 0
+        finally:
+            # Runs are short, so let any worker (or a rebuild) take the next one
+            await self.lease.release()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Similarity index sync failed: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+async def build_index(nlist: int, train_size: int, batch_size: int) -> int:
+    """
+    Train centroids on a sample of scan_embeddings, then add every embedding
+    Holds the writer lease throughout, so API workers don't append meanwhile
+    """
+    from database.leases import LeaderLease
+
+    lease = LeaderLease(SIMILARITY_WRITER_LEASE, SIMILARITY_LEASE_SECONDS)
+    for _ in range(10):
+        if await lease.acquire():
+            break
+        await asyncio.sleep(SIMILARITY_SYNC_INTERVAL_SECONDS)
+    else:
+        raise RuntimeError("An API worker keeps holding the similarity index writer lease; try again later")
+    try:
+        return await _build_index(nlist, train_size, batch_size, lease)
+    finally:
+        await lease.release()
+
+
+async def _build_index(nlist: int, train_size: int, batch_size: int, lease) -> int:
+    from database.embeddings import EmbeddingService
+
+    # Everything stored up to now goes into this build
+    await EmbeddingService.mark_indexed()
+    sample = []
+    sampled = 0
+    async for _, _, embeddings in EmbeddingService.iter_batches(batch_size=batch_size):
+        sample.append(embeddings)
+        sampled += len(embeddings)
+        if sampled >= train_size:
+            break
+    if not sample:
+        raise RuntimeError("scan_embeddings is empty; enable STORE_EMBEDDINGS first")
+
+    index = IVFIndex.create(SIMILARITY_INDEX_DIR, train_centroids(np.concatenate(sample)[:train_size], nlist))
+    async for ids, _, embeddings in EmbeddingService.iter_batches(batch_size=batch_size):
+        index.add([scan_id.binary for scan_id in ids], embeddings)
+        if not await lease.acquire():
+            raise RuntimeError("Lost the similarity index writer lease during the build")
+    return len(index)
+
+
+async def _main(args) -> None:
+    from database.connection import close_database_connection
+
+    try:
+        count = await build_index(args.nlist, args.train_size, args.batch_size)
+    finally:
+        await close_database_connection()
+    print(f"✅ Indexed {count} scan embeddings into {SIMILARITY_INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--train-size", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    load_dotenv()
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,38 @@
+"""
+Shared fixtures
+DB tests run against mongomock-motor and are skipped when it isn't installed
+"""
+import inspect
+
+import pytest
+
+from database import connection
+
+
+def _drop_sort(method):
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """An empty in-memory database behind get_database()"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from mongomock.collection import BulkOperationBuilder
+
+    # Newer pymongo passes sort= to bulk updates, which mongomock doesn't accept yet
+    for name in ("add_update", "add_replace"):
+        method = getattr(BulkOperationBuilder, name)
+        if "sort" not in inspect.signature(method).parameters:
+            monkeypatch.setattr(BulkOperationBuilder, name, _drop_sort(method))
+    # with_options() hands back the bare synchronous mongomock collection;
+    # write concerns mean nothing in memory, so keep the async wrapper
+    monkeypatch.setattr(
+        mongomock_motor.AsyncMongoMockCollection, "with_options", lambda self, *args, **kwargs: self,
+        raising=False
+    )
+
+    database = mongomock_motor.AsyncMongoMockClient()["pawdentify_test"]
+    monkeypatch.setattr(connection, "_database", database)
+    return database
@@ -0,0 +1,166 @@
+"""
+Resumable account export and deletion jobs
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+import gzip
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId, json_util
+
+from database import account
+from database.account import AccountJobService
+from database.archive import LocalSegmentStore, configure_segment_store
+from database.services import DataVersionService
+
+
+@pytest.fixture
+def jobs(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(account, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(account, "ACCOUNT_BATCH_SIZE", 2)
+    monkeypatch.setattr(account, "ACCOUNT_DELETE_PAUSE_SECONDS", 0)
+    configure_segment_store(LocalSegmentStore(str(tmp_path / "archive")))
+    yield db
+    AccountJobService._tasks.clear()
+    DataVersionService._pending_bumps.clear()
+
+
+async def seed(db, user_id="user-1"):
+    await db.users.insert_one({"clerk_user_id": user_id, "email": f"{user_id}@example.com"})
+    await db.scan_history.insert_many([
+        {"user_id": user_id, "predicted_breed": breed, "timestamp": datetime.utcnow()}
+        for breed in ("Pug", "Akita", "Boxer", "Husky", "Beagle")
+    ])
+    await db.search_history.insert_many([
+        {"user_id": user_id, "breed_searched": breed, "search_timestamp": datetime.utcnow()}
+        for breed in ("Pug", "Akita", "Boxer")
+    ])
+    await db.pets.insert_one({"user_id": user_id, "name": "Rex"})
+
+
+async def wait_for_jobs():
+    while AccountJobService._tasks:
+        await asyncio.gather(*list(AccountJobService._tasks.values()))
+
+
+def read_export(path):
+    with gzip.open(path, "rt") as f:
+        return [json_util.loads(line) for line in f]
+
+
+def exported_ids(lines, collection):
+    return [str(line["document"]["_id"]) for line in lines if line.get("collection") == collection]
+
+
+def test_export_writes_every_document_once(jobs):
+    async def scenario():
+        await seed(jobs)
+        await seed(jobs, "user-2")
+        job = await AccountJobService.create_job("user-1", "export")
+        await wait_for_jobs()
+
+        done = await AccountJobService.get_job(job["_id"], "user-1", include_path=True)
+        assert done["status"] == "completed" and done["progress"] == 1.0
+        assert done["counts"] == {"users": 1, "scans": 5, "search_history": 3, "pets": 1}
+
+        lines = read_export(done["file_path"])
+        assert lines[0]["type"] == "manifest"
+        assert len(exported_ids(lines, "scans")) == 5
+        assert all(line["document"]["user_id"] == "user-1" for line in lines if line.get("collection") == "scans")
+
+    asyncio.run(scenario())
+
+
+def test_failed_export_resumes_from_its_checkpoint(jobs, monkeypatch):
+    async def scenario():
+        await seed(jobs)
+        checkpoint = AccountJobService._checkpoint
+        calls = []
+
+        async def failing_checkpoint(job, fields, step=None, processed=0):
+            calls.append(step)
+            if step == "scans" and calls.count("scans") == 2:
+                raise ConnectionError("connection reset")
+            await checkpoint(job, fields, step, processed)
+
+        monkeypatch.setattr(AccountJobService, "_checkpoint", failing_checkpoint)
+        job = await AccountJobService.create_job("user-1", "export")
+        await wait_for_jobs()
+
+        failed = await AccountJobService.get_job(job["_id"], "user-1")
+        assert failed["status"] == "failed"
+        assert failed["current_step"] == "scans" and failed["counts"]["scans"] == 2
+
+        # The batch written before the failure is truncated away and written again
+        await AccountJobService.retry_job(job["_id"], "user-1")
+        await wait_for_jobs()
+        done = await AccountJobService.get_job(job["_id"], "user-1", include_path=True)
+        assert done["status"] == "completed"
+        assert done["counts"]["scans"] == 5
+
+        scan_ids = exported_ids(read_export(done["file_path"]), "scans")
+        assert sorted(scan_ids) == sorted(set(scan_ids))
+        assert len(scan_ids) == 5
+
+    asyncio.run(scenario())
+
+
+def test_job_with_a_lapsed_lease_is_resumed(jobs):
+    async def scenario():
+        await seed(jobs)
+        now = datetime.utcnow()
+        result = await jobs.account_jobs.insert_one({
+            "user_id": "user-1", "kind": "delete", "status": "running",
+            "steps": account.DELETE_STEPS, "step": account.DELETE_STEPS.index("search_history"),
+            "checkpoint": None, "counts": {}, "done": 0, "total": 10,
+            "worker": "gone-worker", "lease_expires_at": now - timedelta(minutes=1),
+            "created_at": now, "updated_at": now,
+        })
+        # A job another worker is still leasing stays where it is
+        await jobs.account_jobs.insert_one({
+            "user_id": "user-2", "kind": "delete", "status": "running",
+            "steps": account.DELETE_STEPS, "step": 0, "checkpoint": None, "counts": {},
+            "worker": "live-worker", "lease_expires_at": now + timedelta(minutes=5),
+            "created_at": now, "updated_at": now,
+        })
+
+        assert await AccountJobService.resume_jobs() == 1
+        await wait_for_jobs()
+
+        job = await jobs.account_jobs.find_one({"_id": result.inserted_id})
+        assert job["status"] == "completed"
+        assert job["worker"] != "gone-worker"
+        # Steps before the checkpointed one are not repeated
+        assert "scans" not in job["counts"]
+        assert await jobs.scan_history.count_documents({"user_id": "user-1"}) == 5
+        for collection in ("search_history", "pets", "users"):
+            assert await jobs[collection].count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_delete_keeps_the_data_version_monotonic(jobs):
+    async def scenario():
+        await seed(jobs)
+        await DataVersionService.bump("user-1")
+        before, _ = await DataVersionService.get_version("user-1")
+
+        job = await AccountJobService.create_job("user-1", "delete")
+        await wait_for_jobs()
+
+        done = await AccountJobService.get_job(job["_id"], "user-1")
+        assert done["status"] == "completed"
+        assert await jobs.scan_history.count_documents({}) == 0
+        after, _ = await DataVersionService.get_version("user-1")
+        assert after > before
+
+    asyncio.run(scenario())
+
+
+def test_unknown_job_is_not_found(jobs):
+    async def scenario():
+        assert await AccountJobService.get_job(str(ObjectId()), "user-1") is None
+        assert await AccountJobService.get_job("not-an-id", "user-1") is None
+
+    asyncio.run(scenario())
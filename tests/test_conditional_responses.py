@@ -0,0 +1,80 @@
+"""
+ETag validation of per-user responses across writes
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from database.services import DataVersionService, _bump_data_version
+import response_cache
+from response_cache import PayloadCache, conditional_json_response
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    app = FastAPI()
+    app.state.computed = 0
+
+    @app.get("/dashboard")
+    async def dashboard(request: Request):
+        async def compute():
+            app.state.computed += 1
+            return {"computed": app.state.computed}
+        return await conditional_json_response(request, "user-1", compute)
+
+    monkeypatch.setattr(response_cache, "payload_cache", PayloadCache())
+    DataVersionService._pending_bumps.clear()
+    with TestClient(app) as test_client:
+        yield test_client
+    DataVersionService._pending_bumps.clear()
+
+
+def write():
+    asyncio.run(_bump_data_version("user-1"))
+
+
+def test_unchanged_data_revalidates_with_304(client):
+    first = client.get("/dashboard")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert client.app.state.computed == 1
+
+
+def test_write_changes_the_etag(client):
+    etag = client.get("/dashboard").headers["etag"]
+    write()
+
+    after = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["etag"] != etag
+    assert after.json() == {"computed": 2}
+
+
+def test_failed_bump_disables_validation_until_it_lands(client, monkeypatch):
+    etag = client.get("/dashboard").headers["etag"]
+
+    async def unavailable(clerk_user_id):
+        raise ConnectionError("db down")
+
+    bump = DataVersionService.bump
+    monkeypatch.setattr(DataVersionService, "bump", unavailable)
+    write()
+
+    degraded = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert degraded.status_code == 200
+    assert "etag" not in degraded.headers
+    assert degraded.headers["cache-control"] == "no-store"
+
+    # The pending bump is applied before the version is trusted again
+    monkeypatch.setattr(DataVersionService, "bump", bump)
+    recovered = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert recovered.status_code == 200
+    assert recovered.headers["etag"] != etag
+    assert client.get("/dashboard", headers={"If-None-Match": recovered.headers["etag"]}).status_code == 304
@@ -0,0 +1,131 @@
+"""
+Incremental feedback statistics and testimonial votes
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from database import services
+from database.services import FEEDBACK_STATS_ID, CommunityFeedbackService, DataVersionService, FeedbackService
+from database.votes import vote_buffer
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    FeedbackService._stats_stale = False
+    vote_buffer._pending.clear()
+    yield
+    FeedbackService._stats_stale = False
+    vote_buffer._pending.clear()
+    DataVersionService._pending_bumps.clear()
+
+
+def feedback(rating=None):
+    data = {"user_id": "user-1", "feedback_type": "general", "subject": "Hi", "message": "Nice app"}
+    if rating is not None:
+        data["rating"] = rating
+    return data
+
+
+def test_deltas_match_a_rebuild(db):
+    async def scenario():
+        first = await FeedbackService.create_feedback(feedback(rating=4))
+        # The first read builds the document; later writes only apply deltas
+        assert (await FeedbackService.get_feedback_statistics())["total"] == 1
+
+        await FeedbackService.create_feedback(feedback(rating=2))
+        await FeedbackService.create_feedback(feedback())
+        await FeedbackService.update_feedback_status(first["_id"], "resolved")
+
+        stats = await FeedbackService.get_feedback_statistics()
+        assert stats["total"] == 3
+        assert stats["pending"] == 2
+        assert stats["resolved"] == 1
+        assert stats["total_ratings"] == 2
+        assert stats["average_rating"] == 3
+
+        stored = await db.feedback_stats.find_one({"_id": FEEDBACK_STATS_ID})
+        assert stored["seq"] == 3
+        rebuilt = await FeedbackService.rebuild_feedback_statistics()
+        assert rebuilt["status_counts"] == stored["status_counts"]
+        assert rebuilt["rating_sum"] == stored["rating_sum"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_delta_triggers_a_rebuild(db, monkeypatch):
+    async def scenario():
+        await FeedbackService.create_feedback(feedback())
+        await FeedbackService.get_feedback_statistics()
+
+        async def failing_update(*args, **kwargs):
+            raise RuntimeError("primary stepped down")
+        with monkeypatch.context() as patch:
+            patch.setattr(type(db.feedback_stats), "update_one", failing_update)
+            await FeedbackService.create_feedback(feedback())
+        assert FeedbackService._stats_stale
+
+        assert (await FeedbackService.get_feedback_statistics())["total"] == 2
+        assert not FeedbackService._stats_stale
+
+    asyncio.run(scenario())
+
+
+def test_old_document_is_reconciled(db, monkeypatch):
+    async def scenario():
+        await FeedbackService.create_feedback(feedback())
+        await FeedbackService.get_feedback_statistics()
+        # Drift the stored counters, as a lost delta would
+        await db.feedback_stats.update_one({"_id": FEEDBACK_STATS_ID}, {"$set": {"total": 10}})
+        assert (await FeedbackService.get_feedback_statistics())["total"] == 10
+
+        monkeypatch.setattr(services, "FEEDBACK_STATS_RECONCILE_SECONDS", -1)
+        assert (await FeedbackService.get_feedback_statistics())["total"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_rebuild_overtaken_by_a_delta_is_retried(db, monkeypatch):
+    async def scenario():
+        await FeedbackService.create_feedback(feedback())
+        await FeedbackService.get_feedback_statistics()
+
+        compute = FeedbackService._compute_feedback_statistics
+        calls = []
+
+        async def racing_compute():
+            doc = await compute()
+            if not calls:
+                # A write lands between the aggregation and the replace
+                await FeedbackService.create_feedback(feedback())
+            calls.append(doc)
+            return doc
+        monkeypatch.setattr(FeedbackService, "_compute_feedback_statistics", racing_compute)
+
+        doc = await FeedbackService.rebuild_feedback_statistics()
+        assert len(calls) == 2
+        assert doc["total"] == 2
+        stored = await db.feedback_stats.find_one({"_id": FEEDBACK_STATS_ID})
+        assert stored["total"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_votes_only_buffer_for_existing_testimonials(db):
+    async def scenario():
+        result = await db.community_feedback.insert_one({"title": "Great", "total_votes": 0, "helpful_votes": 0})
+
+        assert await CommunityFeedbackService.vote_on_feedback(str(result.inserted_id), True)
+        assert await CommunityFeedbackService.vote_on_feedback(str(result.inserted_id), False)
+        assert not await CommunityFeedbackService.vote_on_feedback(str(ObjectId()), True)
+        assert not await CommunityFeedbackService.vote_on_feedback("not-an-id", True)
+        assert list(vote_buffer._pending) == [result.inserted_id]
+
+        assert await vote_buffer.flush() == 1
+        testimonial = await db.community_feedback.find_one({"_id": result.inserted_id})
+        assert testimonial["total_votes"] == 2
+        assert testimonial["helpful_votes"] == 1
+
+    asyncio.run(scenario())
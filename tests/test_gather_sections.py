@@ -0,0 +1,65 @@
+"""
+Concurrent dashboard sections with per-section timeouts
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+import time
+
+from database.services import gather_sections
+
+
+async def value_after(delay, value):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def failing():
+    raise RuntimeError("db down")
+
+
+def test_all_sections_succeed():
+    async def scenario():
+        results, degraded = await gather_sections({
+            "profile": value_after(0, {"name": "Rex"}),
+            "scans": value_after(0, [1, 2]),
+        })
+        assert results == {"profile": {"name": "Rex"}, "scans": [1, 2]}
+        assert degraded == []
+
+    asyncio.run(scenario())
+
+
+def test_slow_section_times_out_alone():
+    async def scenario():
+        results, degraded = await gather_sections(
+            {"fast": value_after(0, "ok"), "slow": value_after(5, "late")},
+            defaults={"slow": []},
+            timeout=0.05
+        )
+        assert results == {"fast": "ok", "slow": []}
+        assert degraded == ["slow"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_section_degrades_to_a_copy_of_its_default():
+    async def scenario():
+        defaults = {"stats": {"total": 0}}
+        results, degraded = await gather_sections({"stats": failing(), "other": failing()}, defaults)
+        assert results == {"stats": {"total": 0}, "other": None}
+        assert degraded == ["stats", "other"]
+
+        results["stats"]["total"] = 5
+        assert defaults["stats"] == {"total": 0}
+
+    asyncio.run(scenario())
+
+
+def test_sections_run_concurrently():
+    async def scenario():
+        started = time.monotonic()
+        results, _ = await gather_sections({f"section-{i}": value_after(0.1, i) for i in range(5)})
+        assert time.monotonic() - started < 0.3
+        assert results == {f"section-{i}": i for i in range(5)}
+
+    asyncio.run(scenario())
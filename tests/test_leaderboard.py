@@ -0,0 +1,64 @@
+"""
+HyperLogLog sketches and the leaderboard rebuild
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from database.leaderboard import LEADERBOARD_STAGING_COLLECTION, HyperLogLog, LeaderboardService
+
+
+def sketch_of(values):
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_estimate_is_close_to_the_distinct_count():
+    sketch = sketch_of(f"user-{i % 500}" for i in range(5000))
+    assert abs(sketch.estimate() - 500) <= 500 * 0.1
+
+
+def test_merge_equals_the_sketch_of_the_union():
+    left = sketch_of(f"user-{i}" for i in range(0, 600))
+    right = sketch_of(f"user-{i}" for i in range(400, 1000))
+    union = sketch_of(f"user-{i}" for i in range(0, 1000))
+
+    assert left.merge(right).registers == union.registers
+    assert abs(union.estimate() - 1000) <= 1000 * 0.1
+
+
+def test_merge_is_idempotent():
+    sketch = sketch_of(f"user-{i}" for i in range(100))
+    before = dict(sketch.registers)
+    sketch.merge(HyperLogLog(before))
+    assert sketch.registers == before
+
+
+def test_rebuild_replaces_the_counters_from_search_history(db):
+    async def scenario():
+        now = datetime.utcnow()
+        await db.search_history.insert_many([
+            {"user_id": f"user-{i % 3}", "breed_searched": "Pug" if i % 2 else "Beagle",
+             "search_timestamp": now - timedelta(minutes=i)}
+            for i in range(10)
+        ])
+        # Counters that drifted from the history
+        await db.breed_leaderboard.insert_one(
+            {"_id": "all|Poodle", "window": "all", "breed": "Poodle", "search_count": 99, "hll": {}}
+        )
+        await db.breed_leaderboard.create_index([("window", 1), ("search_count", -1)])
+
+        assert await LeaderboardService.rebuild(batch_size=4) == 10
+
+        top = await LeaderboardService.get_top_breeds(window="all")
+        assert {entry["breed"]: entry["search_count"] for entry in top} == {"Pug": 5, "Beagle": 5}
+        assert {entry["breed"]: entry["user_count"] for entry in top} == {"Pug": 3, "Beagle": 3}
+        assert LEADERBOARD_STAGING_COLLECTION not in await db.list_collection_names()
+        assert "window_1_search_count_-1" in await db.breed_leaderboard.index_information()
+
+        snapshot = await db.leaderboard_snapshots.find_one({"_id": "24h"})
+        assert {entry["breed"]: entry["search_count"] for entry in snapshot["entries"]} == {"Pug": 5, "Beagle": 5}
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+"""
+Packed probability blobs: encode/decode round trips
+Run from the project root: python -m pytest tests
+"""
+import numpy as np
+import pytest
+from bson import BSON
+
+from database import probabilities
+from database.probabilities import decode_probabilities, encode_probabilities, expand_scan
+
+
+@pytest.fixture
+def distribution():
+    rng = np.random.default_rng(7)
+    values = rng.random(120).astype(np.float32)
+    return values / values.sum()
+
+
+def test_f16_round_trip(distribution):
+    blob = encode_probabilities(distribution, "f16")
+    assert len(blob) == 2 * len(distribution)
+
+    decoded = decode_probabilities(blob, "f16")
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, distribution, rtol=1e-3, atol=1e-7)
+
+
+def test_u8_round_trip(distribution):
+    blob = encode_probabilities(distribution, "u8")
+    assert len(blob) == len(distribution)
+    np.testing.assert_allclose(decode_probabilities(blob, "u8"), distribution, atol=0.5 / 255 + 1e-7)
+
+
+@pytest.mark.parametrize("encoding, tolerance", [("f16", 1e-3), ("u8", 0.5 / 255 + 1e-7)])
+def test_round_trip_through_bson(distribution, encoding, tolerance):
+    stored = BSON.encode({"probabilities": encode_probabilities(distribution, encoding)}).decode()
+    np.testing.assert_allclose(decode_probabilities(stored["probabilities"], encoding), distribution, atol=tolerance)
+
+
+@pytest.mark.parametrize("encoding", ["f16", "u8"])
+def test_values_are_clipped_to_unit_range(encoding):
+    decoded = decode_probabilities(encode_probabilities([-0.5, 0.25, 1.5], encoding), encoding)
+    np.testing.assert_allclose(decoded, [0.0, 0.25, 1.0], atol=1 / 255)
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError, match="Unknown probability encoding"):
+        encode_probabilities([0.5], "f64")
+
+
+def test_expand_scan_rebuilds_top_predictions(monkeypatch):
+    monkeypatch.setattr(probabilities, "_class_names", ["Akita", "Beagle", "Pug", "Samoyed"])
+    scan = {
+        "predicted_breed": "Pug",
+        "probabilities": encode_probabilities([0.1, 0.0, 0.7, 0.2], "f16"),
+        "probability_encoding": "f16",
+    }
+
+    expanded = expand_scan(scan)
+    assert "probabilities" not in expanded and "probability_encoding" not in expanded
+    assert [p["breed_name"] for p in expanded["top_predictions"]] == ["Pug", "Samoyed", "Akita"]
+    assert expanded["top_predictions"][0]["confidence"] == pytest.approx(0.7, abs=1e-3)
+
+
+def test_expand_scan_leaves_legacy_documents_alone():
+    legacy = {"top_predictions": [{"breed_name": "Pug", "confidence": 0.9}]}
+    assert expand_scan(dict(legacy)) == legacy
@@ -0,0 +1,62 @@
+"""
+Named projection views and fields= narrowing
+Run from the project root: python -m pytest tests
+"""
+import pytest
+
+from database.services import PROJECTION_VIEWS, list_pipeline, resolve_projection
+
+
+def test_detail_view_returns_the_whole_document():
+    assert resolve_projection("scan_history") is None
+    assert resolve_projection("scan_history", "detail") is None
+
+
+def test_named_view_projects_its_fields():
+    projection = resolve_projection("scan_history", "analytics")
+    assert projection == {field: 1 for field in PROJECTION_VIEWS["scan_history"]["analytics"]}
+
+
+def test_fields_narrow_a_view():
+    assert resolve_projection("scan_history", "list", ["predicted_breed", "timestamp"]) == {
+        "predicted_breed": 1,
+        "timestamp": 1,
+    }
+
+
+def test_fields_on_the_detail_view_and_nested_paths():
+    assert resolve_projection("pets", "detail", ["name", "medical_info.allergies"]) == {
+        "name": 1,
+        "medical_info.allergies": 1,
+    }
+
+
+def test_id_is_always_included_and_never_projected_explicitly():
+    assert resolve_projection("search_history", "list", ["_id", "breed_searched"]) == {"breed_searched": 1}
+
+
+def test_nested_path_under_an_allowed_field():
+    assert resolve_projection("scan_history", "list", ["top_predictions.breed_name"]) == {
+        "top_predictions.breed_name": 1,
+    }
+
+
+def test_unknown_view_is_rejected():
+    with pytest.raises(ValueError, match="Unknown view"):
+        resolve_projection("scan_history", "summary")
+
+
+def test_fields_outside_the_view_are_rejected():
+    with pytest.raises(ValueError, match="not available"):
+        resolve_projection("scan_history", "analytics", ["user_notes"])
+
+
+@pytest.mark.parametrize("field", ["$where", "a..b", "1abc", "name;drop", ""])
+def test_malformed_field_names_are_rejected(field):
+    with pytest.raises(ValueError, match="Invalid field names"):
+        resolve_projection("pets", "detail", ["name", field])
+
+
+def test_projection_is_applied_after_paging():
+    pipeline = list_pipeline({"user_id": "u"}, {"timestamp": -1}, 10, 5, {"timestamp": 1})
+    assert [next(iter(stage)) for stage in pipeline] == ["$match", "$sort", "$skip", "$limit", "$project", "$set"]
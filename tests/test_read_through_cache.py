@@ -0,0 +1,165 @@
+"""
+ReadThroughCache against a local fake backend
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+from database.services import _MISS, InMemoryCacheBackend, ReadThroughCache
+
+
+class FakeBackend(InMemoryCacheBackend):
+    """In-memory backend that records writes and can fail reads"""
+
+    def __init__(self):
+        super().__init__()
+        self.sets = []
+        self.fail_reads = False
+
+    async def get(self, key):
+        if self.fail_reads:
+            raise ConnectionError("backend down")
+        return await super().get(key)
+
+    async def set(self, key, value, ttl_seconds):
+        self.sets.append(key)
+        await super().set(key, value, ttl_seconds)
+
+
+class CountingLoader:
+    def __init__(self, value=None, release=None, error=None):
+        self.value = value if value is not None else {"name": "Rex"}
+        self.release = release
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def test_miss_loads_and_caches():
+    async def scenario():
+        backend = FakeBackend()
+        cache = ReadThroughCache(backend)
+        loader = CountingLoader()
+
+        assert await cache.get_or_load("user:1", loader) == {"name": "Rex"}
+        assert loader.calls == 1
+        assert backend.sets == ["user:1"]
+        assert await backend.get("user:1") == {"name": "Rex"}
+
+    asyncio.run(scenario())
+
+
+def test_hit_skips_loader_and_returns_a_copy():
+    async def scenario():
+        cache = ReadThroughCache(FakeBackend())
+        loader = CountingLoader()
+
+        first = await cache.get_or_load("user:1", loader)
+        first["name"] = "changed"
+        second = await cache.get_or_load("user:1", loader)
+
+        assert loader.calls == 1
+        assert second == {"name": "Rex"}
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        backend = FakeBackend()
+        cache = ReadThroughCache(backend)
+        release = asyncio.Event()
+        loader = CountingLoader(release=release)
+
+        pending = [asyncio.create_task(cache.get_or_load("user:1", loader)) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*pending)
+
+        assert loader.calls == 1
+        assert results == [{"name": "Rex"}] * 10
+        assert backend.sets == ["user:1"]
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_misses_share_a_failure():
+    async def scenario():
+        cache = ReadThroughCache(FakeBackend())
+        release = asyncio.Event()
+        loader = CountingLoader(release=release, error=RuntimeError("db down"))
+
+        pending = [asyncio.create_task(cache.get_or_load("user:1", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*pending, return_exceptions=True)
+
+        assert loader.calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_during_load_skips_caching_the_stale_value():
+    async def scenario():
+        backend = FakeBackend()
+        cache = ReadThroughCache(backend)
+        release = asyncio.Event()
+        loader = CountingLoader(release=release)
+
+        load = asyncio.create_task(cache.get_or_load("user:1", loader))
+        await asyncio.sleep(0)
+        await cache.invalidate("user:1")
+        release.set()
+
+        assert await load == {"name": "Rex"}
+        assert backend.sets == []
+        assert await backend.get("user:1") is _MISS
+
+        # The next load is cached again
+        await cache.get_or_load("user:1", CountingLoader())
+        assert backend.sets == ["user:1"]
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_during_failed_load_does_not_block_later_caching():
+    async def scenario():
+        backend = FakeBackend()
+        cache = ReadThroughCache(backend)
+        release = asyncio.Event()
+        failing = CountingLoader(release=release, error=RuntimeError("db down"))
+
+        load = asyncio.create_task(cache.get_or_load("user:1", failing))
+        await asyncio.sleep(0)
+        await cache.invalidate("user:1")
+        release.set()
+        with pytest.raises(RuntimeError):
+            await load
+
+        await cache.get_or_load("user:1", CountingLoader())
+        assert backend.sets == ["user:1"]
+
+    asyncio.run(scenario())
+
+
+def test_backend_read_failure_falls_back_to_loader():
+    async def scenario():
+        backend = FakeBackend()
+        backend.fail_reads = True
+        cache = ReadThroughCache(backend)
+        loader = CountingLoader()
+
+        assert await cache.get_or_load("user:1", loader) == {"name": "Rex"}
+        assert await cache.get_or_load("user:1", loader) == {"name": "Rex"}
+        assert loader.calls == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+"""
+Idempotent scan recording
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+from database import services
+from database.models import ScanHistory
+from database.services import DataVersionService, ScanHistoryService
+
+
+@pytest.fixture
+def users(db, monkeypatch):
+    # mongomock has no replica set; exercise the sequential path
+    monkeypatch.setattr(services, "SCAN_WRITE_TRANSACTIONS", "off")
+    asyncio.run(db.users.insert_one({"clerk_user_id": "user-1", "total_scans": 0}))
+    yield db
+    DataVersionService._pending_bumps.clear()
+
+
+def scan(image_hash=None):
+    return ScanHistory(user_id="user-1", predicted_breed="Pug", confidence_score=0.9, image_hash=image_hash)
+
+
+async def total_scans(db):
+    return (await db.users.find_one({"clerk_user_id": "user-1"}))["total_scans"]
+
+
+def test_replayed_key_stores_and_counts_once(users):
+    async def scenario():
+        first, created = await ScanHistoryService.record_scan(scan(), idempotency_key="req-1")
+        again, created_again = await ScanHistoryService.record_scan(scan(), idempotency_key="req-1")
+
+        assert created and not created_again
+        assert again["_id"] == first["_id"]
+        assert await users.scan_history.count_documents({}) == 1
+        assert await total_scans(users) == 1
+
+    asyncio.run(scenario())
+
+
+def test_image_hash_is_the_fallback_key(users):
+    async def scenario():
+        await ScanHistoryService.record_scan(scan(image_hash="abc"))
+        _, created = await ScanHistoryService.record_scan(scan(image_hash="abc"))
+        assert not created
+
+        # Without any key every call is a new scan
+        await ScanHistoryService.record_scan(scan())
+        await ScanHistoryService.record_scan(scan())
+        assert await users.scan_history.count_documents({}) == 3
+        assert await total_scans(users) == 3
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_a_crash_between_the_writes(users, monkeypatch):
+    async def scenario():
+        upsert = services.upsert_scan
+
+        async def store_then_fail(scan_dict, db=None, session=None):
+            await upsert(scan_dict, db, session=session)
+            raise ConnectionError("connection reset")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(services, "upsert_scan", store_then_fail)
+            with pytest.raises(ConnectionError):
+                await ScanHistoryService.record_scan(scan(), idempotency_key="req-2")
+        assert await total_scans(users) == 0
+
+        stored, created = await ScanHistoryService.record_scan(scan(), idempotency_key="req-2")
+        assert created
+        assert await users.scan_history.count_documents({}) == 1
+        assert await total_scans(users) == 1
+        receipt = await users.scan_receipts.find_one({"_id": "user-1|key:req-2"})
+        assert receipt["counted"] and receipt["attempts"] == 2
+        assert str(receipt["scan_id"]) == stored["_id"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+"""
+Scan deduplication per user, image hash and time window
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from database import services
+from database.indexes import sync_indexes
+from database.models import ScanHistory
+from database.scan_layout import dedupe_window, upsert_scan
+from database.services import DataVersionService, ScanHistoryService
+
+
+@pytest.fixture
+def scans(db, monkeypatch):
+    monkeypatch.setattr(services, "SCAN_WRITE_TRANSACTIONS", "off")
+    asyncio.run(db.users.insert_one({"clerk_user_id": "user-1", "total_scans": 0}))
+    yield db
+    DataVersionService._pending_bumps.clear()
+
+
+def scan(image_hash="abc", timestamp=None):
+    return ScanHistory(
+        user_id="user-1",
+        predicted_breed="Pug",
+        confidence_score=0.9,
+        image_hash=image_hash,
+        timestamp=timestamp or datetime.utcnow()
+    )
+
+
+def test_window_follows_the_environment(monkeypatch):
+    timestamp = datetime(2026, 3, 4, 17, 30)
+    assert dedupe_window(timestamp) == datetime(2026, 3, 4)
+
+    # Read on every call, not frozen at import
+    monkeypatch.setenv("SCAN_DEDUPE_WINDOW_HOURS", "6")
+    assert dedupe_window(timestamp) == datetime(2026, 3, 4, 12)
+
+
+def test_rescan_within_the_window_is_not_stored_again(scans):
+    async def scenario():
+        start = dedupe_window(datetime.utcnow())
+        first, created = await ScanHistoryService.record_scan(scan(timestamp=start + timedelta(minutes=1)))
+        again, created_again = await ScanHistoryService.record_scan(scan(timestamp=start + timedelta(minutes=5)))
+        assert created and not created_again
+        assert again["_id"] == first["_id"]
+
+        # Another image, or the same one in the next window, is a new scan
+        await ScanHistoryService.record_scan(scan(image_hash="def", timestamp=start + timedelta(minutes=5)))
+        await ScanHistoryService.record_scan(scan(timestamp=start + timedelta(hours=25)))
+        assert await scans.scan_history.count_documents({}) == 3
+        assert (await scans.users.find_one({"clerk_user_id": "user-1"}))["total_scans"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_unique_index_holds_one_scan_per_slot(scans):
+    async def scenario():
+        await sync_indexes(scans)
+        start = dedupe_window(datetime.utcnow())
+        first = services._scan_document(scan(timestamp=start))
+        second = services._scan_document(scan(timestamp=start + timedelta(minutes=3)))
+        first["_id"] = await upsert_scan(first)
+
+        # A second writer that skipped the lookup is stopped by the index
+        with pytest.raises(DuplicateKeyError):
+            await scans.scan_history.insert_one(dict(second))
+        assert await upsert_scan(second) == first["_id"]
+
+        # Scans without a hash are outside the partial index
+        for _ in range(2):
+            await upsert_scan(services._scan_document(scan(image_hash=None, timestamp=start)))
+        assert await scans.scan_history.count_documents({}) == 3
+
+    asyncio.run(scenario())
+
@@ -0,0 +1,93 @@
+"""
+Buffered search-history ingestion
+Run from the project root: python -m pytest tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.ingest import SearchEventBuffer
+from database.services import DataVersionService, SearchHistoryService
+
+
+@pytest.fixture(autouse=True)
+def no_pending_bumps():
+    yield
+    DataVersionService._pending_bumps.clear()
+
+
+def search(user_id, breed, minutes_ago=0):
+    return {
+        "user_id": user_id,
+        "breed_searched": breed,
+        "search_timestamp": datetime.utcnow() - timedelta(minutes=minutes_ago),
+    }
+
+
+def test_flush_writes_searches_interactions_and_recent_lists(db):
+    async def scenario():
+        # user-1 already has a buffer; user-2 only has history from before it existed
+        await db.recent_searches.insert_one({"_id": "user-1", "breeds": ["Pug", "Beagle"]})
+        older = await db.search_history.insert_one(search("user-2", "Poodle", minutes_ago=60))
+
+        buffer = SearchEventBuffer()
+        first = buffer.add_search(search("user-1", "Beagle", minutes_ago=2))
+        buffer.add_search(search("user-1", "Akita", minutes_ago=1))
+        buffer.add_search(search("user-2", "Boxer"))
+        # Folded into the buffered insert vs. written as a separate update
+        buffer.add_interaction(first, "user-1", {"time_spent": 30})
+        buffer.add_interaction(older.inserted_id, "user-2", {"is_bookmarked": True})
+        buffer.add_interaction(older.inserted_id, "user-2", {"rating": 5})
+
+        assert await buffer.flush() == {"searches": 3, "interactions": 1}
+        assert buffer.pending == 0
+
+        assert await db.search_history.count_documents({}) == 4
+        assert (await db.search_history.find_one({"_id": first}))["time_spent"] == 30
+        updated = await db.search_history.find_one({"_id": older.inserted_id})
+        assert updated["is_bookmarked"] is True and updated["rating"] == 5
+
+        assert (await db.recent_searches.find_one({"_id": "user-1"}))["breeds"] == ["Akita", "Beagle", "Pug"]
+        assert (await db.recent_searches.find_one({"_id": "user-2"}))["breeds"] == ["Boxer", "Poodle"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_keeps_events_for_the_next_one(db, monkeypatch):
+    async def scenario():
+        buffer = SearchEventBuffer()
+        search_id = buffer.add_search(search("user-1", "Pug"))
+
+        write = SearchHistoryService.write_event_batch
+
+        async def failing_write(*args):
+            raise RuntimeError("not primary")
+        monkeypatch.setattr(SearchHistoryService, "write_event_batch", failing_write)
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        assert buffer.pending == 1
+
+        # An update that arrives meanwhile still folds into the kept insert
+        buffer.add_interaction(search_id, "user-1", {"time_spent": 12})
+        monkeypatch.setattr(SearchHistoryService, "write_event_batch", write)
+        assert await buffer.flush() == {"searches": 1, "interactions": 0}
+        assert (await db.search_history.find_one({"_id": search_id}))["time_spent"] == 12
+
+    asyncio.run(scenario())
+
+
+def test_replayed_batch_does_not_duplicate_searches(db):
+    async def scenario():
+        searches = [search("user-1", "Pug"), search("user-1", "Husky")]
+        buffer = SearchEventBuffer()
+        for item in searches:
+            buffer.add_search(item)
+        batch = list(buffer._searches.values())
+
+        await SearchHistoryService.write_event_batch(batch, [])
+        # e.g. the first attempt inserted everything but failed afterwards
+        await SearchHistoryService.write_event_batch(batch, [])
+        assert await db.search_history.count_documents({}) == 2
+
+    asyncio.run(scenario())